@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from generators import generate_repetition
+from misc.util import iter_json_array, read_json, read_file
+from analysis.power_samples import PowerSamples, ingest_power_samples, load_power_samples
+from analysis.preprocess import prune_edges
+from analysis.process_ptrace import build_process_lifetimes, resolve_intervals
+from analysis.to_df import ScaphandreToDf
+from analysis.analysis import Analysis
+from analysis.energy_matrix import EnergyMatrix
+from analysis.analysis_runner import preprocess_data, convert_to_dataframe, perform_analysis, analyze_repetition
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+DEFAULT_SIZES = [1000, 5000, 20000]
+INTERNAL_REPETITIONS = 10
+
+# A benchmark prepares its inputs from the fixture directory and returns the function that is timed
+Benchmark = Callable[[str, Dict[str, Any]], Callable[[], Any]]
+
+def bench_iter_json_array(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    return lambda: sum(1 for _ in iter_json_array(f"{directory}/power.json"))
+
+def bench_from_json(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    return lambda: PowerSamples.from_json(iter_json_array(f"{directory}/power.json"))
+
+def bench_load_cached(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    load_power_samples(f"{directory}/power.json")
+    return lambda: load_power_samples(f"{directory}/power.json")
+
+def bench_prune_edges(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    samples = load_power_samples(f"{directory}/power.json")
+    timesheet = read_json(f"{directory}/timesheet.json")
+    return lambda: prune_edges(samples, timesheet, 'block', 0)
+
+def bench_build_process_lifetimes(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    return lambda: build_process_lifetimes(f"{directory}/ptrace.txt")
+
+def bench_resolve_intervals(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    rpid = read_file(f"{directory}/rpid.txt")
+    return lambda: resolve_intervals(f"{directory}/ptrace.txt", rpid)
+
+def bench_host_to_df(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    samples = preprocess_data(directory, config['analysis'])
+    return lambda: ScaphandreToDf(samples).host_to_df()
+
+def bench_intervals_to_dfs(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    samples = preprocess_data(directory, config['analysis'])
+    intervals = resolve_intervals(f"{directory}/ptrace.txt", read_file(f"{directory}/rpid.txt"))
+    return lambda: ScaphandreToDf(samples).intervals_to_dfs(intervals)
+
+def bench_regex_to_dfs(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    samples = preprocess_data(directory, config['analysis'])
+    return lambda: ScaphandreToDf(samples).regex_to_dfs('python3')
+
+def bench_analysis_do(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    converter = convert_to_dataframe(directory, preprocess_data(directory, config['analysis']), config['analysis'])
+    return lambda: Analysis(converter.dfs, INTERNAL_REPETITIONS).do()
+
+def bench_energy_windows(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    converter = convert_to_dataframe(directory, preprocess_data(directory, config['analysis']), config['analysis'])
+    return lambda: EnergyMatrix(converter.dfs).windows(0.1)
+
+def bench_ingest(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    return lambda: ingest_power_samples(f"{directory}/power.json")
+
+def bench_preprocess(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    load_power_samples(f"{directory}/power.json")
+    return lambda: preprocess_data(directory, config['analysis'])
+
+def bench_convert(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    samples = preprocess_data(directory, config['analysis'])
+    return lambda: convert_to_dataframe(directory, samples, config['analysis'])
+
+def bench_analysis(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    converter = convert_to_dataframe(directory, preprocess_data(directory, config['analysis']), config['analysis'])
+    return lambda: perform_analysis(converter.dfs, INTERNAL_REPETITIONS)
+
+def bench_repetition(directory: str, config: Dict[str, Any]) -> Callable[[], Any]:
+    load_power_samples(f"{directory}/power.json")
+    return lambda: analyze_repetition(directory, config, force=True)
+
+FUNCTIONS: Dict[str, Benchmark] = {
+    'iter_json_array': bench_iter_json_array,
+    'PowerSamples.from_json': bench_from_json,
+    'load_power_samples (cached)': bench_load_cached,
+    'prune_edges': bench_prune_edges,
+    'build_process_lifetimes': bench_build_process_lifetimes,
+    'resolve_intervals': bench_resolve_intervals,
+    'ScaphandreToDf.host_to_df': bench_host_to_df,
+    'ScaphandreToDf.intervals_to_dfs': bench_intervals_to_dfs,
+    'ScaphandreToDf.regex_to_dfs': bench_regex_to_dfs,
+    'Analysis.do': bench_analysis_do,
+    'EnergyMatrix.windows': bench_energy_windows
+}
+
+STAGES: Dict[str, Benchmark] = {
+    'ingest': bench_ingest,
+    'preprocess': bench_preprocess,
+    'convert': bench_convert,
+    'analysis': bench_analysis,
+    'repetition': bench_repetition
+}
+
+def measure(benchmark: Benchmark, directory: str, config: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    function = benchmark(directory, config)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    # Separate run, tracemalloc slows down allocations
+    function = benchmark(directory, config)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'min': min(times), 'median': statistics.median(times), 'peak_memory': peak}
+
+def current_commit() -> str:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f"{commit}-dirty" if dirty else commit
+
+@click.group()
+def cli():
+    pass
+
+@cli.command()
+@click.option('--samples', '-s', multiple=True, type=int, help='Sample counts to benchmark, repeatable.')
+@click.option('--consumers', '-c', default=50, help='Consumers per sample.')
+@click.option('--depth', '-d', default=5, help='Depth of the container process tree.')
+@click.option('--repeat', '-r', default=3, help='Timed runs per benchmark.')
+@click.option('--output', '-o', default=None, help='Results file, defaults to results/<commit>.json.')
+@click.option('--keep', default=None, help='Directory to generate the fixtures into and keep.')
+def run(samples, consumers, depth, repeat, output, keep):
+    logging.basicConfig(level=logging.WARNING)
+    commit = current_commit()
+    root = keep or tempfile.mkdtemp(prefix='calabash-bench-')
+    config = {'analysis': {'mode': 'pid', 'prune_mark': 'block'}, 'procedure': {'internal_repetitions': INTERNAL_REPETITIONS}}
+    results: Dict[str, Any] = {
+        'commit': commit,
+        'time': time.time(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'sizes': []
+    }
+
+    try:
+        for sample_count in samples or DEFAULT_SIZES:
+            directory = f"{root}/{sample_count}"
+            if not os.path.exists(f"{directory}/power.json"):
+                click.echo(f"Generating {sample_count} samples")
+                generate_repetition(directory, sample_count, consumers, depth)
+
+            size = {'samples': sample_count, 'consumers': consumers, 'depth': depth, 'functions': {}, 'stages': {}}
+            for kind, benchmarks in (('functions', FUNCTIONS), ('stages', STAGES)):
+                for name, benchmark in benchmarks.items():
+                    size[kind][name] = measure(benchmark, directory, config, repeat)
+                    click.echo(f"{sample_count:>8} {name:<34} {size[kind][name]['median']:10.4f} s {size[kind][name]['peak_memory'] / 2**20:10.1f} MiB")
+            results['sizes'].append(size)
+    finally:
+        if keep is None:
+            shutil.rmtree(root)
+
+    output = output or f"{RESULTS_DIRECTORY}/{commit}.json"
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=4)
+    click.echo(f"Results written to {output}")
+
+def timings(results: Dict[str, Any]) -> Dict[Tuple[str, int], Dict[str, Any]]:
+    return {(name, size['samples']): measurement
+            for size in results['sizes'] for kind in ('functions', 'stages')
+            for name, measurement in size[kind].items()}
+
+@cli.command()
+@click.argument('files', nargs=-1, required=True)
+@click.option('--plot', default=None, help='Write scaling curves to this path, without extension.')
+def compare(files, plot):
+    # Median time of every benchmark relative to the first results file
+    runs = []
+    for path in files:
+        with open(path) as file:
+            runs.append(json.load(file))
+    measurements = [timings(results) for results in runs]
+
+    click.echo(f"{'benchmark':<34} {'samples':>8} " + ' '.join(f"{results['commit']:>20}" for results in runs))
+    for key, base in measurements[0].items():
+        cells = []
+        for measurement in measurements:
+            if key not in measurement:
+                cells.append(f"{'-':>20}")
+                continue
+            ratio = measurement[key]['median'] / base['median'] if base['median'] else float('nan')
+            cells.append(f"{measurement[key]['median']:11.4f} s {ratio:6.2f}x")
+        click.echo(f"{key[0]:<34} {key[1]:>8} " + ' '.join(cells))
+
+    if plot:
+        plot_scaling(runs, measurements, plot)
+
+def plot_scaling(runs: List[Dict[str, Any]], measurements: List[Dict[Tuple[str, int], Dict[str, Any]]], output_path: str) -> None:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    names = sorted({name for measurement in measurements for name, _ in measurement})
+    figure, axes = plt.subplots(len(names), 2, figsize=(12, 3 * len(names)), squeeze=False)
+    for row, name in enumerate(names):
+        for results, measurement in zip(runs, measurements):
+            sizes = sorted(samples for key, samples in measurement if key == name)
+            axes[row][0].plot(sizes, [measurement[(name, s)]['median'] for s in sizes], marker='o', label=results['commit'])
+            axes[row][1].plot(sizes, [measurement[(name, s)]['peak_memory'] / 2**20 for s in sizes], marker='o', label=results['commit'])
+        axes[row][0].set_title(f"{name} time (s)")
+        axes[row][1].set_title(f"{name} peak memory (MiB)")
+        for axis in axes[row]:
+            axis.set_xscale('log')
+            axis.set_yscale('log')
+            axis.set_xlabel('Samples')
+            axis.legend()
+    figure.tight_layout()
+    figure.savefig(f"{output_path}.png")
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import statistics
+import subprocess
+from typing import Any, Dict, List
+
+import click
+
+from bench_analysis import RESULTS_DIRECTORY, current_commit
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'main.py')
+CONFIG = """images:
+  - alpine:latest
+out: {out}
+procedure:
+  external_repetitions: 1
+  internal_repetitions: 1
+  freq: 100
+analysis:
+  mode: pid
+"""
+
+def commands(config_path: str) -> Dict[str, List[str]]:
+    # Every command stops before doing any work, so only the interpreter and the imports are timed
+    return {
+        'python': [sys.executable, '-c', 'pass'],
+        'help': [sys.executable, MAIN, '--help'],
+        'validate': [sys.executable, MAIN, 'validate', config_path],
+        'experiment --help': [sys.executable, MAIN, 'experiment', '--help'],
+        'analyze --help': [sys.executable, MAIN, 'analyze', '--help'],
+        'import experiment.runner': [sys.executable, '-c', 'from experiment import runner'],
+        'import analysis.analysis_runner': [sys.executable, '-c', 'from analysis import analysis_runner']
+    }
+
+def measure(command: List[str], repeat: int) -> Dict[str, Any]:
+    env = {**os.environ, 'PYTHONPATH': os.path.dirname(MAIN)}
+    # Not timed, warms the file system cache and writes the bytecode
+    subprocess.run(command, env=env, capture_output=True, check=True)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times)}
+
+@click.group()
+def cli():
+    pass
+
+@cli.command()
+@click.option('--repeat', '-r', default=10, help='Timed runs per command.')
+@click.option('--output', '-o', default=None, help='Results file, defaults to results/startup-<commit>.json.')
+def run(repeat, output):
+    commit = current_commit()
+    results: Dict[str, Any] = {
+        'commit': commit,
+        'time': time.time(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'commands': {}
+    }
+
+    with tempfile.TemporaryDirectory(prefix='calabash-startup-') as directory:
+        config_path = f"{directory}/config.yaml"
+        with open(config_path, 'w') as file:
+            file.write(CONFIG.format(out=f"{directory}/out"))
+        for name, command in commands(config_path).items():
+            results['commands'][name] = measure(command, repeat)
+            click.echo(f"{name:<34} {results['commands'][name]['median']:10.4f} s")
+
+    output = output or f"{RESULTS_DIRECTORY}/startup-{commit}.json"
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=4)
+    click.echo(f"Results written to {output}")
+
+@cli.command()
+@click.argument('files', nargs=-1, required=True)
+def compare(files):
+    # Median startup time of every command relative to the first results file
+    runs = []
+    for path in files:
+        with open(path) as file:
+            runs.append(json.load(file))
+
+    click.echo(f"{'command':<34} " + ' '.join(f"{results['commit']:>20}" for results in runs))
+    for name, base in runs[0]['commands'].items():
+        cells = []
+        for results in runs:
+            if name not in results['commands']:
+                cells.append(f"{'-':>20}")
+                continue
+            median = results['commands'][name]['median']
+            ratio = median / base['median'] if base['median'] else float('nan')
+            cells.append(f"{median:11.4f} s {ratio:6.2f}x")
+        click.echo(f"{name:<34} " + ' '.join(cells))
+
+if __name__ == "__main__":
+    cli()
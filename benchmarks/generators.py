@@ -0,0 +1,117 @@
+import os
+import json
+import random
+from typing import Dict, List, Tuple
+
+# Synthetic repetition directories shaped like the output of an experiment: a Scaphandre power.json,
+# a host-wide bpftrace ptrace.txt with its clock reference, the container's rpid.txt and a timesheet.json.
+
+START_TIME = 1700000000.0
+ROOT_PID = 10000
+BACKGROUND_PID = 50000
+COMMANDS = ['sh', 'python3', 'java', 'node', 'gcc', 'make', 'bash', 'sleep']
+
+def process_tree(depth: int, fanout: int, root_pid: int = ROOT_PID) -> List[Tuple[int, int]]:
+    # (pid, parent pid) of the descendants of root_pid, breadth first
+    tree: List[Tuple[int, int]] = []
+    level = [root_pid]
+    next_pid = root_pid + 1
+    for _ in range(depth):
+        children = []
+        for parent in level:
+            for _ in range(fanout):
+                tree.append((next_pid, parent))
+                children.append(next_pid)
+                next_pid += 1
+        level = children
+    return tree
+
+def process_lifetimes(tree: List[Tuple[int, int]], start: float, end: float, rng: random.Random) -> Dict[int, Tuple[float, float]]:
+    # Children are forked after their parent and the leaves may exit before the end of the run
+    duration = end - start
+    lifetimes = {ROOT_PID: (start, end)}
+    for pid, parent in tree:
+        parent_start, parent_end = lifetimes.get(parent, (start, end))
+        fork = parent_start + rng.uniform(0, 0.1) * duration
+        exit = end if rng.random() < 0.5 else rng.uniform(fork, parent_end)
+        lifetimes[pid] = (fork, min(exit, parent_end))
+    return lifetimes
+
+def generate_ptrace(directory: str, tree: List[Tuple[int, int]], lifetimes: Dict[int, Tuple[float, float]],
+                    background_forks: int, start: float, end: float, rng: random.Random) -> None:
+    # Traces use monotonic nanoseconds, here with a clock reference where monotonic 0 is START_TIME
+    def ns(timestamp: float) -> int:
+        return int((timestamp - START_TIME) * 1e9)
+
+    events: List[Tuple[int, str]] = []
+    for pid, parent in tree:
+        fork, exit = lifetimes[pid]
+        comm = rng.choice(COMMANDS)
+        events.append((ns(fork), f"C{ns(fork)}: {comm} ({parent}) -> {comm} ({pid})"))
+        if exit < end:
+            events.append((ns(exit), f"X{ns(exit)}: {comm} ({pid})"))
+    for index in range(background_forks):
+        fork = rng.uniform(start, end)
+        comm = rng.choice(COMMANDS)
+        parent, pid = BACKGROUND_PID + rng.randrange(100), BACKGROUND_PID + 100 + index
+        events.append((ns(fork), f"C{ns(fork)}: {comm} ({parent}) -> {comm} ({pid})"))
+
+    events.sort()
+    with open(f"{directory}/ptrace.txt", 'w') as file:
+        for _, line in events:
+            file.write(line + '\n')
+    with open(f"{directory}/ptrace_clock.json", 'w') as file:
+        json.dump({"monotonic_ns": 0, "realtime": START_TIME}, file, indent=4)
+
+def generate_power(directory: str, samples: int, consumers: int, interval: float,
+                   lifetimes: Dict[int, Tuple[float, float]], rng: random.Random) -> None:
+    # Scaphandre reports the top consumers of every sample, the live processes of the tree among others
+    pids = sorted(lifetimes)
+    background = list(range(BACKGROUND_PID, BACKGROUND_PID + 4 * consumers))
+    with open(f"{directory}/power.json", 'w') as file:
+        file.write('[')
+        for index in range(samples):
+            timestamp = START_TIME + index * interval
+            alive = [pid for pid in pids if lifetimes[pid][0] <= timestamp <= lifetimes[pid][1]][:consumers // 2]
+            entries = []
+            for pid in alive + rng.sample(background, consumers - len(alive)):
+                command = COMMANDS[pid % len(COMMANDS)]
+                entries.append({
+                    "exe": f"/usr/bin/{command}",
+                    "cmdline": f"{command} --worker {pid}",
+                    "pid": pid,
+                    "resources_usage": None,
+                    "consumption": rng.uniform(0, 2e6),
+                    "timestamp": timestamp + rng.uniform(0, interval / 10),
+                    "container": None
+                })
+            sample = {
+                "host": {"consumption": rng.uniform(10e6, 40e6), "timestamp": timestamp, "components": {}},
+                "consumers": entries,
+                "sockets": []
+            }
+            if index:
+                file.write(',')
+            json.dump(sample, file)
+        file.write(']')
+
+def generate_timesheet(directory: str, start: float, end: float) -> None:
+    # The block is run in the middle, leaving a margin for pruning
+    margin = (end - start) * 0.05
+    block_start, block_end = start + margin, end - margin
+    with open(f"{directory}/timesheet.json", 'w') as file:
+        json.dump([{"name": "block", "start": block_start, "end": block_end, "duration": block_end - block_start}], file, indent=4)
+
+def generate_repetition(directory: str, samples: int, consumers: int, depth: int, fanout: int = 2,
+                        interval: float = 0.05, background_forks: int = 1000, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    start, end = START_TIME, START_TIME + samples * interval
+
+    tree = process_tree(depth, fanout)
+    lifetimes = process_lifetimes(tree, start, end, rng)
+    generate_ptrace(directory, tree, lifetimes, background_forks, start, end, rng)
+    generate_power(directory, samples, consumers, interval, lifetimes, rng)
+    generate_timesheet(directory, start, end)
+    with open(f"{directory}/rpid.txt", 'w') as file:
+        file.write(str(ROOT_PID))
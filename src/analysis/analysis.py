@@ -1,12 +1,15 @@
-import numpy as np
-from typing import Dict, Any
+import pandas as pd
+from typing import Dict, Any, Optional
+from .energy_matrix import EnergyMatrix, energy_windows
 
 class Analysis:
 
-    def __init__(self, dfs: Dict[str, Any], repetitions: int):
+    def __init__(self, dfs: Dict[str, Any], repetitions: int, overhead_power: float = 0.0):
         self.dfs = dfs
         self.results: Dict[str, Any] = {}
         self.repetitions = repetitions
+        self.overhead_power = overhead_power
+        self.matrix: Optional[EnergyMatrix] = None
 
     def timestamp_analysis(self) -> None:
         ts_differences = self.dfs['host'].index.to_series().diff().dropna()
@@ -20,11 +23,17 @@ class Analysis:
         }
 
     def host_energy_analysis(self) -> None:
-        self.energy_consumption: float = np.trapz(self.dfs['host']['consumption'], x=self.dfs['host'].index)
+        observed: float = float(self.matrix.totals()[self.matrix.row('host')])
+        # The power drawn by the observers themselves, measured with experiment --overhead
+        overhead = self.overhead_power * (self.dfs['host'].index[-1] - self.dfs['host'].index[0])
+        self.energy_consumption: float = observed - overhead
         self.results['host_energy_analysis'] = {
             "total": self.energy_consumption,
             "per_repetition": self.energy_consumption / self.repetitions
         }
+        if self.overhead_power:
+            self.results['host_energy_analysis']['observed'] = observed
+            self.results['host_energy_analysis']['overhead'] = overhead
 
     def host_power_analysis(self) -> None:
         self.results['host_power_analysis'] = {
@@ -36,17 +45,21 @@ class Analysis:
         }
 
     def process_energy_analysis(self) -> None:
-        total_consumption: float = 0
-        for pid, df in self.dfs.items():
-            if pid != 'host':
-                total_consumption += np.trapz(df['consumption'], x=df.index)
+        totals = self.matrix.totals()
+        total_consumption: float = sum(float(totals[row]) for row, pid in enumerate(self.matrix.names) if pid != 'host')
 
         self.results['process_energy_analysis'] = {
             "total": total_consumption,
             "per_repetition": total_consumption / self.repetitions
         }        
 
+    def energy_windows(self, window: float, per_process: bool = False) -> pd.DataFrame:
+        # Energy of the host and the processes per window of the given length in seconds
+        return energy_windows(self.matrix, window, per_process)
+
     def do(self) -> None:
+        # All series are integrated at once
+        self.matrix = EnergyMatrix(self.dfs)
         self.timestamp_analysis()
         self.host_energy_analysis()
         self.host_power_analysis()
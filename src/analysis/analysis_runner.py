@@ -1,115 +1,287 @@
+import os
 import sys
 from .analysis import Analysis
-from .visualizer import distribution_plot, power_plot, plot_temperature
+from .visualizer import PowerHistogram, distribution_plot, power_plot, power_histogram_plot, plot_temperature, render
 from .preprocess import preprocess_scaphandre
-from .process_ptrace import resolve
+from .process_ptrace import resolve_intervals, ptrace_file
 from .to_df import ScaphandreToDf
+from .power_samples import PowerSamples, load_power_samples, power_file
 from misc.config import load_configuration
-from misc.util import read_json, get_display_name, read_file, create_directory, write_json
+from misc import tracing
+from misc.util import get_display_name, read_file, read_json, create_directory, write_json, setup_directory
+from .manifest import read_manifest, write_manifest, input_signatures, same_inputs, repetition_manifest, is_up_to_date
 from .preflight import check
-from scipy.stats import shapiro, ttest_ind, mannwhitneyu
+from .thermal import RUN_TABLE_FILE, load_thermal, temperature_long, thermal_by_entry, thermal_sources, thermal_inputs
+from scipy.stats import shapiro
+from .statistics import difference_test, bootstrap_means, bootstrap_difference_interval, permutation_test
 from numpy import sqrt
+import numpy as np
 import pandas as pd
 import logging
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Dict, Any, Optional, Tuple, Union
 
 SUMMARY_KEYS = [
     'host_energy_total', 'host_energy_per_repetition', 'process_energy_total',
     'process_energy_per_repetition', 'timestamp_running_time', 'host_power_mean'
 ]
+# Bootstrap and permutation resamples of the comparison
+RESAMPLES = 10000
+# Length in seconds of the windows of energy_windows.csv
+ENERGY_WINDOW = 0.1
+ENERGY_WINDOWS_FILE = 'energy_windows.csv'
 
-def run(config_path: str) -> None:
+AGGREGATE_FILES = ['accumulated.csv', 'summary.csv', 'shapiro_analysis.json']
+REPETITIONS_FILE = 'repetitions.json'
+
+def run(config_path: str, jobs: int = 1, force: bool = False, trace: bool = False) -> None:
     logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(message)s')
 
     config = load_configuration(config_path)
+    apply_repetition_counts(config)
+    if trace:
+        tracing.enable('analysis')
+
+    with tracing.span('analyze'):
+        analyze_campaign(config, jobs, force)
+
+    if trace:
+        summary = tracing.write_trace(f"{config['out']}/analysis_trace")
+        logging.info("Analysis stages:\n%s", summary)
+
+def analyze_campaign(config: Dict[str, Any], jobs: int = 1, force: bool = False) -> None:
     df_variations_aggregated_runs: List[pd.DataFrame] = []
-    host_power_dfs: List[List[pd.DataFrame]] = []
+    host_power: List[Optional[Union[PowerHistogram, List[pd.DataFrame]]]] = []
+    power_plot_mode = config['analysis'].get('power_plot', 'histogram')
     summaries: List[pd.DataFrame] = []
-    shapiro_results: List[Dict[str, Any]] = []
-        
-    temperature(config['out'])
+    images_changed: List[bool] = []
+
+    previous_manifest = None if force else read_manifest(config['out'])
+    manifest = {
+        'inputs': input_signatures(config['out'], thermal_inputs(config['out']), previous_manifest),
+        'images': []
+    }
+
+    if previous_manifest is None or not same_inputs(manifest['inputs'], previous_manifest.get('inputs', {})) \
+            or not all(os.path.exists(f"{directory}/temperature.png") for directory, _ in thermal_sources(config['out'])):
+        with tracing.span('temperature'):
+            temperature(config['out'])
+
+    with tracing.span('repetitions', jobs=jobs):
+        repetition_results = analyze_repetitions(config, jobs, force)
+    run_table_path = f"{config['out']}/{RUN_TABLE_FILE}"
+    run_table = read_json(run_table_path) if os.path.exists(run_table_path) else []
 
     for k, image in enumerate(config['images']):
         display_name = get_display_name(image)
         logging.info(f"Running analysis for %s", display_name)
         accumulated_runs: Dict[int, Dict[str, Any]] = {}
-        host_dfs: List[pd.DataFrame] = []
+        host_dfs: List[Optional[pd.DataFrame]] = []
+        runs_changed = False
         
         for i in range(config['procedure']['external_repetitions'][k]):
-            logging.info("Repetition %d", i)
-            directory = setup_directory(config['out'], display_name, i)
-
-            if not check(directory):
-                logging.error("Preflight check failed for %s", directory)
-                exit()
-
-            preprocess_data(directory, config['analysis'])
-            converter = convert_to_dataframe(directory, config['analysis'])
-
-            create_directory(f"{directory}/dfs")
-            converter.export_dfs(f"{directory}/dfs")
-            host_dfs.append(converter.dfs['host'])
-
-            analysis_results = perform_analysis(converter.dfs, config['procedure']['internal_repetitions'])
-            write_json(f"{directory}/analysis.json", analysis_results)
+            analysis_results, host_df = repetition_results[(k, i)]
+            host_dfs.append(host_df)
             accumulated_runs[i] = analysis_results
+            runs_changed = runs_changed or host_df is not None
+
+        image_entry = {'name': display_name, 'repetitions': config['procedure']['external_repetitions'][k]}
+        manifest['images'].append(image_entry)
+        previous_images = previous_manifest.get('images', []) if previous_manifest else []
+        image_changed = runs_changed or k >= len(previous_images) or previous_images[k] != image_entry
+        images_changed.append(image_changed)
 
         if config['procedure']['external_repetitions'][k] > 1:
-            df_accumulated_runs = analyze_multiple_runs(accumulated_runs)
-            df_accumulated_runs.to_csv(f"{config['out']}/{display_name}/accumulated.csv")
+            image_dir = f"{config['out']}/{display_name}"
+            if image_changed or not all(os.path.exists(f"{image_dir}/{name}") for name in AGGREGATE_FILES):
+                with tracing.span('aggregate', image=display_name):
+                    df_accumulated_runs = analyze_multiple_runs(accumulated_runs)
+                add_host_factor(df_accumulated_runs, run_table, image)
+                df_accumulated_runs.to_csv(f"{image_dir}/accumulated.csv")
+                if 'host' in df_accumulated_runs:
+                    df_accumulated_runs.groupby('host')[SUMMARY_KEYS].agg(['count', 'mean', 'std']).to_csv(f"{image_dir}/summary_by_host.csv")
+                summary = df_accumulated_runs.describe()
+                summary.to_csv(f"{image_dir}/summary.csv")
+
+                # Statistical Analysis
+                shapiro_analysis = {}
+                for key in SUMMARY_KEYS:
+                    stat, p = shapiro(df_accumulated_runs[key])
+                    shapiro_analysis[f'{key}_shapiro'] = {'stat': stat, 'p': p}
+
+                write_json(f"{image_dir}/shapiro_analysis.json", shapiro_analysis)
+                images_changed[k] = True
+            else:
+                logging.info("Reusing aggregated results of %s", display_name)
+                df_accumulated_runs = pd.read_csv(f"{image_dir}/accumulated.csv", index_col=0)
+                summary = pd.read_csv(f"{image_dir}/summary.csv", index_col=0)
+
             df_variations_aggregated_runs.append(df_accumulated_runs)
-            summary = df_accumulated_runs.describe()
-            summary.to_csv(f"{config['out']}/{display_name}/summary.csv")
             summaries.append(summary)
 
-            # Statistical Analysis
-            shapiro_analysis = {}
-            for key in SUMMARY_KEYS:
-                stat, p = shapiro(df_accumulated_runs[key])
-                shapiro_analysis[f'{key}_shapiro'] = {'stat': stat, 'p': p}
-
-            shapiro_results.append(shapiro_analysis)
-            write_json(f"{config['out']}/{display_name}/shapiro_analysis.json", shapiro_analysis)
+        if images_changed[k] or not os.path.exists(f"{config['out']}/power_plot_{k}.png"):
+            with tracing.span('load_host_dfs', image=display_name):
+                run_dfs = (load_host_df(setup_directory(config['out'], display_name, i)) if df is None else df
+                           for i, df in enumerate(host_dfs))
+                if power_plot_mode == 'histogram':
+                    # Accumulated run by run, only one run is loaded at a time
+                    histogram = PowerHistogram()
+                    for df in run_dfs:
+                        histogram.add(df)
+                    host_power.append(histogram)
+                else:
+                    host_power.append(list(run_dfs))
+        else:
+            host_power.append(None)
+        del host_dfs
+
+    manifest['comparison'] = {'resamples': config['analysis'].get('resamples', RESAMPLES),
+                              'seed': config['analysis'].get('seed', 0)}
+    if len(host_power) > 1:
+        previous_count = len(previous_manifest.get('images', [])) if previous_manifest else 0
+        previous_comparison = previous_manifest.get('comparison') if previous_manifest else None
+        if any(power is not None for power in host_power) or previous_count != len(host_power) \
+                or previous_comparison != manifest['comparison'] \
+                or not os.path.exists(f"{config['out']}/comparison.json"):
+            with tracing.span('compare'):
+                compare_variations(summaries, df_variations_aggregated_runs, config['out'],
+                                   **manifest['comparison'])
+            with tracing.span('visualize'):
+                visualize_variations(df_variations_aggregated_runs, host_power, config['out'], jobs)
+        else:
+            logging.info("No variation changed, reusing comparison and visualizations")
+
+    write_manifest(config['out'], manifest)
+
+def analyze_repetitions(config: Dict[str, Any], jobs: int = 1, force: bool = False) -> Dict[Tuple[int, int], Tuple[Dict[str, Any], Optional[pd.DataFrame]]]:
+    runs = [(k, i) for k, repetitions in enumerate(config['procedure']['external_repetitions']) for i in range(repetitions)]
+    directories = [setup_directory(config['out'], get_display_name(config['images'][k]), i) for k, i in runs]
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # map yields in submission order, keeping the merge deterministic
+            traced_results = list(executor.map(analyze_repetition_worker, directories, repeat(config), repeat(force), repeat(tracing.enabled)))
+        results = []
+        for result, trace_events in traced_results:
+            results.append(result)
+            tracing.extend(trace_events)
+    else:
+        results = [analyze_repetition(directory, config, force) for directory in directories]
+
+    return dict(zip(runs, results))
+
+def analyze_completed_repetition(directory: str, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # For the adaptive scheduler of a running experiment, which carries on when a repetition failed
+    if not check(directory):
+        logging.error("Preflight check failed for %s", directory)
+        return None
+    return analyze_repetition(directory, config)[0]
+
+def analyze_repetition_worker(directory: str, config: Dict[str, Any], force: bool, trace: bool) -> Tuple[Tuple[Dict[str, Any], Optional[pd.DataFrame]], List[Dict[str, Any]]]:
+    # Runs in a worker process, whose spans are returned along with the results
+    if trace:
+        tracing.enable('analysis worker')
+    return analyze_repetition(directory, config, force), tracing.collect()
+
+def analyze_repetition(directory: str, config: Dict[str, Any], force: bool = False) -> Tuple[Dict[str, Any], Optional[pd.DataFrame]]:
+    # The host DataFrame is None when the previous results were reused
+    with tracing.span('manifest', directory=directory):
+        previous_manifest = None if force else read_manifest(directory)
+        manifest = repetition_manifest(directory, config, previous_manifest)
+        up_to_date = is_up_to_date(directory, manifest, previous_manifest)
+    if up_to_date:
+        logging.info("Inputs of %s unchanged, reusing analysis", directory)
+        return read_json(f"{directory}/analysis.json"), None
+
+    logging.info("Analyzing %s", directory)
+
+    with tracing.span('preflight', directory=directory):
+        passed = check(directory)
+    if not passed:
+        logging.error("Preflight check failed for %s", directory)
+        sys.exit(1)
 
-        host_power_dfs.append(host_dfs)
+    with tracing.span('preprocess', directory=directory):
+        samples = preprocess_data(directory, config['analysis'])
+    with tracing.span('convert', directory=directory):
+        converter = convert_to_dataframe(directory, samples, config['analysis'])
+
+    with tracing.span('export', directory=directory):
+        create_directory(f"{directory}/dfs")
+        converter.export_dfs(f"{directory}/dfs")
+
+    with tracing.span('analysis', directory=directory):
+        analysis = Analysis(converter.dfs, config['procedure']['internal_repetitions'], manifest['settings']['overhead_power'])
+        analysis.do()
+        analysis_results = analysis.results
+    with tracing.span('energy_windows', directory=directory):
+        analysis.energy_windows(config['analysis'].get('energy_window', ENERGY_WINDOW),
+                                config['analysis'].get('energy_window_processes', False)).to_csv(f"{directory}/{ENERGY_WINDOWS_FILE}")
+    write_json(f"{directory}/analysis.json", analysis_results)
+    write_manifest(directory, manifest)
+    return analysis_results, converter.dfs['host']
+
+def apply_repetition_counts(config: Dict[str, Any]) -> None:
+    # An adaptive experiment records how many repetitions every variation actually ran
+    path = f"{config['out']}/{REPETITIONS_FILE}"
+    if os.path.exists(path):
+        counts = read_json(path)
+        config['procedure']['external_repetitions'] = [counts[image] for image in config['images']]
+
+def load_host_df(directory: str) -> pd.DataFrame:
+    return pd.read_csv(f"{directory}/dfs/host.csv", index_col='timestamp')
+
+def ingest(config_path: str) -> None:
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(message)s')
 
-    if len(host_power_dfs) > 1:
-        compare_variations(summaries, df_variations_aggregated_runs, shapiro_results, config['out'])
-        visualize_variations(df_variations_aggregated_runs, host_power_dfs, config['out'])
+    config = load_configuration(config_path)
+    apply_repetition_counts(config)
+    for k, image in enumerate(config['images']):
+        display_name = get_display_name(image)
+        for i in range(config['procedure']['external_repetitions'][k]):
+            directory = setup_directory(config['out'], display_name, i)
+            load_power_samples(power_file(directory))
 
 def temperature(out_path: str):
-    temperature_df = pd.read_csv(f"{out_path}/cpu_temps.csv")
-    plot_temperature(temperature_df, f"{out_path}/temperature")
-
-def setup_directory(out_path: str, display_name: str, iteration: int) -> str:
-    curr_dir_prefix = f"/{iteration}"
-    return f"{out_path}/{display_name}{curr_dir_prefix}"
-
-def preprocess_data(directory: str, analysis_config: Dict[str, Any]) -> None:
+    # A distributed experiment has a recording per worker
+    for directory, worker in thermal_sources(out_path):
+        thermal_df, temperature_channels, frequency_channels = load_thermal(directory)
+        plot_temperature(temperature_long(thermal_df, temperature_channels), f"{directory}/temperature")
+        if os.path.exists(f"{out_path}/{RUN_TABLE_FILE}"):
+            thermal_by_entry(thermal_df, temperature_channels, frequency_channels, out_path, worker).to_csv(f"{directory}/thermal.csv")
+
+def add_host_factor(df: pd.DataFrame, run_table: List[Dict[str, Any]], image: str) -> None:
+    # The host and worker that ran every repetition of a distributed experiment
+    assignments = {row['repetition']: row for row in run_table if row['image'] == image and 'worker' in row}
+    if assignments:
+        df['host'] = [assignments.get(repetition, {}).get('host') for repetition in df.index]
+        df['worker'] = [assignments.get(repetition, {}).get('worker') for repetition in df.index]
+
+def preprocess_data(directory: str, analysis_config: Dict[str, Any]) -> PowerSamples:
     kwargs = {}
     if 'prune_mark' in analysis_config:
         kwargs['prune_mark'] = analysis_config['prune_mark']
     if 'prune_buffer' in analysis_config:
         kwargs['prune_buffer'] = analysis_config['prune_buffer']
     
-    preprocess_scaphandre(f'{directory}/power.json', f'{directory}/power_processed.json', f'{directory}/timesheet.json', **kwargs)
+    return preprocess_scaphandre(power_file(directory), f'{directory}/timesheet.json', **kwargs)
 
-def convert_to_dataframe(directory: str, analysis_config: Dict[str, Any]) -> ScaphandreToDf:
-    json_data = read_json(f"{directory}/power_processed.json")
-    converter = ScaphandreToDf(json_data)
+def convert_to_dataframe(directory: str, samples: PowerSamples, analysis_config: Dict[str, Any]) -> ScaphandreToDf:
+    converter = ScaphandreToDf(samples)
     converter.host_to_df()
     
     if analysis_config['mode'] == 'pid':
         rpid = read_file(f"{directory}/rpid.txt")
-        pids = resolve(f"{directory}/ptrace.txt", rpid)
-        converter.pid_to_dfs(pids)
+        intervals = resolve_intervals(ptrace_file(directory), rpid)
+        converter.intervals_to_dfs(intervals)
     else:
-        converter.regex_to_dfs(analysis_config['regex'])
+        converter.regex_to_dfs(analysis_config['pattern'])
 
     return converter
 
-def perform_analysis(dfs: Dict[str, pd.DataFrame], internal_repetitions: int) -> Dict[str, Any]:
-    analysis = Analysis(dfs, internal_repetitions)
+def perform_analysis(dfs: Dict[str, pd.DataFrame], internal_repetitions: int, overhead_power: float = 0.0) -> Dict[str, Any]:
+    analysis = Analysis(dfs, internal_repetitions, overhead_power)
     analysis.do()
     return analysis.results
 
@@ -129,8 +301,7 @@ def update_result_for_first_entry(result: Dict[str, Dict[int, Any]], summary: pd
 def update_result_for_subsequent_entries(result: Dict[str, Dict[int, Any]], 
                                          summaries: List[pd.DataFrame], 
                                          index: int, 
-                                         dfs: List[pd.DataFrame],
-                                         shapiro_results) -> None:
+                                         dfs: List[pd.DataFrame]) -> None:
     for key in SUMMARY_KEYS:
         new_value = summaries[index].loc['mean', key]
         base_value = summaries[0].loc['mean', key]
@@ -143,16 +314,14 @@ def update_result_for_subsequent_entries(result: Dict[str, Dict[int, Any]],
                         'difference': difference,
                         'change_perc' : percentage_change}
 
-        is_parametric = shapiro_results[0][f'{key}_shapiro']['p'] > 0.05 and shapiro_results[index][f'{key}_shapiro']['p'] > 0.05
-
-        if is_parametric:
-            # Welch's t-test
-            stat, p = ttest_ind(dfs[0][key], dfs[index][key], equal_var=False)
-            result[key][index]['ttest'] = {'stat': stat, 'p': p}
+        n1, n2 = len(dfs[0][key]), len(dfs[index][key])
+        # Welch's t-test if both are normal, otherwise Mann-Whitney U, as the adaptive stopping rule chooses
+        test = difference_test(dfs[0][key].to_numpy(dtype=np.float64), dfs[index][key].to_numpy(dtype=np.float64))
+        stat = test['stat']
+        result[key][index][test['test']] = {'stat': stat, 'p': test['p']}
 
+        if test['test'] == 'ttest':
             # Cohen's d
-            n1 = summaries[0].loc['count', key]
-            n2 = summaries[index].loc['count', key]
             s1, s2 = summaries[0].loc['std', key], summaries[index].loc['std', key]
             m1, m2 = summaries[0].loc['mean', key], summaries[index].loc['mean', key]
             pooled_std = sqrt(((n1 - 1) * s1 ** 2 + (n2 - 1) * s2 ** 2) / (n1 + n2 - 2))
@@ -160,16 +329,28 @@ def update_result_for_subsequent_entries(result: Dict[str, Dict[int, Any]],
         
             result[key][index]['cohen_d'] = d
         else:
-            # Mann-Whitney U Test
-
-            stat, p = mannwhitneyu(dfs[0][key], dfs[index][key])
-            result[key][index]['mannwhitneyu'] = {'stat': stat, 'p': p}
-
             effect_size = 1 - (2 * stat) / (n1 * n2)
             
             result[key][index]['effect_size'] = effect_size
 
-def compare_variations(summaries: List[pd.DataFrame], dfs: List[pd.DataFrame], shapiro_results, output_path: str) -> None:
+def update_result_with_resampling(result: Dict[str, Dict[int, Any]], dfs: List[pd.DataFrame],
+                                  resamples: int, seed: int, confidence: float = 0.95) -> None:
+    # Bootstrap interval of the difference to the first variation and permutation test p-value,
+    # for every metric at once
+    rng = np.random.default_rng(seed)
+    values = [df[SUMMARY_KEYS].to_numpy(dtype=np.float64) for df in dfs]
+    means = [bootstrap_means(variation, resamples, rng) for variation in values]
+
+    for index in range(1, len(dfs)):
+        low, high = bootstrap_difference_interval(means[0], means[index], confidence)
+        p = permutation_test(values[0], values[index], resamples, rng)
+        for j, key in enumerate(SUMMARY_KEYS):
+            result[key][index]['bootstrap'] = {'low': float(low[j]), 'high': float(high[j]),
+                                               'confidence': confidence, 'resamples': resamples}
+            result[key][index]['permutation'] = {'p': float(p[j]), 'resamples': resamples}
+
+def compare_variations(summaries: List[pd.DataFrame], dfs: List[pd.DataFrame], output_path: str,
+                       resamples: int = RESAMPLES, seed: int = 0) -> None:
     logging.info("Comparing variations")
     result = {key: {} for key in SUMMARY_KEYS}
 
@@ -177,19 +358,29 @@ def compare_variations(summaries: List[pd.DataFrame], dfs: List[pd.DataFrame], s
         if i == 0:
             update_result_for_first_entry(result, summary, i)
         else:
-            update_result_for_subsequent_entries(result, summaries, i, dfs, shapiro_results)
+            update_result_for_subsequent_entries(result, summaries, i, dfs)
+    update_result_with_resampling(result, dfs, resamples, seed)
     
     write_json(f"{output_path}/comparison.json", result)
 
-def visualize_variations(dfs: List[pd.DataFrame], host_power_dfs: List[pd.DataFrame], output_path: str) -> None:
+def visualize_variations(dfs: List[pd.DataFrame], host_power: List[Optional[Union[PowerHistogram, List[pd.DataFrame]]]],
+                         output_path: str, jobs: int = 1) -> None:
     logging.info("Creating visualizations")
-    distribution_plot(dfs, 'timestamp_running_time', f"{output_path}/timestamp_running_time", 'Running Time (s)')
-    distribution_plot(dfs, 'host_energy_total', f"{output_path}/host_energy_total", 'Host Energy (J)')
-    distribution_plot(dfs, 'host_power_mean', f"{output_path}/host_power_mean", 'Host Power (W)')
-    distribution_plot(dfs, 'process_energy_total', f"{output_path}/process_energy_total", 'Process Energy (J)')
+    tasks = [
+        (distribution_plot, (dfs, 'timestamp_running_time', f"{output_path}/timestamp_running_time", 'Running Time (s)')),
+        (distribution_plot, (dfs, 'host_energy_total', f"{output_path}/host_energy_total", 'Host Energy (J)')),
+        (distribution_plot, (dfs, 'host_power_mean', f"{output_path}/host_power_mean", 'Host Power (W)')),
+        (distribution_plot, (dfs, 'process_energy_total', f"{output_path}/process_energy_total", 'Process Energy (J)'))
+    ]
     
-    for i, host_power_df in enumerate(host_power_dfs):
-        power_plot(host_power_df, f"{output_path}/power_plot_{i}")
+    for i, power in enumerate(host_power):
+        # None marks a variation whose power plot is up to date
+        if isinstance(power, PowerHistogram):
+            tasks.append((power_histogram_plot, (power, f"{output_path}/power_plot_{i}")))
+        elif power is not None:
+            tasks.append((power_plot, (power, f"{output_path}/power_plot_{i}", False, 'Heatmap of power consumption over time', 'kde')))
+
+    render(tasks, jobs)
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
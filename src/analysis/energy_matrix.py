@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+class EnergyMatrix:
+    # The power series of the host and of every attributed process, concatenated into flat arrays, with
+    # offsets[r]:offsets[r + 1] selecting the samples of row r. Rows keep their own timestamps and lengths, so
+    # short-lived processes take no more memory than their samples. The trapezoids of all rows are computed in
+    # one vectorized pass, those spanning two rows are zeroed. The cumulative energy at the samples gives the
+    # energy up to any time, without re-integrating, and the power on any common time grid. Queries go one row
+    # at a time over the slice of that row, so their temporaries follow the samples of a row and the times
+    # within its span rather than rows times all queried times.
+
+    def __init__(self, dfs: Dict[Any, pd.DataFrame]) -> None:
+        self.names: List[Any] = list(dfs)
+        self.lengths = np.array([len(df) for df in dfs.values()], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)]).astype(np.int64)
+        self.timestamps = np.concatenate([df.index.to_numpy(dtype=np.float64) for df in dfs.values()] + [np.zeros(0)])
+        self.power = np.concatenate([df['consumption'].to_numpy(dtype=np.float64) for df in dfs.values()] + [np.zeros(0)])
+
+        # areas[i] is the trapezoid between samples i and i + 1, the last sample of every row has none
+        self.areas = np.zeros(len(self.timestamps))
+        self.areas[:-1] = np.diff(self.timestamps) * (self.power[1:] + self.power[:-1]) / 2
+        present = self.lengths > 0
+        self.areas[self.offsets[1:][present] - 1] = 0.0
+        # Energy of the row of each sample up to that sample
+        cumulative = np.concatenate([[0.0], np.cumsum(self.areas[:-1])])[:len(self.timestamps)]
+        self.cumulative = cumulative - np.repeat(cumulative[self.offsets[:-1][present]], self.lengths[present])
+
+    def totals(self) -> np.ndarray:
+        # The trapezoidal integral of every row
+        totals = np.zeros(len(self.names))
+        segments = self.lengths > 1
+        if segments.any():
+            # Every other sum of reduceat runs from the first to the last trapezoid of a row
+            bounds = np.stack([self.offsets[:-1], self.offsets[1:] - 1], axis=1)[segments].ravel()
+            totals[segments] = np.add.reduceat(self.areas, bounds)[::2]
+        return totals
+
+    def row(self, name: Any) -> int:
+        return self.names.index(name)
+
+    def start(self) -> float:
+        present = self.lengths > 0
+        return float(self.timestamps[self.offsets[:-1][present]].min()) if present.any() else 0.0
+
+    def end(self) -> float:
+        present = self.lengths > 0
+        return float(self.timestamps[self.offsets[1:][present] - 1].max()) if present.any() else 0.0
+
+    def row_samples(self, row: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Timestamps, power and cumulative energy of one row, views into the flat arrays
+        first, last = self.offsets[row], self.offsets[row + 1]
+        return self.timestamps[first:last], self.power[first:last], self.cumulative[first:last]
+
+    def row_energy_at(self, row: int, times: np.ndarray) -> np.ndarray:
+        # Energy of the row up to each time, exact for the linear interpolation of power that the
+        # trapezoidal rule integrates
+        timestamps, power, cumulative = self.row_samples(row)
+        times = np.asarray(times, dtype=np.float64)
+        energy = np.zeros(len(times))
+        if len(timestamps) < 2:
+            return energy
+        index = np.searchsorted(timestamps, times, side='right') - 1
+        inside = (index >= 0) & (index < len(timestamps) - 1)
+        sample = index[inside]
+        elapsed = times[inside] - timestamps[sample]
+        duration = timestamps[sample + 1] - timestamps[sample]
+        slope = np.divide(power[sample + 1] - power[sample], duration, out=np.zeros_like(duration), where=duration > 0)
+        energy[inside] = cumulative[sample] + power[sample] * elapsed + slope * elapsed ** 2 / 2
+        energy[index >= len(timestamps) - 1] = cumulative[-1]
+        return energy
+
+    def row_resample(self, row: int, grid: np.ndarray) -> np.ndarray:
+        # Power of the row on the grid, linearly interpolated and zero outside its samples
+        timestamps, power, _ = self.row_samples(row)
+        grid = np.asarray(grid, dtype=np.float64)
+        resampled = np.zeros(len(grid))
+        if len(timestamps) == 0:
+            return resampled
+        index = np.searchsorted(timestamps, grid, side='right') - 1
+        inside = (index >= 0) & (index < len(timestamps) - 1)
+        sample = index[inside]
+        duration = timestamps[sample + 1] - timestamps[sample]
+        fraction = np.divide(grid[inside] - timestamps[sample], duration, out=np.zeros_like(duration), where=duration > 0)
+        resampled[inside] = power[sample] + (power[sample + 1] - power[sample]) * fraction
+        # The last sample of a row still counts, later times do not
+        resampled[grid == timestamps[-1]] = power[-1]
+        return resampled
+
+    def energy_at(self, times: np.ndarray) -> np.ndarray:
+        # Energy of every row up to each time
+        return np.array([self.row_energy_at(row, times) for row in range(len(self.names))]).reshape(len(self.names), len(times))
+
+    def resample(self, grid: np.ndarray) -> np.ndarray:
+        # Power of every row on the grid
+        return np.array([self.row_resample(row, grid) for row in range(len(self.names))]).reshape(len(self.names), len(grid))
+
+    def window_edges(self, window: float) -> np.ndarray:
+        # Edges of consecutive windows covering all samples
+        start, end = self.start(), self.end()
+        count = max(int(np.ceil((end - start) / window)), 1)
+        return start + np.arange(count + 1) * window
+
+    def row_windows(self, row: int, edges: np.ndarray) -> Tuple[int, np.ndarray]:
+        # Energy of the row in the windows its samples overlap, and the index of the first of them. Every
+        # other window gets none of its energy.
+        timestamps = self.row_samples(row)[0]
+        if len(timestamps) < 2:
+            return 0, np.zeros(0)
+        first = max(int(np.searchsorted(edges, timestamps[0], side='right')) - 1, 0)
+        last = min(int(np.searchsorted(edges, timestamps[-1], side='left')) + 1, len(edges))
+        return first, np.diff(self.row_energy_at(row, edges[first:last]))
+
+    def window_energy(self, edges: np.ndarray, rows: Sequence[int]) -> np.ndarray:
+        # Energy of the rows together in each window, added one row at a time
+        energy = np.zeros(len(edges) - 1)
+        for row in rows:
+            first, row_energy = self.row_windows(row, edges)
+            energy[first:first + len(row_energy)] += row_energy
+        return energy
+
+    def windows(self, window: float, rows: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Edges of the windows and the energy of each of the rows, all rows by default, in each window
+        edges = self.window_edges(window)
+        rows = range(len(self.names)) if rows is None else rows
+        energy = np.zeros((len(rows), len(edges) - 1))
+        for k, row in enumerate(rows):
+            first, row_energy = self.row_windows(row, edges)
+            energy[k, first:first + len(row_energy)] = row_energy
+        return edges, energy
+
+def energy_windows(matrix: EnergyMatrix, window: float, per_process: bool = False) -> pd.DataFrame:
+    # Energy per window of the host and of all processes together, and of every process if asked for
+    edges = matrix.window_edges(window)
+    processes = [row for row, name in enumerate(matrix.names) if name != 'host']
+    columns: Dict[str, np.ndarray] = {'end': edges[1:]}
+    if 'host' in matrix.names:
+        columns['host'] = matrix.window_energy(edges, [matrix.row('host')])
+    columns['processes'] = matrix.window_energy(edges, processes)
+    if per_process:
+        for row in processes:
+            first, row_energy = matrix.row_windows(row, edges)
+            columns[str(matrix.names[row])] = np.zeros(len(edges) - 1)
+            columns[str(matrix.names[row])][first:first + len(row_energy)] = row_energy
+    return pd.DataFrame(columns, index=pd.Index(edges[:-1], name='start'))
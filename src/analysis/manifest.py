@@ -0,0 +1,67 @@
+import os
+import json
+import logging
+from typing import List, Dict, Any, Optional
+from misc.util import read_json, write_json, file_signature, same_signature
+from .overhead import overhead_power
+
+MANIFEST_FILE = 'manifest.json'
+REPETITION_INPUTS = ['power.json', 'power.bin', 'ptrace.txt', 'ptrace.bin', 'ptrace_clock.json', 'rpid.txt', 'timesheet.json']
+REPETITION_OUTPUTS = ['analysis.json', 'dfs/host.csv', 'energy_windows.csv']
+# The analysis fields that change a repetition's result, the comparison settings are in the campaign manifest
+REPETITION_SETTINGS = ['mode', 'pattern', 'prune_mark', 'prune_buffer', 'subtract_overhead', 'energy_window',
+                      'energy_window_processes']
+
+def analysis_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    # The configuration fields that a repetition's analysis depends on
+    return {
+        'analysis': {key: config['analysis'][key] for key in REPETITION_SETTINGS if key in config['analysis']},
+        'internal_repetitions': config['procedure']['internal_repetitions'],
+        'overhead_power': overhead_power(config)
+    }
+
+def read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    path = f"{directory}/{MANIFEST_FILE}"
+    if not os.path.exists(path):
+        return None
+    try:
+        return read_json(path)
+    except json.JSONDecodeError:
+        logging.warning("Ignoring corrupt manifest %s", path)
+        return None
+
+def write_manifest(directory: str, manifest: Dict[str, Any]) -> None:
+    write_json(f"{directory}/{MANIFEST_FILE}", manifest)
+
+def input_signatures(directory: str, files: List[str], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    previous_inputs = (previous or {}).get('inputs', {})
+    signatures: Dict[str, Optional[Dict[str, Any]]] = {}
+    for name in files:
+        path = f"{directory}/{name}"
+        signatures[name] = file_signature(path, previous_inputs.get(name)) if os.path.exists(path) else None
+    return signatures
+
+def same_inputs(inputs: Dict[str, Optional[Dict[str, Any]]], previous_inputs: Dict[str, Optional[Dict[str, Any]]]) -> bool:
+    if inputs.keys() != previous_inputs.keys():
+        return False
+    for name, signature in inputs.items():
+        previous_signature = previous_inputs[name]
+        if signature is None or previous_signature is None:
+            if signature is not previous_signature:
+                return False
+        elif not same_signature(signature, previous_signature):
+            return False
+    return True
+
+def repetition_manifest(directory: str, config: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        'inputs': input_signatures(directory, REPETITION_INPUTS, previous),
+        'settings': analysis_settings(config)
+    }
+
+def is_up_to_date(directory: str, manifest: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> bool:
+    if previous is None:
+        return False
+    if not all(os.path.exists(f"{directory}/{output}") for output in REPETITION_OUTPUTS):
+        return False
+    return manifest['settings'] == previous.get('settings') and same_inputs(manifest['inputs'], previous.get('inputs', {}))
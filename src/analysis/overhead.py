@@ -0,0 +1,20 @@
+import os
+import logging
+from typing import Any, Dict
+from misc.util import read_json
+
+# Written by experiment --overhead
+OVERHEAD_FILE = 'overhead.json'
+
+def overhead_power(config: Dict[str, Any]) -> float:
+    # Host power in watts added by the observers, 0 unless the analysis subtracts it
+    if not config['analysis'].get('subtract_overhead', False):
+        return 0.0
+    path = f"{config['out']}/{OVERHEAD_FILE}"
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"subtract_overhead requires {path}, run experiment --overhead first")
+    power = read_json(path)['total']['power_w']
+    if power is None:
+        logging.warning("%s has no energy measurements, not subtracting any overhead", path)
+        return 0.0
+    return power
@@ -0,0 +1,154 @@
+import os
+import logging
+import numpy as np
+from array import array
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from misc.util import iter_json_array, file_signature, same_signature
+from misc.records import RAPL_RECORD
+
+CACHE_VERSION = 1
+# Scaphandre output, or the records of the native RAPL sampler
+POWER_FILES = ['power.json', 'power.bin']
+
+# Columnar form of a Scaphandre power.json. The consumers of all samples are
+# flattened into one set of arrays, consumer_offsets[i]:consumer_offsets[i + 1]
+# selecting those of sample i. Executables and command lines are stored as
+# codes into exe_names and cmdline_names.
+class PowerSamples:
+
+    def __init__(self, host_timestamp: np.ndarray, host_consumption: np.ndarray,
+                 consumer_offsets: np.ndarray, consumer_pid: np.ndarray,
+                 consumer_timestamp: np.ndarray, consumer_consumption: np.ndarray,
+                 consumer_exe: np.ndarray, consumer_cmdline: np.ndarray,
+                 exe_names: List[str], cmdline_names: List[str]) -> None:
+        self.host_timestamp = host_timestamp
+        self.host_consumption = host_consumption
+        self.consumer_offsets = consumer_offsets
+        self.consumer_pid = consumer_pid
+        self.consumer_timestamp = consumer_timestamp
+        self.consumer_consumption = consumer_consumption
+        self.consumer_exe = consumer_exe
+        self.consumer_cmdline = consumer_cmdline
+        self.exe_names = exe_names
+        self.cmdline_names = cmdline_names
+
+    def __len__(self) -> int:
+        return len(self.host_timestamp)
+
+    def slice(self, start: int, end: int) -> 'PowerSamples':
+        first, last = self.consumer_offsets[start], self.consumer_offsets[end]
+        return PowerSamples(self.host_timestamp[start:end], self.host_consumption[start:end],
+                            self.consumer_offsets[start:end + 1] - first, self.consumer_pid[first:last],
+                            self.consumer_timestamp[first:last], self.consumer_consumption[first:last],
+                            self.consumer_exe[first:last], self.consumer_cmdline[first:last],
+                            self.exe_names, self.cmdline_names)
+
+    @classmethod
+    def from_json(cls, json_data: Iterable[Dict[str, Any]]) -> 'PowerSamples':
+        host_timestamp, host_consumption = array('d'), array('d')
+        consumer_offsets = array('q', [0])
+        consumer_pid = array('q')
+        consumer_timestamp, consumer_consumption = array('d'), array('d')
+        consumer_exe, consumer_cmdline = array('i'), array('i')
+        exe_codes: Dict[str, int] = {}
+        cmdline_codes: Dict[str, int] = {}
+
+        for entry in json_data:
+            host_timestamp.append(entry['host']['timestamp'])
+            host_consumption.append(entry['host']['consumption'])
+            for consumer in entry['consumers']:
+                consumer_pid.append(consumer['pid'])
+                consumer_timestamp.append(consumer['timestamp'])
+                consumer_consumption.append(consumer['consumption'])
+                consumer_exe.append(exe_codes.setdefault(consumer['exe'], len(exe_codes)))
+                consumer_cmdline.append(cmdline_codes.setdefault(consumer['cmdline'], len(cmdline_codes)))
+            consumer_offsets.append(len(consumer_pid))
+
+        return cls(np.frombuffer(host_timestamp, dtype=np.float64), np.frombuffer(host_consumption, dtype=np.float64),
+                   np.frombuffer(consumer_offsets, dtype=np.int64), np.frombuffer(consumer_pid, dtype=np.int64),
+                   np.frombuffer(consumer_timestamp, dtype=np.float64), np.frombuffer(consumer_consumption, dtype=np.float64),
+                   np.frombuffer(consumer_exe, dtype=np.int32), np.frombuffer(consumer_cmdline, dtype=np.int32),
+                   list(exe_codes), list(cmdline_codes))
+
+    @classmethod
+    def from_rapl(cls, records: np.ndarray) -> 'PowerSamples':
+        # The native RAPL sampler only measures the host, so there are no consumers
+        empty_int, empty_float = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        empty_code = np.zeros(0, dtype=np.int32)
+        return cls(records['timestamp'], records['consumption'],
+                   np.zeros(len(records) + 1, dtype=np.int64), empty_int,
+                   empty_float, empty_float, empty_code, empty_code, [], [])
+
+    def save(self, path: str, signature: Dict[str, Any]) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            np.savez(file,
+                     version=CACHE_VERSION,
+                     source_size=signature['size'],
+                     source_mtime_ns=signature['mtime_ns'],
+                     source_sha256=signature['sha256'],
+                     host_timestamp=self.host_timestamp,
+                     host_consumption=self.host_consumption,
+                     consumer_offsets=self.consumer_offsets,
+                     consumer_pid=self.consumer_pid,
+                     consumer_timestamp=self.consumer_timestamp,
+                     consumer_consumption=self.consumer_consumption,
+                     consumer_exe=self.consumer_exe,
+                     consumer_cmdline=self.consumer_cmdline,
+                     exe_names=np.array(self.exe_names, dtype=str),
+                     cmdline_names=np.array(self.cmdline_names, dtype=str))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple['PowerSamples', Dict[str, Any]]:
+        with np.load(path) as data:
+            if int(data['version']) != CACHE_VERSION:
+                raise ValueError(f"Unsupported cache version {int(data['version'])} in {path}")
+            signature = {
+                'size': int(data['source_size']),
+                'mtime_ns': int(data['source_mtime_ns']),
+                'sha256': str(data['source_sha256'])
+            }
+            samples = cls(data['host_timestamp'], data['host_consumption'],
+                          data['consumer_offsets'], data['consumer_pid'],
+                          data['consumer_timestamp'], data['consumer_consumption'],
+                          data['consumer_exe'], data['consumer_cmdline'],
+                          data['exe_names'].tolist(), data['cmdline_names'].tolist())
+        return samples, signature
+
+def power_file(directory: str) -> str:
+    for name in POWER_FILES:
+        if os.path.exists(f"{directory}/{name}"):
+            return f"{directory}/{name}"
+    return f"{directory}/{POWER_FILES[0]}"
+
+def cache_path_for(filepath: str) -> str:
+    return os.path.splitext(filepath)[0] + '.npz'
+
+def ingest_power_samples(filepath: str, cache_path: Optional[str] = None) -> PowerSamples:
+    cache_path = cache_path or cache_path_for(filepath)
+    signature = file_signature(filepath)
+    samples = PowerSamples.from_json(iter_json_array(filepath))
+    samples.save(cache_path, signature)
+    logging.info("Ingested %d samples from %s", len(samples), filepath)
+    return samples
+
+def load_power_samples(filepath: str, cache_path: Optional[str] = None) -> PowerSamples:
+    if filepath.endswith('.bin'):
+        return PowerSamples.from_rapl(np.fromfile(filepath, dtype=RAPL_RECORD))
+
+    cache_path = cache_path or cache_path_for(filepath)
+    if os.path.exists(cache_path):
+        try:
+            samples, cached_signature = PowerSamples.load(cache_path)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning("Ignoring unreadable sample cache %s: %s", cache_path, e)
+        else:
+            if not os.path.exists(filepath):
+                logging.warning("%s is missing, using sample cache %s as is", filepath, cache_path)
+                return samples
+            if same_signature(file_signature(filepath, cached_signature), cached_signature):
+                return samples
+            logging.info("Sample cache %s is stale", cache_path)
+
+    return ingest_power_samples(filepath, cache_path)
@@ -1,10 +1,14 @@
 from typing import List, Dict, Any
 from misc.util import read_json, read_file
+from .power_samples import PowerSamples, load_power_samples, power_file
+from .process_ptrace import ptrace_file
 import logging
 
 def check(directory: str) -> bool:
-    power = read_json(f"{directory}/power.json")
-    ptrace = read_file(f"{directory}/ptrace.txt")
+    power = load_power_samples(power_file(directory))
+    ptrace_path = ptrace_file(directory)
+    # The bcc tracer only records the container's processes, a container that never forks leaves it empty
+    ptrace = [None] if ptrace_path.endswith('.bin') else read_file(ptrace_path)
     rpid = read_file(f"{directory}/rpid.txt")
     timesheet = read_json(f"{directory}/timesheet.json")
 
@@ -25,7 +29,7 @@ def check_timesheet(timesheet: List[Dict[str, Any]], freq: float = 0.05) -> bool
     log_error("No block event found")
     return False
 
-def check_power(power: List[Any]) -> bool:
+def check_power(power: PowerSamples) -> bool:
     return check_non_empty_list(power, "power")
 
 def check_ptrace(ptrace: List[Any]) -> bool:
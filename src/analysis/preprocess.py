@@ -1,53 +1,66 @@
+import os
 import sys
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from misc.util import read_json, write_json
+from .power_samples import PowerSamples, load_power_samples
+import numpy as np
 import logging
 
-def prune_edges(content: List[Dict[str, Any]], timesheet: List[Dict[str, Any]], event_name: str, buffer: float) -> List[Dict[str, Any]]:
+# Sidecar next to the power file with the sample offsets of the pruned window
+PRUNE_FILE = 'prune.json'
+
+def prune_window(timesheet: List[Dict[str, Any]], event_name: str, buffer: float) -> Optional[Tuple[float, float]]:
     event = next((event for event in timesheet if event['name'] == event_name), None)
     if not event:
         logging.error(f"No event named '{event_name}' found in timesheet")
-        return content
-
-    start = event['start'] - buffer
-    end = event['end'] + buffer
-
-    start_index = closest_index(content, start)
-    end_index = closest_index(content, end, ascending=False)
-
-    return content[start_index:end_index]
+        return None
+    return event['start'] - buffer, event['end'] + buffer
 
-def closest_index(content: List[Dict[str, Any]], time: float, ascending: bool = True) -> int:
-    if ascending:
-        return find_closest_index_ascending(content, time)
-    else:
-        return find_closest_index_descending(content, time)
-
-def find_closest_index_ascending(content: List[Dict[str, Any]], time: float) -> int:
-    if content[0]['host']['timestamp'] > time:
-        raise ValueError(f"First entry {content[0]['host']['timestamp']} is after time {time}")
+def prune_edges(content: PowerSamples, timesheet: List[Dict[str, Any]], event_name: str, buffer: float) -> PowerSamples:
+    window = prune_window(timesheet, event_name, buffer)
+    if not window:
+        return content
+    return content.slice(*prune_offsets(content.host_timestamp, *window))
 
-    index = 0
-    while content[index]['host']['timestamp'] < time:
-        index += 1
-    return index
+def prune_offsets(timestamps: np.ndarray, start: float, end: float) -> Tuple[int, int]:
+    # The first sample at or after start, and the last sample at or before end, which the slice leaves out
+    if len(timestamps) == 0 or timestamps[0] > start:
+        raise ValueError(f"First entry {timestamps[0] if len(timestamps) else None} is after time {start}")
+    if timestamps[-1] < end:
+        raise ValueError(f"Last entry {timestamps[-1]} is before time {end}")
+    return int(np.searchsorted(timestamps, start, side='left')), int(np.searchsorted(timestamps, end, side='right')) - 1
 
-def find_closest_index_descending(content: List[Dict[str, Any]], time: float) -> int:
-    if content[-1]['host']['timestamp'] < time:
-        raise ValueError(f"Last entry {content[-1]['host']['timestamp']} is before time {time}")
+def sample_span(content: PowerSamples) -> List[Any]:
+    # Identifies the samples the offsets index into, together with the window
+    return [len(content), float(content.host_timestamp[0]), float(content.host_timestamp[-1])] if len(content) else [0]
 
-    index = len(content) - 1
-    while content[index]['host']['timestamp'] > time:
-        index -= 1
-    return index
+def read_prune_offsets(path: str, window: Tuple[float, float], span: List[Any]) -> Optional[Tuple[int, int]]:
+    # Offsets of an earlier run, if they were found for the same window in the same samples
+    if not os.path.exists(path):
+        return None
+    try:
+        prune = read_json(path)
+        if prune['window'] == list(window) and prune['samples'] == span:
+            return prune['start'], prune['end']
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning("Ignoring unreadable prune offsets %s: %s", path, e)
+    return None
 
-def preprocess_scaphandre(filepath: str, output: str, timesheet_path: str, prune_mark: str = "block", prune_buffer: float = 0) -> List[Dict[str, Any]]:
+def preprocess_scaphandre(filepath: str, timesheet_path: str, prune_mark: str = "block", prune_buffer: float = 0) -> PowerSamples:
     try:
-        content = read_json(filepath)
+        content = load_power_samples(filepath)
         timesheet = read_json(timesheet_path)
-        corrected_content = prune_edges(content, timesheet, prune_mark, prune_buffer)
-        write_json(output, corrected_content)
-        return corrected_content
+        window = prune_window(timesheet, prune_mark, prune_buffer)
+        if not window:
+            return content
+
+        prune_path = f"{os.path.dirname(filepath)}/{PRUNE_FILE}"
+        offsets = read_prune_offsets(prune_path, window, sample_span(content))
+        if offsets is None:
+            offsets = prune_offsets(content.host_timestamp, *window)
+            write_json(prune_path, {'window': list(window), 'samples': sample_span(content), 'start': offsets[0], 'end': offsets[1]})
+        # A view of the loaded samples, nothing is copied or written out
+        return content.slice(*offsets)
     except Exception as e:
         logging.error(f"Error during preprocessing: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -1,4 +1,18 @@
-from typing import Dict, List
+import os
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Tuple
+from misc.util import read_json
+from misc.records import PTRACE_RECORD, PTRACE_FORK
+
+# bpftrace output, or the records of the bcc tracer
+PTRACE_FILES = ['ptrace.txt', 'ptrace.bin']
+FORK_LINE = re.compile(r'^C(\d+): .* \((\d+)\) -> .* \((\d+)\)$')
+EXIT_LINE = re.compile(r'^X(\d+): .* \((\d+)\)$')
+
+# (kind, monotonic nanoseconds, pid, parent pid) with kind being 'fork' or 'exit'
+ProcessEvent = Tuple[str, int, int, Optional[int]]
 
 def build_process_tree(filename: str) -> Dict[str, List[str]]:
     process_tree: Dict[str, List[str]] = {}
@@ -39,3 +53,149 @@ def resolve(filename: str, target_pid: str) -> List[int]:
     process_tree = build_process_tree(filename)
     descendants = find_all_descendants(process_tree, target_pid)
     return list(map(int, descendants))
+
+def ptrace_file(directory: str) -> str:
+    for name in PTRACE_FILES:
+        if os.path.exists(f"{directory}/{name}"):
+            return f"{directory}/{name}"
+    return f"{directory}/{PTRACE_FILES[0]}"
+
+def read_ptrace_records(filename: str) -> Iterator[ProcessEvent]:
+    for record in np.fromfile(filename, dtype=PTRACE_RECORD).tolist():
+        timestamp, kind, pid, parent_pid, _ = record
+        if kind == PTRACE_FORK:
+            yield 'fork', timestamp, pid, parent_pid
+        else:
+            yield 'exit', timestamp, pid, None
+
+def read_ptrace_events(filename: str) -> Iterator[ProcessEvent]:
+    if filename.endswith('.bin'):
+        yield from read_ptrace_records(filename)
+        return
+    with open(filename, 'r') as file:
+        for line in file:
+            line = line.strip()
+            match = FORK_LINE.match(line)
+            if match:
+                yield 'fork', int(match.group(1)), int(match.group(3)), int(match.group(2))
+                continue
+            match = EXIT_LINE.match(line)
+            if match:
+                yield 'exit', int(match.group(1)), int(match.group(2)), None
+
+def clock_path(filename: str) -> str:
+    return os.path.splitext(filename)[0] + '_clock.json'
+
+def monotonic_offset(filename: str) -> Optional[float]:
+    # Seconds to add to a monotonic trace timestamp to get the wall clock time of the power samples
+    path = clock_path(filename)
+    if not os.path.exists(path):
+        return None
+    clock = read_json(path)
+    return clock['realtime'] - clock['monotonic_ns'] / 1e9
+
+class ProcessLifetimes:
+    # One entry per process instance, so that a reused PID gets a new instance with its own
+    # lifetime and ancestry. Times are monotonic nanoseconds, unknown bounds are +-inf.
+
+    def __init__(self) -> None:
+        self.pid: List[int] = []
+        self.start: List[float] = []
+        self.end: List[float] = []
+        self.parent: List[Optional[int]] = []
+        self.live: Dict[int, int] = {}
+
+    def instance(self, pid: int) -> int:
+        # A PID seen before it was forked existed before tracing started
+        if pid not in self.live:
+            self.live[pid] = self.add(pid, -np.inf, None)
+        return self.live[pid]
+
+    def add(self, pid: int, start: float, parent: Optional[int]) -> int:
+        self.pid.append(pid)
+        self.start.append(start)
+        self.end.append(np.inf)
+        self.parent.append(parent)
+        return len(self.pid) - 1
+
+    def fork(self, timestamp: int, parent_pid: int, child_pid: int) -> None:
+        parent = self.instance(parent_pid)
+        if child_pid in self.live:
+            # Reused without a recorded exit, the previous instance ended before this fork
+            self.end[self.live[child_pid]] = timestamp
+        self.live[child_pid] = self.add(child_pid, timestamp, parent)
+
+    def exit(self, timestamp: int, pid: int) -> None:
+        if pid in self.live:
+            self.end[self.live.pop(pid)] = timestamp
+
+    def descendants(self, root: int) -> List[int]:
+        children: Dict[int, List[int]] = {}
+        for index, parent in enumerate(self.parent):
+            if parent is not None:
+                children.setdefault(parent, []).append(index)
+
+        descendants: List[int] = []
+        stack: List[int] = [root]
+        while stack:
+            current = stack.pop()
+            descendants.append(current)
+            stack.extend(children.get(current, []))
+        return descendants
+
+    def root(self, pid: int) -> int:
+        # The most recent instance of the PID, the container is started last in a trace
+        instances = [index for index, instance_pid in enumerate(self.pid) if instance_pid == pid]
+        return instances[-1] if instances else self.instance(pid)
+
+def build_process_lifetimes(filename: str) -> ProcessLifetimes:
+    lifetimes = ProcessLifetimes()
+    try:
+        for kind, timestamp, pid, parent_pid in read_ptrace_events(filename):
+            if kind == 'fork':
+                lifetimes.fork(timestamp, parent_pid, pid)
+            else:
+                lifetimes.exit(timestamp, pid)
+    except FileNotFoundError:
+        raise Exception(f"File not found: {filename}")
+    return lifetimes
+
+class ProcessIntervals:
+    # Lifetimes of the attributed process instances in wall clock seconds
+
+    def __init__(self, pid: np.ndarray, start: np.ndarray, end: np.ndarray) -> None:
+        self.pid = pid
+        self.start = start
+        self.end = end
+
+    def pids(self) -> List[int]:
+        return sorted(set(self.pid.tolist()))
+
+    def contains(self, pids: np.ndarray, timestamps: np.ndarray) -> np.ndarray:
+        # For every sample the instance of its PID that started last before it, then whether it was still alive
+        samples = pd.DataFrame({'pid': pids.astype(np.int64), 'timestamp': timestamps, 'position': np.arange(len(pids))})
+        samples = samples.sort_values('timestamp', kind='stable')
+        intervals = pd.DataFrame({'pid': self.pid, 'start': self.start, 'end': self.end}).sort_values('start', kind='stable')
+
+        merged = pd.merge_asof(samples, intervals, left_on='timestamp', right_on='start', by='pid', direction='backward')
+        mask = np.zeros(len(pids), dtype=bool)
+        mask[merged['position'].to_numpy()] = (merged['timestamp'] <= merged['end']).to_numpy()
+        return mask
+
+def resolve_intervals(filename: str, target_pid: str) -> ProcessIntervals:
+    lifetimes = build_process_lifetimes(filename)
+    instances = lifetimes.descendants(lifetimes.root(int(target_pid)))
+
+    pid = np.array([lifetimes.pid[i] for i in instances], dtype=np.int64)
+    start = np.array([lifetimes.start[i] for i in instances], dtype=np.float64)
+    end = np.array([lifetimes.end[i] for i in instances], dtype=np.float64)
+
+    offset = monotonic_offset(filename)
+    if offset is None:
+        # Traces without a clock reference can only be attributed by PID
+        start[:] = -np.inf
+        end[:] = np.inf
+    else:
+        start = start / 1e9 + offset
+        end = end / 1e9 + offset
+    return ProcessIntervals(pid, start, end)
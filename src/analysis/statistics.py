@@ -0,0 +1,58 @@
+import numpy as np
+from scipy.stats import shapiro, ttest_ind, mannwhitneyu, t
+from typing import Any, Dict, Tuple
+
+# Significance level of the Shapiro-Wilk test that decides between Welch's t-test and Mann-Whitney U
+NORMALITY_ALPHA = 0.05
+
+def is_normal(values: np.ndarray) -> bool:
+    # Shapiro-Wilk needs at least three values
+    if len(values) < 3 or np.ptp(values) == 0:
+        return False
+    return shapiro(values)[1] > NORMALITY_ALPHA
+
+def difference_test(base: np.ndarray, other: np.ndarray) -> Dict[str, Any]:
+    # The test compare_variations chooses for the two samples
+    if is_normal(base) and is_normal(other):
+        stat, p = ttest_ind(base, other, equal_var=False)
+        return {'test': 'ttest', 'stat': float(stat), 'p': float(p)}
+    stat, p = mannwhitneyu(base, other)
+    return {'test': 'mannwhitneyu', 'stat': float(stat), 'p': float(p)}
+
+def mean_difference_interval(base: np.ndarray, other: np.ndarray, confidence: float = 0.95) -> Tuple[float, float]:
+    # Welch confidence interval of mean(other) - mean(base)
+    v1, v2 = np.var(base, ddof=1) / len(base), np.var(other, ddof=1) / len(other)
+    difference = np.mean(other) - np.mean(base)
+    standard_error = np.sqrt(v1 + v2)
+    if standard_error == 0:
+        return difference, difference
+    dof = (v1 + v2) ** 2 / (v1 ** 2 / (len(base) - 1) + v2 ** 2 / (len(other) - 1))
+    half_width = t.ppf((1 + confidence) / 2, dof) * standard_error
+    return difference - half_width, difference + half_width
+
+def mean_interval(values: np.ndarray, confidence: float = 0.95) -> Tuple[float, float]:
+    mean = np.mean(values)
+    half_width = t.ppf((1 + confidence) / 2, len(values) - 1) * np.std(values, ddof=1) / np.sqrt(len(values))
+    return mean - half_width, mean + half_width
+
+def bootstrap_means(values: np.ndarray, resamples: int, rng: np.random.Generator) -> np.ndarray:
+    # Column means of every bootstrap sample of the rows of values, drawn at once as a matrix of row indices
+    indices = rng.integers(0, len(values), size=(resamples, len(values)))
+    return values[indices].mean(axis=1)
+
+def bootstrap_difference_interval(base_means: np.ndarray, other_means: np.ndarray,
+                                  confidence: float = 0.95) -> Tuple[np.ndarray, np.ndarray]:
+    # Percentile interval of mean(other) - mean(base) per column, from the bootstrap means of each
+    low, high = np.quantile(other_means - base_means, [(1 - confidence) / 2, (1 + confidence) / 2], axis=0)
+    return low, high
+
+def permutation_test(base: np.ndarray, other: np.ndarray, resamples: int, rng: np.random.Generator) -> np.ndarray:
+    # Two-sided p-value of the difference in means per column, every permutation shuffles the pooled rows
+    pooled = np.concatenate([base, other])
+    order = rng.permuted(np.tile(np.arange(len(pooled)), (resamples, 1)), axis=1)
+    permuted = pooled[order]
+    differences = permuted[:, len(base):].mean(axis=1) - permuted[:, :len(base)].mean(axis=1)
+    observed = np.abs(other.mean(axis=0) - base.mean(axis=0))
+    # Permutations that reproduce the observed split differ from it by rounding only
+    extreme = np.sum(np.abs(differences) >= observed * (1 - 1e-9), axis=0)
+    return (extreme + 1) / (resamples + 1)
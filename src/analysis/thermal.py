@@ -0,0 +1,80 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+from misc.records import THERMAL_VERSION, thermal_record
+from misc.util import read_json
+
+THERMAL_FILE = 'thermal.bin'
+# Single sensor recording of earlier versions
+LEGACY_TEMPERATURE_FILE = 'cpu_temps.csv'
+RUN_TABLE_FILE = 'run_table.json'
+THERMAL_INPUTS = [THERMAL_FILE, LEGACY_TEMPERATURE_FILE, RUN_TABLE_FILE]
+# Where a distributed experiment collects the files of each worker
+HOSTS_DIRECTORY = 'hosts'
+
+def thermal_sources(out_path: str) -> List[Tuple[str, Optional[str]]]:
+    # Directories with a thermal recording and the worker that recorded it, None for a local experiment
+    hosts = f"{out_path}/{HOSTS_DIRECTORY}"
+    if os.path.exists(f"{out_path}/{THERMAL_FILE}") or not os.path.isdir(hosts):
+        return [(out_path, None)]
+    return [(f"{hosts}/{worker}", worker) for worker in sorted(os.listdir(hosts))
+            if os.path.exists(f"{hosts}/{worker}/{THERMAL_FILE}")]
+
+def thermal_inputs(out_path: str) -> List[str]:
+    return THERMAL_INPUTS + [os.path.relpath(f"{directory}/{THERMAL_FILE}", out_path)
+                             for directory, worker in thermal_sources(out_path) if worker is not None]
+
+def read_thermal(path: str) -> Tuple[Dict[str, Any], np.ndarray]:
+    with open(path, 'rb') as file:
+        header = json.loads(file.readline())
+        data = file.read()
+    if header['version'] != THERMAL_VERSION:
+        raise ValueError(f"Unsupported thermal recording version {header['version']} in {path}")
+    dtype = thermal_record(len(header['channels']))
+    # A recording interrupted during a flush ends in a partial record
+    records = np.frombuffer(data[:len(data) - len(data) % dtype.itemsize], dtype=dtype)
+    return header, records
+
+def load_thermal(out_path: str) -> Tuple[pd.DataFrame, List[str], List[str]]:
+    # One row per sample with the time, run table entry and a column per channel,
+    # along with the names of the temperature and frequency channels
+    path = f"{out_path}/{THERMAL_FILE}"
+    if not os.path.exists(path):
+        legacy = pd.read_csv(f"{out_path}/{LEGACY_TEMPERATURE_FILE}")
+        df = pd.DataFrame({'time': legacy['time'], 'entry': -1, 'cpu': legacy['temperature_celcius']})
+        return df, ['cpu'], []
+
+    header, records = read_thermal(path)
+    channels = header['channels']
+    df = pd.DataFrame(records['values'].astype(np.float64), columns=channels)
+    df.insert(0, 'entry', records['entry'])
+    df.insert(0, 'time', records['timestamp'])
+    temperature_channels = channels[:header['temperature_channels']]
+    return df, temperature_channels, channels[header['temperature_channels']:]
+
+def temperature_long(df: pd.DataFrame, temperature_channels: List[str]) -> pd.DataFrame:
+    return df.melt(id_vars='time', value_vars=temperature_channels, var_name='sensor', value_name='temperature_celcius')
+
+def thermal_by_entry(df: pd.DataFrame, temperature_channels: List[str], frequency_channels: List[str], out_path: str,
+                     worker: Optional[str] = None) -> pd.DataFrame:
+    # Thermal state during every variation of the run table, or of those that ran on the worker
+    run_table = pd.DataFrame(read_json(f"{out_path}/{RUN_TABLE_FILE}"))
+    if worker is not None:
+        run_table = run_table[run_table['worker'] == worker]
+    running = df[df['entry'] >= 0]
+    grouped = running.groupby('entry')
+
+    summary = pd.DataFrame(index=pd.Index(run_table['entry'], name='entry'))
+    summary['samples'] = grouped.size()
+    if temperature_channels:
+        summary['temperature_mean'] = grouped[temperature_channels].mean().mean(axis=1)
+        summary['temperature_max'] = grouped[temperature_channels].max().max(axis=1)
+    if frequency_channels:
+        summary['frequency_mean_mhz'] = grouped[frequency_channels].mean().mean(axis=1)
+        summary['frequency_min_mhz'] = grouped[frequency_channels].min().min(axis=1)
+    summary['samples'] = summary['samples'].fillna(0).astype(int)
+
+    columns = [column for column in ['image', 'repetition', 'host', 'worker'] if column in run_table]
+    return run_table.set_index('entry')[columns].join(summary)
@@ -1,50 +1,79 @@
 import re
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Callable, Optional
+from .power_samples import PowerSamples
+from .process_ptrace import ProcessIntervals
 
 class ScaphandreToDf:
 
-    def __init__(self, json_data: List[Dict[str, Any]], pids: Optional[List[int]] = None, regex: Optional[str] = None) -> None:
-        self.json_data = json_data
+    def __init__(self, samples: PowerSamples, pids: Optional[List[int]] = None, regex: Optional[str] = None) -> None:
+        self.samples = samples
         self.pids = pids
         self.regex = regex
-        self.fst_ts = self.find_fst_ts(json_data)
+        self.fst_ts = self.find_fst_ts(samples)
         self.dfs: Dict[str, pd.DataFrame] = {}
 
     def host_to_df(self) -> None:
-        filtered = [
-            {"timestamp": entry['host']['timestamp'] - self.fst_ts, "consumption": entry['host']['consumption'] / 1000000}
-            for entry in self.json_data
-        ]
-        df = pd.DataFrame(filtered).set_index('timestamp')
+        df = pd.DataFrame({
+            "timestamp": self.samples.host_timestamp - self.fst_ts,
+            "consumption": self.samples.host_consumption / 1000000
+        }).set_index('timestamp')
         self.dfs['host'] = df
 
-    def travers_json(self, checker) -> None:
-        results: Dict[str, List[Dict[str, Any]]] = {}
-        for entry in self.json_data:
-            for consumer in entry['consumers']:
-                if checker(consumer):
-                    pid = consumer['pid']
-                    if pid not in results:
-                        results[pid] = []
-                    results[pid].append({
-                        "timestamp": consumer['timestamp'] - self.fst_ts,
-                        "consumption": consumer['consumption'] / 1000000  # may be wrong due to https://github.com/hubblo-org/scaphandre/issues/378
-                    })
-                    
-        for pid in results:
-            results[pid] = sorted(results[pid], key=lambda x: x['timestamp'])
-            self.dfs[pid] = pd.DataFrame(results[pid]).set_index('timestamp')
-        
+    def match_consumers(self, checker: Callable[[int, str, str], bool]) -> np.ndarray:
+        # The checker runs once per distinct (pid, exe, cmdline), the result is broadcast to all consumers
+        samples = self.samples
+        codes, _ = pd.factorize(samples.consumer_pid)
+        codes, _ = pd.factorize(codes * len(samples.exe_names) + samples.consumer_exe)
+        codes, uniques = pd.factorize(codes * len(samples.cmdline_names) + samples.consumer_cmdline)
+
+        representatives = np.empty(len(uniques), dtype=np.int64)
+        representatives[codes] = np.arange(len(codes))
+        keys = zip(samples.consumer_pid[representatives].tolist(),
+                   samples.consumer_exe[representatives].tolist(),
+                   samples.consumer_cmdline[representatives].tolist())
+
+        table = np.fromiter((bool(checker(pid, samples.exe_names[exe], samples.cmdline_names[cmdline])) for pid, exe, cmdline in keys),
+                            dtype=bool, count=len(uniques))
+        return table[codes]
+
+    def split_consumers(self, mask: np.ndarray) -> None:
+        pids = self.samples.consumer_pid[mask]
+        timestamps = self.samples.consumer_timestamp[mask] - self.fst_ts
+        consumption = self.samples.consumer_consumption[mask] / 1000000  # may be wrong due to https://github.com/hubblo-org/scaphandre/issues/378
+
+        order = np.lexsort((timestamps, pids))
+        pids, timestamps, consumption = pids[order], timestamps[order], consumption[order]
+        unique_pids, starts = np.unique(pids, return_index=True)
+        ends = np.append(starts[1:], len(pids))
+
+        # Keep the PIDs in order of their first sample, as when appending them while traversing
+        first_seen = np.minimum.reduceat(order, starts) if len(order) else order
+        for group in np.argsort(first_seen, kind='stable'):
+            start, end = starts[group], ends[group]
+            self.dfs[int(unique_pids[group])] = pd.DataFrame(
+                {"consumption": consumption[start:end]},
+                index=pd.Index(timestamps[start:end], name='timestamp')
+            )
+
     def pid_to_dfs(self, pids: List[int]) -> None:
-        self.travers_json(lambda x: x['pid'] in pids)
+        pids = set(pids)
+        self.split_consumers(self.match_consumers(lambda pid, exe, cmdline: pid in pids))
+
+    def intervals_to_dfs(self, intervals: ProcessIntervals) -> None:
+        # Attribution depends on the sample time, so there is no per-key memoization
+        self.split_consumers(intervals.contains(self.samples.consumer_pid, self.samples.consumer_timestamp))
 
     def regex_to_dfs(self, regex: str) -> None:
-        self.travers_json(lambda x: re.match(regex, x['exe']) or re.match(regex, x['cmdline']))
+        pattern = re.compile(regex)
+        self.split_consumers(self.match_consumers(lambda pid, exe, cmdline: pattern.match(exe) or pattern.match(cmdline)))
 
-    def find_fst_ts(self, json_data: List[Dict[str, Any]]) -> float:
-        return min(json_data[0]['host']['timestamp'], 
-                   min([consumer['timestamp'] for consumer in json_data[0]['consumers']]))
+    def find_fst_ts(self, samples: PowerSamples) -> float:
+        consumers = samples.consumer_timestamp[samples.consumer_offsets[0]:samples.consumer_offsets[1]]
+        if len(consumers) == 0:
+            return samples.host_timestamp[0]
+        return min(samples.host_timestamp[0], consumers.min())
 
     def export_dfs(self, output_path: str) -> None:
         for name, df in self.dfs.items():
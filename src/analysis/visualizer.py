@@ -1,6 +1,12 @@
+import matplotlib
+# Plots are only saved to files, also from worker processes
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
 
 def set_plot_theme():
     sns.set_theme()
@@ -8,15 +14,70 @@ def set_plot_theme():
     plt.rcParams['font.family'] = 'FreeSerif'
 
 def concatenate_dataframes(dfs):
-    for df in dfs:
-        df.reset_index(inplace=True)
-    return pd.concat(dfs, ignore_index=True)
+    return pd.concat([df.reset_index() for df in dfs], ignore_index=True)
 
 def save_plot(output_path, formats=('png', 'pdf')):
     for fmt in formats:
         plt.savefig(f"{output_path}.{fmt}", format=fmt, bbox_inches='tight')
+    plt.close()
+
+def render(tasks: List[Tuple[Callable[..., Any], Tuple]], jobs: int = 1) -> None:
+    # Renders independent plots, in parallel worker processes if jobs > 1
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for future in [executor.submit(function, *args) for function, args in tasks]:
+                future.result()
+    else:
+        for function, args in tasks:
+            function(*args)
+
+class PowerHistogram:
+    # 2-D histogram of power over time that runs are added to one at a time. Both axes start at 0 and
+    # keep a fixed number of bins, when a run exceeds an axis its range is doubled by merging pairs of bins.
+
+    def __init__(self, time_bins: int = 512, power_bins: int = 128) -> None:
+        self.counts = np.zeros((time_bins, power_bins), dtype=np.int64)
+        self.time_max: Optional[float] = None
+        self.power_max: Optional[float] = None
+
+    def add(self, df: pd.DataFrame) -> None:
+        timestamps = df.index.to_numpy(dtype=np.float64)
+        consumption = df['consumption'].to_numpy(dtype=np.float64)
+        if len(timestamps) == 0:
+            return
+        if self.time_max is None:
+            self.time_max = max(timestamps.max(), 1e-9) * 1.0001
+            self.power_max = max(consumption.max(), 1e-9) * 1.0001
+
+        while timestamps.max() >= self.time_max:
+            self.counts = self.counts[0::2] + self.counts[1::2]
+            self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
+            self.time_max *= 2
+        while consumption.max() >= self.power_max:
+            self.counts = self.counts[:, 0::2] + self.counts[:, 1::2]
+            self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)], axis=1)
+            self.power_max *= 2
+
+        counts, _, _ = np.histogram2d(timestamps, consumption, bins=self.counts.shape,
+                                      range=[[0, self.time_max], [0, self.power_max]])
+        self.counts += counts.astype(np.int64)
+
+    def extent(self) -> Tuple[float, float]:
+        # The data only fills the lower bins after a doubling
+        time_used = np.nonzero(self.counts.any(axis=1))[0]
+        power_used = np.nonzero(self.counts.any(axis=0))[0]
+        time_end = (time_used[-1] + 1) / self.counts.shape[0] * self.time_max if len(time_used) else 1
+        power_end = (power_used[-1] + 1) / self.counts.shape[1] * self.power_max if len(power_used) else 1
+        return time_end, power_end
+
+def power_plot(dfs, output_path, show=False, title='Heatmap of power consumption over time', mode='histogram'):
+    if mode == 'histogram':
+        histogram = PowerHistogram()
+        for df in dfs:
+            histogram.add(df)
+        power_histogram_plot(histogram, output_path, show)
+        return
 
-def power_plot(dfs, output_path, show=False, title='Heatmap of power consumption over time'):
     set_plot_theme()
     
     combined_df = concatenate_dataframes(dfs)
@@ -38,6 +99,29 @@ def power_plot(dfs, output_path, show=False, title='Heatmap of power consumption
         plt.show()
     save_plot(output_path)
     
+def power_histogram_plot(histogram: PowerHistogram, output_path, show=False):
+    set_plot_theme()
+
+    plt.figure(figsize=(14, 4))
+    ax = plt.gca()
+    rocket_cmap = sns.color_palette("rocket_r", as_cmap=True)
+    ax.imshow(histogram.counts.T, origin='lower', aspect='auto', cmap=rocket_cmap, interpolation='nearest',
+              extent=(0, histogram.time_max, 0, histogram.power_max))
+
+    plt.xlabel('Time (s)')
+    plt.ylabel('Power (W)')
+
+    ax.set_facecolor(rocket_cmap(0))
+    ax.grid(False)
+
+    time_end, power_end = histogram.extent()
+    ax.set_xlim(0, time_end)
+    ax.set_ylim(0, power_end)
+
+    if show:
+        plt.show()
+    save_plot(output_path)
+
 def distribution_plot(dfs, column_name, output_path, column_nice_name):
     set_plot_theme()
     
@@ -83,7 +167,7 @@ def plot_temperature(df, output_path):
     set_plot_theme()
     
     plt.figure(figsize=(14, 4))
-    ax = sns.lineplot(data=df, x='time', y='temperature_celcius')
+    ax = sns.lineplot(data=df, x='time', y='temperature_celcius', hue='sensor', legend=df['sensor'].nunique() > 1)
     plt.axhline(y=100, color='red')
     
     plt.xlabel('Time (s)')
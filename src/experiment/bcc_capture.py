@@ -0,0 +1,147 @@
+import os
+import time
+import ctypes
+import logging
+import threading
+import numpy as np
+import psutil
+from bcc import BPF
+from misc.records import PTRACE_RECORD, PTRACE_FORK, PTRACE_EXIT
+from .processes_capture import write_clock
+
+# Only processes forked by a tracked process, or from within the target cgroup, are reported.
+# The layout of event_t matches PTRACE_RECORD.
+BPF_PROGRAM = """
+struct event_t {
+    u64 timestamp;
+    u32 kind;
+    u32 pid;
+    u32 parent_pid;
+    u32 padding;
+};
+
+BPF_RINGBUF_OUTPUT(events, 64);
+BPF_HASH(tracked, u32, u8, 65536);
+BPF_ARRAY(target_cgroup, u64, 1);
+
+static inline int in_target_cgroup() {
+    int zero = 0;
+    u64 *cgroup = target_cgroup.lookup(&zero);
+    return cgroup && *cgroup && *cgroup == bpf_get_current_cgroup_id();
+}
+
+static inline void submit(u32 kind, u32 pid, u32 parent_pid) {
+    struct event_t *event = events.ringbuf_reserve(sizeof(struct event_t));
+    if (!event)
+        return;
+    event->timestamp = bpf_ktime_get_ns();
+    event->kind = kind;
+    event->pid = pid;
+    event->parent_pid = parent_pid;
+    event->padding = 0;
+    events.ringbuf_submit(event, 0);
+}
+
+TRACEPOINT_PROBE(sched, sched_process_fork) {
+    u32 parent_pid = args->parent_pid;
+    u32 child_pid = args->child_pid;
+    if (!tracked.lookup(&parent_pid) && !in_target_cgroup())
+        return 0;
+
+    u8 one = 1;
+    tracked.update(&child_pid, &one);
+    submit(PTRACE_FORK, child_pid, parent_pid);
+    return 0;
+}
+
+TRACEPOINT_PROBE(sched, sched_process_exit) {
+    u64 id = bpf_get_current_pid_tgid();
+    u32 pid = id >> 32;
+    u32 tid = (u32)id;
+    if (!tracked.lookup(&tid))
+        return 0;
+
+    tracked.delete(&tid);
+    // Threads are untracked silently, only the main thread ends its process
+    if (pid == tid)
+        submit(PTRACE_EXIT, pid, 0);
+    return 0;
+}
+"""
+
+def cgroup_id(pid: int) -> int:
+    # On cgroup v2 the id of a cgroup is the inode of its directory
+    with open(f"/proc/{pid}/cgroup") as file:
+        for line in file:
+            hierarchy, _, path = line.strip().split(':', 2)
+            if hierarchy == '0':
+                return os.stat(f"/sys/fs/cgroup{path}").st_ino
+    raise FileNotFoundError(f"No cgroup v2 membership for PID {pid}")
+
+class BccProcessesCapture:
+
+    output_name = 'ptrace.bin'
+
+    def __init__(self, poll_timeout: int = 100):
+        self.poll_timeout = poll_timeout
+        self.bpf = None
+        self.file = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.running = False
+
+    def start_tracing(self, output_file):
+        if self.running:
+            return
+        self.bpf = BPF(text=BPF_PROGRAM, cflags=[f"-DPTRACE_FORK={PTRACE_FORK}", f"-DPTRACE_EXIT={PTRACE_EXIT}"])
+        self.file = open(output_file, 'wb')
+        write_clock(output_file)
+        self.bpf['events'].open_ring_buffer(self._handle_event)
+
+        self.running = True
+        self.thread = threading.Thread(target=self._poll, daemon=True)
+        self.thread.start()
+        logging.info("Tracing started.")
+
+    def set_root(self, pid):
+        self.bpf['tracked'][ctypes.c_uint(pid)] = ctypes.c_ubyte(1)
+        try:
+            self.bpf['target_cgroup'][ctypes.c_int(0)] = ctypes.c_ulonglong(cgroup_id(pid))
+        except (OSError, ValueError) as e:
+            logging.warning("Filtering on the descendants of %d only, cgroup not found: %s", pid, e)
+
+        # Children forked before the root was known are seeded from /proc
+        try:
+            children = psutil.Process(pid).children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        for child in children:
+            try:
+                parent_pid = child.ppid()
+            except psutil.NoSuchProcess:
+                continue
+            self.bpf['tracked'][ctypes.c_uint(child.pid)] = ctypes.c_ubyte(1)
+            self._write(np.array([(time.clock_gettime_ns(time.CLOCK_MONOTONIC), PTRACE_FORK, child.pid, parent_pid, 0)], dtype=PTRACE_RECORD).tobytes())
+
+    def stop_tracing(self):
+        if not self.running:
+            return
+        self.running = False
+        self.thread.join()
+        self.bpf.ring_buffer_consume()
+        self.bpf.cleanup()
+        self.bpf = None
+        self.file.close()
+        self.file = None
+        logging.info("Tracing stopped.")
+
+    def _poll(self):
+        while self.running:
+            self.bpf.ring_buffer_poll(self.poll_timeout)
+
+    def _handle_event(self, ctx, data, size):
+        self._write(ctypes.string_at(data, size))
+
+    def _write(self, record: bytes):
+        with self.lock:
+            self.file.write(record)
@@ -0,0 +1,62 @@
+import os
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from .segmentation import Segment
+
+CHECKPOINT_FILE = 'checkpoint.json'
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+
+class Checkpoint:
+    # The shuffled run table and the status of each of its entries, saved after every change so that an
+    # interrupted experiment can be resumed. Entries that were running when it was interrupted are redone.
+    # With a session sampler the windows of the finished entries are kept until the session is cut.
+
+    def __init__(self, path: str, run_table: Optional[List[Tuple[int, int]]] = None, status: Optional[List[str]] = None,
+                 segments: Optional[List[Tuple[int, str, float, float]]] = None) -> None:
+        self.path = path
+        self.run_table: List[Tuple[int, int]] = run_table or []
+        self.status: List[str] = status or []
+        self.segments: List[Tuple[int, str, float, float]] = segments or []
+
+    @classmethod
+    def load(cls, path: str) -> 'Checkpoint':
+        with open(path) as file:
+            data: Dict[str, Any] = json.load(file)
+        return cls(path, [tuple(entry) for entry in data['run_table']], data['status'],
+                   [tuple(segment) for segment in data['segments']])
+
+    def save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({'run_table': self.run_table, 'status': self.status, 'segments': self.segments}, file, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def extend(self, entries: List[Tuple[int, int]]) -> None:
+        self.run_table.extend(entries)
+        self.status.extend([PENDING] * len(entries))
+        self.save()
+
+    def start(self, entry: int) -> None:
+        self.status[entry] = RUNNING
+        self.save()
+
+    def complete(self, entry: int, segments: List[Segment]) -> None:
+        self.status[entry] = DONE
+        self.segments.extend((entry, *segment) for segment in segments)
+        self.save()
+
+    def reset(self, entry: int) -> None:
+        self.status[entry] = PENDING
+        self.save()
+
+    def clear_segments(self) -> None:
+        self.segments = []
+        self.save()
+
+    def pending(self) -> List[int]:
+        return [entry for entry, status in enumerate(self.status) if status != DONE]
+
+    def done(self) -> List[int]:
+        return [entry for entry, status in enumerate(self.status) if status == DONE]
@@ -0,0 +1,349 @@
+import io
+import os
+import re
+import json
+import time
+import shutil
+import socket
+import random
+import logging
+import tarfile
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from misc.config import load_configuration
+from misc import tracing
+from misc.util import get_display_name, read_json, setup_directory, write_json
+from .checkpoint import Checkpoint, CHECKPOINT_FILE, PENDING, RUNNING
+from .metadata import get_metadata
+from .runner import Runner
+
+# The files of every worker are collected under hosts/<worker>
+HOSTS_DIRECTORY = 'hosts'
+RUN_TABLE_FILE = 'run_table.json'
+WORKER_FILES = ['metadata.json', 'thermal.bin', 'experiment_trace.json', 'experiment_trace_summary.txt']
+DEFAULT_PORT = 8470
+# Only local workers can reach a coordinator by default, the server is unauthenticated
+DEFAULT_BIND = '127.0.0.1'
+# Worker names are used as directory and container names
+WORKER_NAME = re.compile(r'^[A-Za-z0-9_.-]+$')
+# Seconds a worker waits before asking again while the last entries are running elsewhere
+POLL_INTERVAL = 5
+
+def check_distributable(config: Dict[str, Any]) -> None:
+    if 'adaptive' in config['procedure']:
+        raise ValueError("Adaptive repetitions are analyzed between rounds and cannot be distributed")
+    if config['procedure'].get('sampler_session', False):
+        raise ValueError("A session sampler records one host and cannot be distributed")
+
+def worker_name(name: Optional[str] = None) -> str:
+    # Also part of container names, which only allow these characters
+    return check_worker_name(re.sub(r'[^a-zA-Z0-9_.-]', '-', name or f"{socket.gethostname()}-{os.getpid()}"))
+
+def check_worker_name(name: str) -> str:
+    if not WORKER_NAME.match(name) or name in ('.', '..'):
+        raise ValueError(f"Invalid worker name {name!r}")
+    return name
+
+def pack(directory: str, names: Optional[List[str]] = None) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name in names if names is not None else sorted(os.listdir(directory)):
+            if os.path.exists(f"{directory}/{name}"):
+                archive.add(f"{directory}/{name}", arcname=name)
+    return buffer.getvalue()
+
+def unpack(data: bytes, directory: str) -> None:
+    os.makedirs(directory, exist_ok=True)
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as archive:
+        if hasattr(tarfile, 'data_filter'):
+            archive.extractall(directory, filter='data')
+        else:
+            # Extraction filters are missing before 3.10.12 and 3.11.4, the members are checked here instead
+            root = os.path.realpath(directory)
+            for member in archive.getmembers():
+                path = os.path.realpath(os.path.join(root, member.name))
+                if not (member.isfile() or member.isdir()) or os.path.commonpath([root, path]) != root:
+                    raise tarfile.TarError(f"Refusing to extract {member.name!r}")
+            archive.extractall(directory)
+
+class Coordinator:
+    # Owns the shuffled run table and leases its entries to workers over HTTP. A worker runs an entry and uploads
+    # its repetition directory, which is unpacked into the output tree as if the entry had run locally. Entries
+    # whose lease expires, because their worker died, are leased again.
+
+    def __init__(self, config_path: str, resume: bool = False, lease_timeout: float = 3600) -> None:
+        self.config: Dict[str, Any] = load_configuration(config_path)
+        check_distributable(self.config)
+        self.out: str = self.config['out']
+        self.lease_timeout = lease_timeout
+        self.leases: Dict[int, Tuple[str, float]] = {}
+        self.workers: Dict[str, Dict[str, Any]] = {}
+        self.finished: set = set()
+        # When every worker last made a request, those silent for longer than the lease timeout are taken as dead
+        self.seen: Dict[str, float] = {}
+        self.condition = threading.Condition()
+
+        if resume:
+            self.checkpoint = Checkpoint.load(f"{self.out}/{CHECKPOINT_FILE}")
+            # Nothing is leased by a new coordinator, entries that were running are run again
+            for entry, status in enumerate(self.checkpoint.status):
+                if status == RUNNING:
+                    self.checkpoint.reset(entry)
+            self.assignments: Dict[int, Dict[str, str]] = {
+                row['entry']: {'host': row['host'], 'worker': row['worker']}
+                for row in read_json(f"{self.out}/{RUN_TABLE_FILE}") if 'worker' in row}
+            logging.info("Resuming with %d of %d entries left", len(self.checkpoint.pending()), len(self.checkpoint.run_table))
+        else:
+            if os.path.exists(self.out):
+                shutil.rmtree(self.out)
+            os.makedirs(self.out)
+            write_json(f"{self.out}/metadata.json", {'coordinator': get_metadata(), 'workers': {}}, 'x')
+            self.checkpoint = Checkpoint(f"{self.out}/{CHECKPOINT_FILE}")
+            run_table = [(image_index, repetition)
+                         for image_index, repetitions in enumerate(self.config['procedure']['external_repetitions'])
+                         for repetition in range(repetitions)]
+            random.shuffle(run_table)
+            self.checkpoint.extend(run_table)
+            self.assignments = {}
+        self.write_run_table()
+
+    def serve(self, bind: str = DEFAULT_BIND, port: int = DEFAULT_PORT) -> None:
+        server = self.listen(bind, port)
+        try:
+            self.wait()
+        finally:
+            server.shutdown()
+            server.server_close()
+        logging.info("All entries done")
+
+    def listen(self, bind: str, port: int) -> ThreadingHTTPServer:
+        server = ThreadingHTTPServer((bind, port), CoordinatorHandler)
+        server.coordinator = self
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        logging.info("Coordinating %d entries on %s:%d", len(self.checkpoint.run_table), bind, server.server_port)
+        return server
+
+    def wait(self) -> None:
+        # Returns once every entry is done and every worker that registered has delivered its files or died
+        with self.condition:
+            while self.checkpoint.pending() or not self.finished >= set(self.workers) - self.expired():
+                self.condition.wait(min(POLL_INTERVAL, self.lease_timeout))
+            for worker in sorted(set(self.workers) - self.finished):
+                logging.warning("Worker %s did not deliver its files", worker)
+
+    def expired(self) -> set:
+        now = time.time()
+        return {worker for worker, seen in self.seen.items() if now - seen > self.lease_timeout}
+
+    def touch(self, worker: str) -> None:
+        self.seen[worker] = time.time()
+
+    def check_registered(self, worker: str) -> None:
+        if worker not in self.workers:
+            raise PermissionError(f"Worker {worker!r} is not registered")
+
+    def register(self, worker: str, host: str) -> Dict[str, Any]:
+        check_worker_name(worker)
+        with self.condition:
+            self.workers[worker] = {'host': host, 'registered': time.time()}
+            self.finished.discard(worker)
+            self.touch(worker)
+            logging.info("Worker %s on %s registered", worker, host)
+            return {'run_table': self.checkpoint.run_table}
+
+    def lease(self, worker: str) -> Dict[str, Any]:
+        with self.condition:
+            self.check_registered(worker)
+            self.touch(worker)
+            now = time.time()
+            for entry, (holder, leased) in list(self.leases.items()):
+                if now - leased > self.lease_timeout:
+                    logging.warning("Lease of entry %d by %s expired, leasing it again", entry, holder)
+                    del self.leases[entry]
+                    self.checkpoint.reset(entry)
+
+            pending = [entry for entry in self.checkpoint.pending() if self.checkpoint.status[entry] == PENDING]
+            if pending:
+                entry = pending[0]
+                self.leases[entry] = (worker, now)
+                self.checkpoint.start(entry)
+                image_index, repetition = self.checkpoint.run_table[entry]
+                return {'entry': entry, 'image': image_index, 'repetition': repetition}
+            if self.checkpoint.pending():
+                return {'wait': POLL_INTERVAL}
+            return {'done': True}
+
+    def complete(self, worker: str, entry: int, data: bytes) -> bool:
+        with self.condition:
+            self.check_registered(worker)
+            self.touch(worker)
+            if self.leases.get(entry, (None,))[0] != worker:
+                # The lease expired and the entry went to another worker, or was already completed
+                logging.warning("Discarding entry %d from %s, which does not hold its lease", entry, worker)
+                return False
+            image_index, repetition = self.checkpoint.run_table[entry]
+            directory = self.repetition_directory(image_index, repetition)
+            if os.path.exists(directory):
+                shutil.rmtree(directory)
+            unpack(data, directory)
+
+            del self.leases[entry]
+            self.assignments[entry] = {'host': self.workers.get(worker, {}).get('host', ''), 'worker': worker}
+            self.checkpoint.complete(entry, [])
+            self.write_run_table()
+            logging.info("Entry %d done by %s, %d left", entry, worker, len(self.checkpoint.pending()))
+            self.condition.notify_all()
+            return True
+
+    def finish(self, worker: str, data: bytes) -> None:
+        with self.condition:
+            self.check_registered(worker)
+            self.touch(worker)
+            directory = f"{self.out}/{HOSTS_DIRECTORY}/{worker}"
+            unpack(data, directory)
+            if os.path.exists(f"{directory}/metadata.json"):
+                metadata = read_json(f"{self.out}/metadata.json")
+                metadata['workers'][worker] = read_json(f"{directory}/metadata.json")
+                write_json(f"{self.out}/metadata.json", metadata)
+            self.finished.add(worker)
+            logging.info("Worker %s finished", worker)
+            self.condition.notify_all()
+
+    def repetition_directory(self, image_index: int, repetition: int) -> str:
+        # Where analyze reads the repetition
+        return setup_directory(self.out, get_display_name(self.config['images'][image_index]), repetition)
+
+    def write_run_table(self) -> None:
+        # The run table of a local experiment, with the host and worker that ran every entry
+        entries = [{'entry': entry, 'image': self.config['images'][image_index], 'repetition': repetition,
+                    **self.assignments.get(entry, {})}
+                   for entry, (image_index, repetition) in enumerate(self.checkpoint.run_table)]
+        write_json(f"{self.out}/{RUN_TABLE_FILE}", entries)
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self) -> None:
+        url = urllib.parse.urlparse(self.path)
+        params = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        coordinator: Coordinator = self.server.coordinator
+        try:
+            if url.path == '/register':
+                self.reply(200, coordinator.register(params['worker'], params.get('host', '')))
+            elif url.path == '/lease':
+                self.reply(200, coordinator.lease(params['worker']))
+            elif url.path == '/complete':
+                accepted = coordinator.complete(params['worker'], int(params['entry']), body)
+                self.reply(200 if accepted else 409, {'accepted': accepted})
+            elif url.path == '/finish':
+                coordinator.finish(params['worker'], body)
+                self.reply(200, {})
+            else:
+                self.reply(404, {'error': f"Unknown path {url.path}"})
+        except PermissionError as e:
+            self.reply(403, {'error': str(e)})
+        except (KeyError, ValueError, tarfile.TarError) as e:
+            self.reply(400, {'error': str(e)})
+
+    def reply(self, status: int, content: Dict[str, Any]) -> None:
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logging.debug("%s %s", self.address_string(), format % args)
+
+class Worker:
+    # Runs the entries leased from a coordinator with its own sampler, tracer and thermal recording. Entries run
+    # in a staging directory and are removed from it once uploaded.
+
+    def __init__(self, config_path: str, coordinator: str, name: Optional[str] = None,
+                 staging: Optional[str] = None, offline: bool = False) -> None:
+        self.coordinator = coordinator.rstrip('/')
+        self.name = worker_name(name)
+        self.host = socket.gethostname()
+        self.runner = Runner(config_path, offline)
+        check_distributable(self.runner.config)
+        self.staging = staging or f"{self.runner.config['out']}/.workers/{self.name}"
+        self.runner.config['out'] = self.staging
+        self.runner.container_suffix = f"-{self.name}"
+
+    def run(self) -> None:
+        runner = self.runner
+        try:
+            with tracing.span('pull'):
+                images = runner.pull_images()
+            with tracing.span('setup'):
+                runner.setup()
+            if 'experiment_warmup' in runner.config['procedure']:
+                with tracing.span('experiment_warmup'):
+                    runner.warmup()
+
+            run_table = self.request('/register', {'host': self.host})['run_table']
+            runner.checkpoint = Checkpoint(f"{self.staging}/{CHECKPOINT_FILE}", [tuple(entry) for entry in run_table],
+                                           [PENDING] * len(run_table))
+            runner.write_run_table(runner.checkpoint.run_table)
+
+            while True:
+                lease = self.request('/lease')
+                if lease.get('done'):
+                    break
+                if 'wait' in lease:
+                    time.sleep(lease['wait'])
+                    continue
+                directory = runner.run_entry(images[lease['image']], lease['entry'], lease['repetition'])
+                with tracing.span('upload', entry=lease['entry']):
+                    self.upload(directory, lease['entry'])
+        finally:
+            runner.teardown()
+
+    def finish(self) -> None:
+        # Delivers the metadata, thermal recording and trace of the worker
+        self.request('/finish', data=pack(self.staging, WORKER_FILES))
+        shutil.rmtree(self.staging)
+
+    def upload(self, directory: str, entry: int) -> None:
+        # directory is the repetition directory the runner wrote the entry to
+        try:
+            self.request('/complete', {'entry': entry}, pack(directory))
+        except urllib.error.HTTPError as e:
+            if e.code != 409:
+                raise
+            logging.warning("Coordinator discarded entry %d, its lease had expired", entry)
+        shutil.rmtree(directory)
+
+    def request(self, path: str, params: Optional[Dict[str, Any]] = None, data: bytes = b'') -> Dict[str, Any]:
+        query = urllib.parse.urlencode({'worker': self.name, **(params or {})})
+        request = urllib.request.Request(f"{self.coordinator}{path}?{query}", data=data, method='POST',
+                                         headers={'Content-Type': 'application/octet-stream'})
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+
+def coordinate(config_path: str, bind: str = DEFAULT_BIND, port: int = DEFAULT_PORT, resume: bool = False,
+               lease_timeout: float = 3600) -> None:
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(message)s')
+    Coordinator(config_path, resume, lease_timeout).serve(bind, port)
+
+def work(config_path: str, coordinator: str, name: Optional[str] = None, staging: Optional[str] = None,
+         offline: bool = False, trace: bool = False) -> None:
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(message)s')
+    worker = Worker(config_path, coordinator, name, staging, offline)
+    if trace:
+        tracing.enable(f"worker {worker.name}")
+    try:
+        with tracing.span('worker'):
+            worker.run()
+    finally:
+        # Also after a failure, so the coordinator does not wait for the worker until it expires
+        if trace:
+            summary = tracing.write_trace(f"{worker.staging}/experiment_trace")
+            logging.info("Worker stages:\n%s", summary)
+        worker.finish()
@@ -0,0 +1,76 @@
+import logging
+import docker
+import docker.errors
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+SCAPHANDRE_IMAGE = 'philippsommer27/scaphandre'
+
+def split_reference(name: str) -> Tuple[str, str]:
+    # Repository and tag, the port of a registry host is not a tag
+    repository, _, tag = name.rpartition(':')
+    if not repository or '/' in tag:
+        return name, 'latest'
+    return repository, tag
+
+def repo_digests(image: docker.models.images.Image) -> List[str]:
+    return [reference.split('@', 1)[1] for reference in image.attrs.get('RepoDigests', [])]
+
+def image_digest(image: docker.models.images.Image) -> Optional[str]:
+    digests = repo_digests(image)
+    return digests[0] if digests else None
+
+class ImagePuller:
+    # Pulls images concurrently, skipping those whose local copy already has the wanted digest. That is
+    # the pinned digest if there is one, and otherwise the digest the registry currently has for the tag.
+
+    def __init__(self, client: docker.DockerClient, jobs: int = 4, offline: bool = False,
+                 digests: Optional[Dict[str, str]] = None) -> None:
+        self.client = client
+        self.jobs = jobs
+        self.offline = offline
+        self.digests = digests or {}
+
+    def pull_all(self, names: List[str], platforms: Optional[Dict[str, str]] = None) -> Dict[str, docker.models.images.Image]:
+        platforms = platforms or {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {name: executor.submit(self.pull, name, platforms.get(name)) for name in names}
+            return {name: future.result() for name, future in futures.items()}
+
+    def pull(self, name: str, platform: Optional[str] = None) -> docker.models.images.Image:
+        local = self.local(name)
+        if self.offline:
+            if local is None:
+                raise docker.errors.ImageNotFound(f"Image {name} is not available locally and pulling is disabled")
+            logging.info("Using local image %s", name)
+            return local
+
+        wanted = self.digests.get(name) or self.registry_digest(name)
+        if local is not None and wanted is not None and wanted in repo_digests(local):
+            logging.info("Image %s is up to date", name)
+            return local
+
+        repository, tag = split_reference(name)
+        if name in self.digests:
+            logging.info("Pulling image %s@%s", repository, self.digests[name])
+            image = self.client.images.pull(f"{repository}@{self.digests[name]}", platform=platform)
+            # Tagged so that it is found under its name like any other image
+            image.tag(repository, tag)
+            return self.client.images.get(name)
+
+        logging.info("Pulling image %s", name)
+        return self.client.images.pull(repository, tag=tag, platform=platform)
+
+    def local(self, name: str) -> Optional[docker.models.images.Image]:
+        try:
+            return self.client.images.get(name)
+        except docker.errors.ImageNotFound:
+            return None
+
+    def registry_digest(self, name: str) -> Optional[str]:
+        # Only fetches the manifest, the local copy is pulled anyway when this fails
+        try:
+            return self.client.images.get_registry_data(name).id
+        except docker.errors.APIError as e:
+            logging.warning("Could not get the registry digest of %s: %s", name, e)
+            return None
@@ -0,0 +1,100 @@
+import os
+import json
+import logging
+import statistics
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+CPU_ROOT = '/sys/devices/system/cpu'
+# Observers and the orchestrator share the first CPU unless configured otherwise
+DEFAULT_OBSERVER_CPUS = '0'
+
+def parse_cpuset(text: str) -> Set[int]:
+    # The list format of cpuset and sysfs, e.g. 0-3,8,10-11
+    cpus: Set[int] = set()
+    for part in str(text).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+def format_cpuset(cpus: Set[int]) -> str:
+    ranges: List[Tuple[int, int]] = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], cpu)
+        else:
+            ranges.append((cpu, cpu))
+    return ','.join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+def thread_siblings(cpu: int, cpu_root: str = CPU_ROOT) -> Set[int]:
+    # The hardware threads sharing a core with the CPU, itself included
+    try:
+        with open(f"{cpu_root}/cpu{cpu}/topology/thread_siblings_list") as file:
+            return parse_cpuset(file.read())
+    except OSError:
+        return {cpu}
+
+class CpuLayout:
+    # Disjoint CPU sets for the workload containers and for everything observing them: the orchestrator and
+    # its sampling threads, the tracer it starts, and the Scaphandre container. Without an explicit workload
+    # set, the workload gets every available CPU that shares no core with an observer CPU.
+
+    def __init__(self, workload: Set[int], observers: Set[int]) -> None:
+        if not workload or not observers:
+            raise ValueError("CPU isolation needs at least one workload and one observer CPU")
+        if workload & observers:
+            raise ValueError(f"Workload CPUs {format_cpuset(workload)} and observer CPUs {format_cpuset(observers)} overlap")
+        self.workload = workload
+        self.observers = observers
+
+    @classmethod
+    def from_config(cls, isolation: Dict[str, Any], cpu_root: str = CPU_ROOT) -> 'CpuLayout':
+        available = os.sched_getaffinity(0)
+        observers = parse_cpuset(isolation.get('observer_cpus', DEFAULT_OBSERVER_CPUS))
+        if 'workload_cpus' in isolation:
+            workload = parse_cpuset(isolation['workload_cpus'])
+        else:
+            shared = set().union(*(thread_siblings(cpu, cpu_root) for cpu in observers))
+            workload = available - observers - shared
+        unavailable = (workload | observers) - available
+        if unavailable:
+            raise ValueError(f"CPUs {format_cpuset(unavailable)} are not available")
+        return cls(workload, observers)
+
+    def pin_orchestrator(self) -> None:
+        # Every thread of this process, and the threads and processes it starts later, which inherit the affinity
+        for thread_id in os.listdir('/proc/self/task'):
+            os.sched_setaffinity(int(thread_id), self.observers)
+        logging.info("Workload on CPUs %s, observers on CPUs %s", format_cpuset(self.workload), format_cpuset(self.observers))
+
+    def summary(self) -> Dict[str, str]:
+        return {'workload_cpus': format_cpuset(self.workload), 'observer_cpus': format_cpuset(self.observers)}
+
+def run_durations(out_path: str, display_name: str, repetitions: List[int]) -> List[float]:
+    # Durations of the variation runs recorded by the runner in the timesheets
+    durations = []
+    for repetition in repetitions:
+        path = f"{out_path}/{display_name}/{repetition}/timesheet.json"
+        if not os.path.exists(path):
+            continue
+        with open(path) as file:
+            events = json.load(file)
+        durations.extend(event['duration'] for event in events if event.get('name') == display_name)
+    return durations
+
+def duration_variation(durations: List[float]) -> Dict[str, Optional[float]]:
+    # Coefficient of variation of the run durations, the run-to-run variance that interference adds to
+    mean = statistics.mean(durations) if durations else None
+    cv = statistics.stdev(durations) / mean if len(durations) > 1 and mean else None
+    return {'runs': len(durations), 'mean_duration': mean, 'cv': cv}
+
+def variance_reduction(variation: Dict[str, Dict[str, Optional[float]]],
+                       baseline: Dict[str, Dict[str, Optional[float]]]) -> Dict[str, Optional[float]]:
+    # Relative reduction of the coefficient of variation of every image against a campaign without isolation
+    reduction: Dict[str, Optional[float]] = {}
+    for image, current in variation.items():
+        base = baseline.get(image, {}).get('cv')
+        reduction[image] = 1 - current['cv'] / base if current['cv'] is not None and base else None
+    return reduction
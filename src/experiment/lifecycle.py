@@ -0,0 +1,86 @@
+import time
+import docker
+import docker.errors
+from typing import Any, Callable, Dict, Optional
+from misc import tracing
+
+# Container state transitions that are recorded from the events stream
+TRANSITIONS = ('create', 'start', 'die')
+
+class ContainerLifecycle:
+    # Follows a container through the Docker events stream instead of polling its state, until it dies or is
+    # destroyed. The stream has to be opened with subscribe() before the container is created.
+
+    def __init__(self, client: docker.DockerClient, name: str) -> None:
+        self.client = client
+        self.name = name
+        self.stream = None
+        self.requested: Optional[float] = None
+        self.removed: Optional[float] = None
+        self.transitions: Dict[str, float] = {}
+        self.pid: Optional[int] = None
+        self.exit_code: Optional[int] = None
+
+    def subscribe(self) -> None:
+        # Without since the daemon only sends events from now on, so none of a previous container with the same name
+        self.stream = self.client.events(filters={'type': 'container', 'container': self.name}, decode=True)
+        self.requested = time.time()
+
+    def close(self) -> None:
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def follow(self, container: docker.models.containers.Container, on_start: Optional[Callable[[int], None]] = None) -> None:
+        # Blocks on the events stream until the container dies
+        try:
+            for event in self.stream:
+                if event.get('id') != container.id:
+                    continue
+
+                action = event.get('Action', event.get('status'))
+                if action == 'destroy':
+                    # Removed without a die event reaching us
+                    break
+                if action not in TRANSITIONS:
+                    continue
+                self.transitions[action] = event['timeNano'] / 1e9
+
+                if action == 'start':
+                    with tracing.span('pid_lookup'):
+                        try:
+                            self.pid = self.client.api.inspect_container(container.id)['State']['Pid'] or None
+                        except docker.errors.NotFound:
+                            # A short-lived container that removes itself can be gone already, its die and
+                            # destroy events still follow
+                            self.pid = None
+                    if self.pid and on_start:
+                        on_start(self.pid)
+                elif action == 'die':
+                    self.exit_code = int(event.get('Actor', {}).get('Attributes', {}).get('exitCode', -1))
+                    break
+        finally:
+            self.close()
+
+    def wait_removed(self, container: docker.models.containers.Container) -> None:
+        try:
+            container.wait(condition='removed')
+        except docker.errors.NotFound:
+            pass
+        self.removed = time.time()
+
+    def summary(self) -> Dict[str, Any]:
+        def between(start: Optional[float], end: Optional[float]) -> Optional[float]:
+            return end - start if start is not None and end is not None else None
+
+        return {
+            "name": self.name,
+            "pid": self.pid,
+            "exit_code": self.exit_code,
+            "requested": self.requested,
+            "transitions": self.transitions,
+            "removed": self.removed,
+            "start_latency": between(self.requested, self.transitions.get('start')),
+            "running_time": between(self.transitions.get('start'), self.transitions.get('die')),
+            "stop_latency": between(self.transitions.get('die'), self.removed)
+        }
@@ -0,0 +1,248 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from misc.records import RAPL_RECORD
+from misc.util import JSON_WHITESPACE, write_json
+
+STATUS_FILE = 'status.json'
+LIVE_FILE = 'live.json'
+
+class Welford:
+    # Running mean and variance, updated one value at a time
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def std(self) -> Optional[float]:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None
+
+    def summary(self) -> Dict[str, Any]:
+        return {'count': self.count, 'mean': self.mean if self.count else None, 'std': self.std()}
+
+class RunStatistics:
+    # Host energy, power and sampling intervals of one run, from the samples as they arrive
+
+    def __init__(self) -> None:
+        self.power = Welford()
+        self.interval = Welford()
+        self.energy = 0.0
+        self.max_interval = 0.0
+        self.first: Optional[float] = None
+        self.last: Optional[Tuple[float, float]] = None
+
+    def add(self, timestamp: float, power: float) -> None:
+        if self.last is not None:
+            last_timestamp, last_power = self.last
+            interval = timestamp - last_timestamp
+            self.interval.add(interval)
+            self.max_interval = max(self.max_interval, interval)
+            self.energy += interval * (power + last_power) / 2
+        else:
+            self.first = timestamp
+        self.power.add(power)
+        self.last = (timestamp, power)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'samples': self.power.count,
+            'duration': self.last[0] - self.first if self.last else 0.0,
+            'energy': self.energy,
+            'power_mean': self.power.mean if self.power.count else None,
+            'interval_mean': self.interval.mean if self.interval.count else None,
+            'interval_jitter': self.interval.std(),
+            'interval_max': self.max_interval
+        }
+
+class JsonArrayTail:
+    # New elements of a JSON array that Scaphandre is still writing. Only complete elements are consumed, the
+    # closing bracket never is, since the file may be rewritten with more elements in its place.
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.offset = 0
+        self.decoder = json.JSONDecoder()
+
+    def read(self) -> List[Tuple[float, float]]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset)
+            data = file.read()
+        text = data.decode('utf-8', errors='replace')
+        samples, index, consumed = [], 0, 0
+        while True:
+            while index < len(text) and (text[index] in JSON_WHITESPACE or text[index] in '[,'):
+                index += 1
+            if index == len(text) or text[index] == ']':
+                break
+            try:
+                element, index = self.decoder.raw_decode(text, index)
+            except json.JSONDecodeError:
+                break
+            consumed = index
+            # Scaphandre reports microwatts
+            samples.append((element['host']['timestamp'], element['host']['consumption'] / 1e6))
+        self.offset += len(text[:consumed].encode('utf-8'))
+        return samples
+
+class RecordTail:
+    # New records of a file of fixed size records, a partial record at the end is read once it is complete
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.offset = 0
+
+    def read(self) -> List[Tuple[float, float]]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset)
+            data = file.read()
+        data = data[:len(data) - len(data) % RAPL_RECORD.itemsize]
+        self.offset += len(data)
+        records = np.frombuffer(data, dtype=RAPL_RECORD)
+        return list(zip(records['timestamp'].tolist(), (records['consumption'] / 1e6).tolist()))
+
+def tail(path: str):
+    return RecordTail(path) if path.endswith('.bin') else JsonArrayTail(path)
+
+class LiveMonitor:
+    # Tails the sampler output during every run and keeps running statistics of the run and of the runs of each
+    # variation. The state is written to status.json in the output directory at every poll. At the
+    # end of a run its statistics are checked against the configured thresholds.
+
+    def __init__(self, out_path: str, images: List[str], settings: Dict[str, Any]) -> None:
+        self.out_path = out_path
+        self.settings = settings
+        self.interval = settings.get('interval', 1)
+        self.variations: Dict[str, Dict[str, Any]] = {
+            image: {'runs': 0, 'energy': Welford(), 'power': Welford(), 'jitter': Welford(), 'flagged': 0} for image in images}
+        self.flagged: List[Dict[str, Any]] = []
+        self.tails: Dict[str, Any] = {}
+        self.source = None
+        self.run: Optional[RunStatistics] = None
+        self.current: Optional[Dict[str, Any]] = None
+        self.started = 0.0
+        self.ended = math.inf
+        self.last_sample = 0.0
+        self.stalled = False
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def begin(self, path: str, run: Dict[str, Any], start_time: float, session: bool = False) -> None:
+        # run has the image, repetition and entry of the run
+        with self.lock:
+            if session:
+                # The session sampler keeps writing the same file, what it wrote in between runs is skipped
+                self.source = self.tails.setdefault(path, tail(path))
+                self.source.read()
+            else:
+                self.source = tail(path)
+            self.run = RunStatistics()
+            self.current = dict(run)
+            self.started, self.ended = start_time, math.inf
+            self.last_sample = time.time()
+            self.stalled = False
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._poll, daemon=True)
+        self.thread.start()
+
+    def mark_end(self, end_time: float) -> None:
+        # Samples after the end of the run that arrive before the sampler is stopped are not counted
+        with self.lock:
+            self.ended = end_time
+
+    def end(self) -> Tuple[Dict[str, Any], List[str]]:
+        # The statistics of the run and the thresholds it violates, once the sampler has written all its samples
+        self.stopped.set()
+        self.thread.join()
+        with self.lock:
+            self._read()
+            statistics = self.run.summary()
+            flags = self.check(statistics)
+            variation = self.variations[self.current['image']]
+            if flags:
+                variation['flagged'] += 1
+                self.flagged.append({**self.current, 'flags': flags})
+                logging.warning("Run %d of %s flagged: %s", self.current['repetition'], self.current['image'], ', '.join(flags))
+            else:
+                # Flagged runs would distort the reference of later outlier checks
+                variation['runs'] += 1
+                variation['energy'].add(statistics['energy'])
+                variation['power'].add(statistics['power_mean'] or 0.0)
+                if statistics['interval_jitter'] is not None:
+                    variation['jitter'].add(statistics['interval_jitter'])
+            logging.info("Run %d of %s: %d samples, %.1f J, %.1f W mean, %.4f s jitter", self.current['repetition'],
+                         self.current['image'], statistics['samples'], statistics['energy'],
+                         statistics['power_mean'] or 0.0, statistics['interval_jitter'] or 0.0)
+            self.run, self.current = None, None
+            self.write_status()
+        return statistics, flags
+
+    def check(self, statistics: Dict[str, Any]) -> List[str]:
+        settings = self.settings
+        flags = []
+        if statistics['samples'] < settings.get('min_samples', 2):
+            flags.append(f"{statistics['samples']} samples")
+        if 'max_gap' in settings and statistics['interval_max'] > settings['max_gap']:
+            flags.append(f"sampler gap of {statistics['interval_max']:.3f} s")
+        if 'max_jitter' in settings and (statistics['interval_jitter'] or 0) > settings['max_jitter']:
+            flags.append(f"interval jitter of {statistics['interval_jitter']:.4f} s")
+        if 'min_duration' in settings and statistics['duration'] < settings['min_duration']:
+            flags.append(f"truncated to {statistics['duration']:.1f} s")
+
+        energy = self.variations[self.current['image']]['energy']
+        if 'outlier_z' in settings and energy.count >= 3 and energy.std():
+            z = (statistics['energy'] - energy.mean) / energy.std()
+            if abs(z) > settings['outlier_z']:
+                flags.append(f"energy outlier (z = {z:.1f})")
+        return flags
+
+    def _poll(self) -> None:
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                if self._read():
+                    self.last_sample = time.time()
+                    self.stalled = False
+                elif 'max_gap' in self.settings and time.time() - self.last_sample > self.settings['max_gap'] and not self.stalled:
+                    logging.warning("No samples from the sampler for %.0f s", time.time() - self.last_sample)
+                    self.stalled = True
+                self.write_status()
+
+    def _read(self) -> int:
+        samples = self.source.read()
+        for timestamp, power in samples:
+            if self.started <= timestamp <= self.ended:
+                self.run.add(timestamp, power)
+        return len(samples)
+
+    def write_status(self) -> None:
+        status = {
+            'updated': time.time(),
+            'current': {**self.current, 'elapsed': time.time() - self.started, **self.run.summary()} if self.current else None,
+            'variations': {image: {
+                'runs': variation['runs'],
+                'flagged': variation['flagged'],
+                'energy': variation['energy'].summary(),
+                'power': variation['power'].summary(),
+                'jitter': variation['jitter'].summary()
+            } for image, variation in self.variations.items()},
+            'flagged': self.flagged
+        }
+        tmp_path = f"{self.out_path}/{STATUS_FILE}.tmp"
+        write_json(tmp_path, status)
+        os.replace(tmp_path, f"{self.out_path}/{STATUS_FILE}")
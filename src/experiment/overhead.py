@@ -0,0 +1,150 @@
+import os
+import time
+import random
+import logging
+import statistics
+import psutil
+from typing import Any, Dict, List, Optional, Set, Tuple
+from misc.util import create_directory, write_json
+from .rapl import RaplDomain, find_package_domains, POWERCAP_ROOT
+from .temperature import ThermalRecorder
+from .images import SCAPHANDRE_IMAGE
+
+# Observers that can be turned off individually, the orchestrator itself always runs
+COMPONENTS = ['sampler', 'tracer', 'thermal']
+OVERHEAD_IMAGE = 'alpine:latest'
+OVERHEAD_FILE = 'overhead.json'
+
+def configurations() -> Dict[str, Set[str]]:
+    # The full observation pipeline, the pipeline without each observer, and no observers at all
+    configs = {'full': set(COMPONENTS), 'none': set()}
+    for component in COMPONENTS:
+        configs[f"without_{component}"] = set(COMPONENTS) - {component}
+    return configs
+
+def host_busy_seconds() -> float:
+    times = psutil.cpu_times()
+    return sum(times) - times.idle - getattr(times, 'iowait', 0)
+
+def process_cpu_seconds() -> float:
+    times = psutil.Process().cpu_times()
+    return times.user + times.system
+
+class OverheadRunner:
+    # Runs an idle container with the observers of the runner toggled on and off, measuring host energy
+    # with the RAPL counters directly and host CPU time, so that neither depends on the observers.
+
+    def __init__(self, runner) -> None:
+        self.runner = runner
+        self.config = runner.config
+        procedure = self.config['procedure']
+        self.duration = procedure.get('overhead_duration', 30)
+        self.repetitions = procedure.get('overhead_repetitions', 3)
+        self.image = procedure.get('overhead_image', OVERHEAD_IMAGE)
+        self.output = f"{self.config['out']}/overhead"
+        self.domains: Optional[List[RaplDomain]] = None
+        self.energy_uj = 0
+
+    def run(self) -> Dict[str, Any]:
+        names, platforms = [self.image], {}
+        if self.runner.sampler_backend() == 'scaphandre':
+            names.append(SCAPHANDRE_IMAGE)
+            platforms[SCAPHANDRE_IMAGE] = 'linux/amd64'
+        self.runner.puller.pull_all(names, platforms)
+        self.runner.volumes = {
+            '/proc': {'bind': '/proc', 'mode': 'rw'},
+            '/sys/class/powercap': {'bind': '/sys/class/powercap', 'mode': 'rw'}
+        }
+        create_directory(self.output)
+
+        try:
+            self.domains = find_package_domains(self.config['procedure'].get('powercap_root', POWERCAP_ROOT))
+            for domain in self.domains:
+                domain.delta()
+        except (OSError, ValueError) as e:
+            logging.warning("Measuring CPU overhead only, RAPL counters unavailable: %s", e)
+
+        configs = configurations()
+        run_table = [(name, repetition) for name in configs for repetition in range(self.repetitions)]
+        random.shuffle(run_table)
+
+        runs = []
+        for name, repetition in run_table:
+            logging.info("Measuring overhead of configuration %s, repetition %d", name, repetition)
+            runs.append({'configuration': name, 'repetition': repetition, **self.measure(name, configs[name], repetition)})
+            if 'cooldown' in self.config['procedure']:
+                time.sleep(self.config['procedure']['cooldown'])
+
+        overhead = summarize(runs, self.duration)
+        write_json(f"{self.config['out']}/{OVERHEAD_FILE}", overhead)
+        return overhead
+
+    def measure(self, name: str, observers: Set[str], repetition: int) -> Dict[str, Any]:
+        directory = f"{self.output}/{name}/{repetition}"
+        create_directory(directory)
+        sampler, recorder = None, None
+
+        if 'tracer' in observers:
+            self.runner.pc.start_tracing(f"{directory}/{self.runner.pc.output_name}")
+        if 'sampler' in observers:
+            sampler = self.runner.start_sampler(os.path.relpath(f"{directory}/power", self.config['out']))
+        if 'thermal' in observers:
+            recorder = ThermalRecorder(self.config['procedure'].get('thermal_interval', 0.5))
+            recorder.start(f"{directory}/thermal.bin")
+
+        try:
+            energy_uj, busy, orchestrator, start = self.read_counters()
+            container = self.runner.client.containers.run(self.image, f"sleep {self.duration}", detach=True,
+                                                          cpuset_cpus=self.runner.workload_cpuset())
+            try:
+                container.wait()
+            finally:
+                container.remove(force=True)
+            energy_end_uj, busy_end, orchestrator_end, end = self.read_counters()
+        finally:
+            if recorder:
+                recorder.stop()
+            if sampler:
+                self.runner.stop_sampler(sampler)
+            if 'tracer' in observers:
+                self.runner.pc.stop_tracing()
+
+        wall = end - start
+        return {
+            'wall_s': wall,
+            'energy_j': (energy_end_uj - energy_uj) / 1e6 if self.domains else None,
+            'host_cpu_s': busy_end - busy,
+            'orchestrator_cpu_s': orchestrator_end - orchestrator
+        }
+
+    def read_counters(self) -> Tuple[int, float, float, float]:
+        # Accumulated across reads, the counters wrap around
+        if self.domains:
+            self.energy_uj += sum(domain.delta() for domain in self.domains)
+        return self.energy_uj, host_busy_seconds(), process_cpu_seconds(), time.time()
+
+def rates(runs: List[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+    # Mean power and CPU utilization of the runs of one configuration
+    def mean(values: List[Optional[float]]) -> Optional[float]:
+        values = [value for value in values if value is not None]
+        return statistics.mean(values) if values else None
+
+    return {
+        'power_w': mean([run['energy_j'] / run['wall_s'] if run['energy_j'] is not None else None for run in runs]),
+        'host_cpu': mean([run['host_cpu_s'] / run['wall_s'] for run in runs]),
+        'orchestrator_cpu': mean([run['orchestrator_cpu_s'] / run['wall_s'] for run in runs])
+    }
+
+def difference(a: Dict[str, Optional[float]], b: Dict[str, Optional[float]]) -> Dict[str, Optional[float]]:
+    return {key: a[key] - b[key] if a[key] is not None and b[key] is not None else None for key in a}
+
+def summarize(runs: List[Dict[str, Any]], duration: float) -> Dict[str, Any]:
+    configs = {name: rates([run for run in runs if run['configuration'] == name]) for name in configurations()}
+    return {
+        'duration': duration,
+        'configurations': configs,
+        # The overhead of a component is what the full pipeline costs more than the pipeline without it
+        'components': {component: difference(configs['full'], configs[f"without_{component}"]) for component in COMPONENTS},
+        'total': difference(configs['full'], configs['none']),
+        'runs': runs
+    }
@@ -1,11 +1,21 @@
 import subprocess
 import threading
+import time
 import os
+import json
 import logging
 
+def write_clock(output_file):
+    # Trace timestamps are CLOCK_MONOTONIC, record its offset to the wall clock of the power samples
+    monotonic_ns = time.clock_gettime_ns(time.CLOCK_MONOTONIC)
+    realtime = time.time()
+    with open(os.path.splitext(output_file)[0] + '_clock.json', 'w') as file:
+        json.dump({"monotonic_ns": monotonic_ns, "realtime": realtime}, file, indent=4)
+
 class ProcessesCapture:
 
     bpftrace_script = 'src/experiment/processtrace.bt'
+    output_name = 'ptrace.txt'
 
     def __init__(self):
         self.process = None
@@ -17,6 +27,7 @@ class ProcessesCapture:
             os.remove(output_file)
         open(output_file, 'w').close()
 
+        write_clock(output_file)
         command = ['bpftrace', self.bpftrace_script, '-o', output_file]
         self.process = subprocess.Popen(command)
         self.process.wait()
@@ -27,7 +38,11 @@ class ProcessesCapture:
             self.thread = threading.Thread(target=self._run_bpftrace, args=(output_file,))
             self.thread.start()
             logging.info("Tracing started.")
-            
+
+    def set_root(self, pid):
+        # bpftrace traces the whole host, the root is resolved during analysis
+        pass
+
     def stop_tracing(self):
         if self.running:
             self.running = False
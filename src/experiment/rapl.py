@@ -0,0 +1,128 @@
+import os
+import re
+import time
+import logging
+import threading
+import numpy as np
+from typing import List, Optional
+from misc.records import RAPL_RECORD
+
+POWERCAP_ROOT = '/sys/class/powercap'
+PACKAGE_DOMAIN = re.compile(r'^intel-rapl:\d+$')
+# Seconds in between flushes of the sample buffer
+FLUSH_INTERVAL = 1
+
+class RaplDomain:
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.max_energy_uj = int(self.read('max_energy_range_uj'))
+        self.last_energy_uj: Optional[int] = None
+
+    def read(self, name: str) -> str:
+        with open(f"{self.path}/{name}") as file:
+            return file.read().strip()
+
+    def delta(self) -> int:
+        energy_uj = int(self.read('energy_uj'))
+        if self.last_energy_uj is None:
+            delta = 0
+        elif energy_uj < self.last_energy_uj:
+            # The counter wrapped around max_energy_range_uj
+            delta = self.max_energy_uj - self.last_energy_uj + energy_uj
+        else:
+            delta = energy_uj - self.last_energy_uj
+        self.last_energy_uj = energy_uj
+        return delta
+
+def find_package_domains(powercap_root: str = POWERCAP_ROOT) -> List[RaplDomain]:
+    names = sorted(name for name in os.listdir(powercap_root) if PACKAGE_DOMAIN.match(name))
+    if not names:
+        raise FileNotFoundError(f"No RAPL package domains found in {powercap_root}")
+    return [RaplDomain(f"{powercap_root}/{name}") for name in names]
+
+# Samples the package energy counters of the powercap sysfs tree into a
+# preallocated ring buffer, which is flushed to the output file whenever it
+# fills up, every FLUSH_INTERVAL seconds and when sampling stops.
+class RaplSampler:
+
+    def __init__(self, freq: int, powercap_root: str = POWERCAP_ROOT, capacity: int = 1024) -> None:
+        self.interval = freq / 1e9
+        self.powercap_root = powercap_root
+        self.buffer = np.zeros(capacity, dtype=RAPL_RECORD)
+        self.index = 0
+        self.file = None
+        self.thread = None
+        self.running = False
+        self.error: Optional[Exception] = None
+
+    def start(self, output_file: str) -> None:
+        if self.running:
+            return
+        self.domains = find_package_domains(self.powercap_root)
+        # The first reads happen here, so unreadable counters, energy_uj is root-only on current kernels,
+        # fail the start rather than the sampling thread
+        for domain in self.domains:
+            domain.delta()
+        self.primed = time.time()
+        self.file = open(output_file, 'wb')
+        self.index = 0
+        self.error = None
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        logging.info("RAPL sampling started on %d package domain(s)", len(self.domains))
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.running = False
+        self.thread.join()
+        self.flush()
+        self.file.close()
+        self.file = None
+        if self.error:
+            logging.error("RAPL sampling stopped early, the output ends at the failure: %s", self.error)
+        else:
+            logging.info("RAPL sampling stopped")
+
+    def flush(self) -> None:
+        self.buffer[:self.index].tofile(self.file)
+        self.file.flush()
+        self.index = 0
+
+    def _sample(self) -> None:
+        try:
+            self._sample_loop()
+        except (OSError, ValueError) as e:
+            self.error = e
+            logging.error("RAPL sampling failed: %s", e)
+
+    def _sample_loop(self) -> None:
+        # The counters were primed by start
+        energy_uj = 0
+        last_time = last_flush = self.primed
+        deadline = time.monotonic()
+
+        while self.running:
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind, resynchronize instead of sampling in a burst
+                deadline = time.monotonic()
+
+            delta = sum(domain.delta() for domain in self.domains)
+            timestamp = time.time()
+            energy_uj += delta
+
+            consumption = delta / (timestamp - last_time) if timestamp > last_time else 0
+            self.buffer[self.index] = (timestamp, energy_uj, consumption)
+            last_time = timestamp
+
+            self.index += 1
+            # Also flushed regularly, so that the samples can be followed while the sampler runs
+            if self.index == len(self.buffer) or timestamp - last_flush >= FLUSH_INTERVAL:
+                self.flush()
+                last_flush = timestamp
@@ -1,12 +1,20 @@
-from typing import Dict, List, Optional, Set
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple, Union
 from misc.config import load_configuration
 from .processes_capture import ProcessesCapture
-from misc.util import get_display_name_tagged, create_directory, write_json
+from misc import tracing
+from misc.util import get_display_name_tagged, create_directory, write_json, read_json
 from .metadata import get_metadata
-from .temperature import start_temp_recording, stop_temp_recording
+from .temperature import ThermalRecorder
+from .rapl import RaplSampler, POWERCAP_ROOT
+from .segmentation import Segment, segment_session
+from .lifecycle import ContainerLifecycle
+from .images import ImagePuller, SCAPHANDRE_IMAGE, image_digest
+from .checkpoint import Checkpoint, CHECKPOINT_FILE
+from .overhead import OverheadRunner
+from .monitor import LiveMonitor, LIVE_FILE
+from .isolation import CpuLayout, run_durations, duration_variation, variance_reduction
 
 import sys
-import threading
 import docker
 import docker.types
 import os
@@ -16,39 +24,65 @@ import shutil
 import logging
 import random
 
+if TYPE_CHECKING:
+    from .scheduler import SequentialScheduler
+
+Sampler = Union[docker.models.containers.Container, RaplSampler]
+
 class Runner:
-    def __init__(self, config_path: str) -> None:
+    def __init__(self, config_path: str, offline: bool = False, resume: bool = False) -> None:
         self.config: Dict = load_configuration(config_path)
         self.client: docker.DockerClient = docker.from_env()
-        self.pc: ProcessesCapture = ProcessesCapture()
+        self.puller = ImagePuller(self.client, self.config['procedure'].get('pull_jobs', 4),
+                                  offline or self.config['procedure'].get('offline', False),
+                                  self.config['procedure'].get('digests'))
+        self.image_digests: Dict[str, Dict[str, Optional[str]]] = {}
+        self.layout: Optional[CpuLayout] = None
+        if 'cpu_isolation' in self.config['procedure']:
+            # Before any sampling thread or tracer is started, they inherit the affinity
+            self.layout = CpuLayout.from_config(self.config['procedure']['cpu_isolation'])
+            self.layout.pin_orchestrator()
+        self.pc = self.create_tracer()
         self.curr_dir_prefix: str = ""
         self.active_containers: Set[docker.models.containers.Container] = set()
-        self.recording_thread = None
+        self.recorder: Optional[ThermalRecorder] = None
+        self.monitor: Optional[LiveMonitor] = None
+        self.current_run: Dict = {}
+        self.run_flags: List[str] = []
+        self.active_sampler: Optional[RaplSampler] = None
+        self.session_sampler: Optional[Sampler] = None
+        self.segments: List[Segment] = []
+        self.resume = resume
+        # Keeps the container names of workers sharing a Docker daemon apart
+        self.container_suffix: str = ''
+        self.checkpoint = Checkpoint(f"{self.config['out']}/{CHECKPOINT_FILE}")
 
     def run(self) -> None:
         try:
-            images: List[docker.models.images.Image] = []
-            for image in self.config['images']:
-                logging.info("Pulling image %s", image)
-                images.append(self.client.images.pull(image))
+            with tracing.span('pull'):
+                images: List[docker.models.images.Image] = self.pull_images()
             
-            self.setup()
+            with tracing.span('setup'):
+                self.setup()
 
             if 'experiment_warmup' in self.config['procedure']:
-                self.warmup()
-
-            run_table = []
-            for image_index, repetitions in enumerate(self.config['procedure']['external_repetitions']):
-                run_table.extend([(image_index, rep) for rep in range(repetitions)])
-            
-            random.shuffle(run_table)
-
-            for image_index, repetition in run_table:
-                self.curr_dir_prefix = f"/{repetition}"
-                self.run_variation(images[image_index])
-
-                if 'cooldown' in self.config['procedure']:
-                    time.sleep(self.config['procedure']['cooldown'])
+                with tracing.span('experiment_warmup'):
+                    self.warmup()
+
+            if 'adaptive' in self.config['procedure']:
+                self.run_adaptive(images)
+            else:
+                if not self.checkpoint.run_table:
+                    run_table = []
+                    for image_index, repetitions in enumerate(self.config['procedure']['external_repetitions']):
+                        run_table.extend([(image_index, rep) for rep in range(repetitions)])
+
+                    random.shuffle(run_table)
+                    self.checkpoint.extend(run_table)
+                self.write_run_table(self.checkpoint.run_table)
+                self.run_pending(images)
+
+            self.record_run_variation(images)
         
         except docker.errors.ImageNotFound as e:
             logging.error(f"Docker image not found: {e}")
@@ -57,12 +91,103 @@ class Runner:
         except Exception as e:
             logging.error(f"Unexpected error in run method: {e}")
         finally:
+            self.teardown()
+
+    def teardown(self) -> None:
+        if self.session_sampler:
+            with tracing.span('finish_session'):
+                self.finish_session()
+        if self.active_sampler:
+            self.stop_sampler(self.active_sampler)
+        with tracing.span('cleanup'):
             self.cleanup_all_containers()
-            if self.recording_thread:
-                stop_temp_recording(self.recording_thread, self.config['out'] + '/cpu_temps.csv')
+        if self.recorder:
+            self.recorder.stop()
+
+    def run_pending(self, images: List[docker.models.images.Image]) -> None:
+        for entry in self.checkpoint.pending():
+            image_index, repetition = self.checkpoint.run_table[entry]
+            self.run_entry(images[image_index], entry, repetition)
+
+    def run_entry(self, image: docker.models.images.Image, entry: int, repetition: int) -> str:
+        # Returns the repetition directory the entry was written to
+        self.curr_dir_prefix = f"/{repetition}"
+        directory = f"{self.config['out']}/{get_display_name_tagged(image.tags[0])}{self.curr_dir_prefix}"
+        if os.path.exists(directory):
+            # Left by an interrupted attempt at this entry
+            shutil.rmtree(directory)
+
+        self.checkpoint.start(entry)
+        live: Dict = self.config['procedure'].get('live', {})
+        self.current_run = {'image': self.config['images'][self.checkpoint.run_table[entry][0]], 'repetition': repetition, 'entry': entry}
+        # The session segments of this entry, those of a flagged attempt are dropped
+        segment_count = len(self.segments)
+        for attempt in range(live.get('max_requeues', 1) + 1 if live.get('requeue', False) else 1):
+            if attempt:
+                # A flagged run is repeated right away, after the cooldown
+                logging.warning("Running entry %d again, attempt %d", entry, attempt + 1)
+                shutil.rmtree(directory, ignore_errors=True)
+                del self.segments[segment_count:]
+            self.recorder.set_entry(entry)
+            with tracing.span('variation', image=image.tags[0], repetition=repetition):
+                self.run_variation(image)
+            self.recorder.set_entry(-1)
+
+            if 'cooldown' in self.config['procedure']:
+                with tracing.span('cooldown'):
+                    time.sleep(self.config['procedure']['cooldown'])
+            if not self.run_flags:
+                break
+        self.checkpoint.complete(entry, self.segments[segment_count:])
+        return directory
+
+    def run_adaptive(self, images: List[docker.models.images.Image]) -> None:
+        # Runs the variations in rounds, analyzing the repetitions of a round to decide which variations need more.
+        # external_repetitions is the repetition budget of every variation.
+        # The analysis stack is only imported by adaptive experiments.
+        from .scheduler import SequentialScheduler
+        from analysis.analysis_runner import SUMMARY_KEYS
+        adaptive: Dict = self.config['procedure']['adaptive']
+        metric: str = adaptive.get('metric', 'host_energy_total')
+        if metric not in SUMMARY_KEYS:
+            raise ValueError(f"Adaptive metric must be one of {SUMMARY_KEYS}, not {metric}")
+        scheduler = SequentialScheduler(self.config['procedure']['external_repetitions'],
+                                        adaptive.get('min_repetitions', 5), adaptive.get('round_size', 1),
+                                        adaptive.get('alpha', 0.05), adaptive.get('precision'))
+
+        if self.checkpoint.run_table:
+            # Finishes the interrupted round and replays the analysis of everything that ran before
+            for image_index, repetition in self.checkpoint.run_table:
+                scheduler.scheduled[image_index] = max(scheduler.scheduled[image_index], repetition + 1)
+            self.run_pending(images)
+            self.interim_analysis(scheduler, images, self.checkpoint.run_table, metric)
+
+        while scheduler.active():
+            round_entries = scheduler.next_round()
+            random.shuffle(round_entries)
+            self.checkpoint.extend(round_entries)
+            self.write_run_table(self.checkpoint.run_table)
+            self.run_pending(images)
+            self.interim_analysis(scheduler, images, round_entries, metric)
+
+    def interim_analysis(self, scheduler: 'SequentialScheduler', images: List[docker.models.images.Image],
+                         entries: List[Tuple[int, int]], metric: str) -> None:
+        from analysis.analysis_runner import analyze_completed_repetition, analyze_multiple_runs, REPETITIONS_FILE
+        with tracing.span('interim_analysis'):
+            for image_index, repetition in entries:
+                directory = f"{self.config['out']}/{get_display_name_tagged(images[image_index].tags[0])}/{repetition}"
+                results = analyze_completed_repetition(directory, self.config)
+                if results is not None:
+                    scheduler.record(image_index, analyze_multiple_runs({0: results})[metric].iloc[0])
+            scheduler.update()
+
+        write_json(f"{self.config['out']}/adaptive.json", scheduler.summary())
+        write_json(f"{self.config['out']}/{REPETITIONS_FILE}",
+                   {image: scheduler.scheduled[k] for k, image in enumerate(self.config['images'])})
+        logging.info("Variations still running: %s", [self.config['images'][k] for k in scheduler.active()])
 
     def run_variation(self, image: docker.models.images.Image) -> None:
-        scaph: Optional[docker.models.containers.Container] = None
+        sampler: Optional[Sampler] = None
         try: 
             logging.info("Running variation %s", image.tags[0])
 
@@ -71,85 +196,124 @@ class Runner:
             directory: str = display_name + self.curr_dir_prefix
             create_directory(self.config['out'] + "/" + directory)
 
-            self.pc.start_tracing(f"{self.config['out']}/{directory}/ptrace.txt")
+            with tracing.span('start_tracer'):
+                self.pc.start_tracing(f"{self.config['out']}/{directory}/{self.pc.output_name}")
 
             volumes: Dict[str, Dict[str, str]] = {self.config['out']: {'bind': '/home', 'mode': 'rw'}}
             
-            scaph = self.start_scaphandre(directory)
-            self.active_containers.add(scaph)
-            if 'scaph_warmup' in self.config['procedure']:
-                time.sleep(self.config['procedure']['scaph_warmup'])
+            if not self.session_sampler:
+                sampler = self.start_sampler(f"{directory}/power")
 
             start_time: float = time.time()
+            self.run_flags = []
+            if self.monitor:
+                power_output = 'session_power' if self.session_sampler else f"{directory}/power"
+                self.monitor.begin(f"{self.config['out']}/{power_output}.{self.sampler_extension()}", self.current_run,
+                                   start_time, self.session_sampler is not None)
             
             env: Dict[str, str] = {"REPETITIONS": self.config['procedure']['internal_repetitions'], "TS_PATH": f'/home/{directory}/timesheet.json'}
             
+            lifecycle = ContainerLifecycle(self.client, display_name + self.container_suffix)
+            container: Optional[docker.models.containers.Container] = None
+            container_pid: Optional[int] = None
             try:
-                run_thread: threading.Thread = threading.Thread(target=self.run_container, args=(image, display_name, volumes, env))
-                run_thread.start()
+                lifecycle.subscribe()
+                with tracing.span('container_start'):
+                    container = self.run_container(image, display_name, volumes, env)
+                with tracing.span('container_run'):
+                    lifecycle.follow(container, on_start=self.pc.set_root)
 
-                container_pid: Optional[int] = self.get_container_pid_with_retry(display_name)
+                container_pid = lifecycle.pid
                 if container_pid:
                     logging.info("Container PID: %d", container_pid)
                 else:
                     logging.error("Failed to retrieve the container PID")
 
-                run_thread.join()
-
             except Exception as e:
-                logging.error(f"Error in container thread for {display_name}: {e}")
+                logging.error(f"Error in container lifecycle for {display_name}: {e}")
+                if container:
+                    self.cleanup_container(container)
+                    container = None
+            finally:
+                lifecycle.close()
 
             end_time: float = time.time()
             self.timestamp(display_name, start_time, end_time, directory)
-
-            self.cleanup_container(scaph)
-
-            self.pc.stop_tracing()
+            if self.monitor:
+                self.monitor.mark_end(end_time)
+
+            if self.session_sampler:
+                self.segments.append((f"{self.config['out']}/{directory}/power.{self.sampler_extension()}", start_time, end_time))
+            else:
+                with tracing.span('stop_sampler'):
+                    self.stop_sampler(sampler)
+                sampler = None
+
+            if self.monitor:
+                statistics, self.run_flags = self.monitor.end()
+                write_json(f"{self.config['out']}/{directory}/{LIVE_FILE}", {'statistics': statistics, 'flags': self.run_flags})
+
+            with tracing.span('stop_tracer'):
+                self.pc.stop_tracing()
             self.write_pid(directory, container_pid)
+
+            if container:
+                with tracing.span('container_removal'):
+                    lifecycle.wait_removed(container)
+                self.active_containers.discard(container)
+            write_json(f"{self.config['out']}/{directory}/lifecycle.json", lifecycle.summary())
             logging.info("Done with %s", image.tags[0])
 
         except Exception as e:
             logging.error(f"Error when running variation {image.tags[0]}: {e}")
             self.pc.stop_tracing()
-            if scaph:
-                self.cleanup_container(scaph)
+            if sampler:
+                self.stop_sampler(sampler)
+            if self.monitor and self.monitor.current:
+                _, self.run_flags = self.monitor.end()
 
-    def run_container(self, image: docker.models.images.Image, display_name: str, volumes: Dict[str, Dict[str, str]], env: Dict[str, str]) -> None:
-        container: Optional[docker.models.containers.Container] = None
+    def run_container(self, image: docker.models.images.Image, display_name: str, volumes: Dict[str, Dict[str, str]], env: Dict[str, str]) -> docker.models.containers.Container:
         try: 
-            container = self.client.containers.run(image, auto_remove=True, name=display_name, volumes=volumes, environment=env, detach=True)
+            container = self.client.containers.run(image, auto_remove=True, name=display_name + self.container_suffix, volumes=volumes, environment=env, detach=True,
+                                                   cpuset_cpus=self.workload_cpuset())
             self.active_containers.add(container)
-            container.wait()
-            self.active_containers.remove(container)
-            container = None
+            return container
         except docker.errors.APIError as e:
             logging.error(f"Docker API error when running container {display_name}: {e}")
             raise
-        except Exception as e:
-            logging.error(f"Unexpected error when running container {display_name}: {e}")
-            raise
-        finally:
-            if container:
-                self.cleanup_container(container)
+
+    def workload_cpuset(self) -> Optional[str]:
+        return self.layout.summary()['workload_cpus'] if self.layout else None
+
+    def record_run_variation(self, images: List[docker.models.images.Image]) -> None:
+        # The run-to-run variation of every image, compared to that of a campaign without isolation if there is one.
+        # The timesheets are in the directories the runner wrote, named after the pulled images.
+        metadata: Dict = read_json(self.config['out'] + '/metadata.json')
+        variation = {}
+        done = [self.checkpoint.run_table[entry] for entry in self.checkpoint.done()]
+        for image_index, image in enumerate(self.config['images']):
+            repetitions = [repetition for k, repetition in done if k == image_index]
+            display_name = get_display_name_tagged(images[image_index].tags[0])
+            variation[image] = duration_variation(run_durations(self.config['out'], display_name, repetitions))
+        metadata['run_variation'] = variation
+
+        baseline_path = self.config['procedure'].get('cpu_isolation', {}).get('baseline')
+        if baseline_path:
+            baseline: Dict = read_json(f"{baseline_path}/metadata.json").get('run_variation', {})
+            metadata['cpu_isolation']['variance_reduction'] = variance_reduction(variation, baseline)
+        write_json(self.config['out'] + '/metadata.json', metadata)
+
+    def write_run_table(self, run_table: List[Tuple[int, int]]) -> None:
+        # Maps the entry indices of the thermal samples to the variation that was running
+        entries = [{'entry': entry, 'image': self.config['images'][image_index], 'repetition': repetition}
+                   for entry, (image_index, repetition) in enumerate(run_table)]
+        write_json(self.config['out'] + '/run_table.json', entries)
 
     def write_pid(self, directory: str, pid: Optional[int]) -> None:
         file_path: str = self.config['out'] + f'/{directory}/rpid.txt'
         with open(file_path, 'w') as file:
             file.write(str(pid))
 
-    def get_container_pid_with_retry(self, display_name: str, max_retries: int = 5) -> Optional[int]:
-        retry_delay: float = 0.25 
-        for attempt in range(max_retries):
-            try:
-                container: docker.models.containers.Container = self.client.containers.get(display_name)
-                inspection: Dict = self.client.api.inspect_container(container.id)
-                return inspection['State']['Pid']
-            except docker.errors.NotFound:
-                logging.warning("Attempt %d failed, retrying in %f seconds...", attempt + 1, retry_delay)
-                time.sleep(retry_delay)
-                retry_delay *= 2
-        return None
-
     def timestamp(self, event_id: str, start_time: float, end_time: float, directory: str) -> None:
         duration_seconds: float = end_time - start_time
 
@@ -175,35 +339,140 @@ class Runner:
             json.dump(events, file, indent=4)
 
     def setup(self) -> None:
-        self.client.images.pull('philippsommer27/scaphandre', platform='linux/amd64')
-
         # Docker configuration for scaphandre
         self.volumes: Dict[str, Dict[str, str]] = {
             '/proc': {'bind': '/proc', 'mode': 'rw'},
             '/sys/class/powercap': {'bind': '/sys/class/powercap', 'mode': 'rw'}
         }
         
-        # Clear output directory
-        if os.path.exists(self.config['out']):
-            for item in os.listdir(self.config['out']):
-                item_path: str = os.path.join(self.config['out'], item)
-                if os.path.isfile(item_path):
-                    os.remove(item_path)
-                elif os.path.isdir(item_path):
-                    shutil.rmtree(item_path)
-
         metadata: Dict = get_metadata()
-        write_json(self.config['out'] + '/metadata.json', metadata, 'x')
-        self.recording_thread = start_temp_recording()
+        metadata['images'] = self.image_digests
+        if self.layout:
+            metadata['cpu_isolation'] = self.layout.summary()
+        self.recorder = ThermalRecorder(self.config['procedure'].get('thermal_interval', 0.5))
+
+        if self.resume:
+            self.checkpoint = Checkpoint.load(f"{self.config['out']}/{CHECKPOINT_FILE}")
+            logging.info("Resuming with %d of %d entries left", len(self.checkpoint.pending()), len(self.checkpoint.run_table))
+
+            # The metadata of every resumed session is added to that of the first one
+            first_metadata: Dict = read_json(self.config['out'] + '/metadata.json')
+            first_metadata.setdefault('resumed', []).append(metadata)
+            write_json(self.config['out'] + '/metadata.json', first_metadata)
+            self.recorder.start(self.config['out'] + '/thermal.bin', append=True)
+            self.recover_session()
+        else:
+            # Clear output directory
+            if os.path.exists(self.config['out']):
+                for item in os.listdir(self.config['out']):
+                    item_path: str = os.path.join(self.config['out'], item)
+                    if os.path.isfile(item_path):
+                        os.remove(item_path)
+                    elif os.path.isdir(item_path):
+                        shutil.rmtree(item_path)
+
+            write_json(self.config['out'] + '/metadata.json', metadata, 'x')
+            self.recorder.start(self.config['out'] + '/thermal.bin')
+
+        if 'live' in self.config['procedure']:
+            self.monitor = LiveMonitor(self.config['out'], self.config['images'], self.config['procedure']['live'])
+
+        if self.config['procedure'].get('sampler_session', False):
+            self.start_session()
         
-    def start_scaphandre(self, directory: str) -> docker.models.containers.Container:
+    def pull_images(self) -> List[docker.models.images.Image]:
+        # The variations and the sampler image are pulled together, the digests used are recorded in the metadata
+        names = list(self.config['images'])
+        platforms: Dict[str, str] = {}
+        if self.sampler_backend() == 'scaphandre':
+            names.append(SCAPHANDRE_IMAGE)
+            platforms[SCAPHANDRE_IMAGE] = 'linux/amd64'
+
+        pulled = self.puller.pull_all(names, platforms)
+        self.image_digests = {name: {'id': image.id, 'digest': image_digest(image)} for name, image in pulled.items()}
+        return [pulled[name] for name in self.config['images']]
+
+    def create_tracer(self):
+        if self.config['procedure'].get('tracer', 'bpftrace') == 'bcc':
+            # bcc is only required when selected
+            from .bcc_capture import BccProcessesCapture
+            return BccProcessesCapture()
+        return ProcessesCapture()
+
+    def sampler_backend(self) -> str:
+        return self.config['procedure'].get('sampler', 'scaphandre')
+
+    def sampler_extension(self) -> str:
+        return 'bin' if self.sampler_backend() == 'rapl' else 'json'
+
+    def start_sampler(self, output: str) -> Sampler:
+        # output is relative to the output directory and without extension
+        output = f"{output}.{self.sampler_extension()}"
+        with tracing.span('start_sampler', backend=self.sampler_backend()):
+            sampler = self.create_sampler(output)
+        if self.sampler_backend() == 'scaphandre' and 'scaph_warmup' in self.config['procedure']:
+            with tracing.span('scaph_warmup'):
+                time.sleep(self.config['procedure']['scaph_warmup'])
+        return sampler
+
+    def create_sampler(self, output: str) -> Sampler:
+        if self.sampler_backend() == 'rapl':
+            sampler = RaplSampler(self.config['procedure']['freq'], self.config['procedure'].get('powercap_root', POWERCAP_ROOT))
+            sampler.start(f"{self.config['out']}/{output}")
+            self.active_sampler = sampler
+            return sampler
+
+        scaph = self.start_scaphandre(output)
+        self.active_containers.add(scaph)
+        return scaph
+
+    def stop_sampler(self, sampler: Sampler) -> None:
+        if isinstance(sampler, RaplSampler):
+            sampler.stop()
+            self.active_sampler = None
+        else:
+            self.cleanup_container(sampler)
+
+    def start_session(self) -> None:
+        logging.info("Starting session sampler")
+        self.session_sampler = self.start_sampler('session_power')
+
+    def finish_session(self) -> None:
+        self.stop_sampler(self.session_sampler)
+        self.session_sampler = None
+        if self.segments:
+            segment_session(f"{self.config['out']}/session_power.{self.sampler_extension()}", self.segments,
+                            self.config['procedure'].get('segment_padding', 0))
+            self.segments = []
+            self.checkpoint.clear_segments()
+
+    def recover_session(self) -> None:
+        # Cuts the entries that finished in an interrupted session from what it recorded, before a new session overwrites it
+        if not self.checkpoint.segments:
+            return
+        session_file = f"{self.config['out']}/session_power.{self.sampler_extension()}"
+        try:
+            segment_session(session_file, [(output, start, end) for _, output, start, end in self.checkpoint.segments],
+                            self.config['procedure'].get('segment_padding', 0))
+        except (OSError, ValueError) as e:
+            logging.warning("Interrupted session %s could only be cut in part: %s", session_file, e)
+
+        for entry, output, _, _ in self.checkpoint.segments:
+            # An empty JSON array or no records
+            if not os.path.exists(output) or os.path.getsize(output) <= 2:
+                logging.warning("No samples of entry %d in the interrupted session, running it again", entry)
+                self.checkpoint.reset(entry)
+        self.checkpoint.clear_segments()
+
+    def start_scaphandre(self, output: str) -> docker.models.containers.Container:
         self.volumes[self.config['out']] = {'bind': '/home', 'mode': 'rw'}
-        return self.client.containers.run('philippsommer27/scaphandre',
-                                            f"json -s 0 --step-nano {self.config['procedure']['freq']} -f /home/{directory}/power.json", 
+        return self.client.containers.run(SCAPHANDRE_IMAGE,
+                                            f"json -s 0 --step-nano {self.config['procedure']['freq']} -f /home/{output}", 
                                             volumes=self.volumes,
                                             privileged=True,
                                             detach=True,
-                                            name='scaphandre')
+                                            name='scaphandre' + self.container_suffix,
+                                            cpuset_cpus=self.layout.summary()['observer_cpus'] if self.layout else None)
     
     def warmup(self) -> None: 
         warmup_time: int = self.config['procedure']['experiment_warmup']
@@ -230,15 +499,36 @@ class Runner:
     
 def signal_handler(*_: Optional[object]) -> None:
     logging.info("Received termination signal. Cleaning up...")
+    if runner.active_sampler:
+        runner.stop_sampler(runner.active_sampler)
     runner.cleanup_all_containers()
     runner.pc.stop_tracing()
     sys.exit(0)
 
-def main(config_path: str) -> None:
+def run_overhead(runner: Runner) -> None:
+    try:
+        results = OverheadRunner(runner).run()
+    finally:
+        if runner.active_sampler:
+            runner.stop_sampler(runner.active_sampler)
+        runner.cleanup_all_containers()
+    for component, overhead in results['components'].items():
+        logging.info("Overhead of %s: %s W, %s host CPU", component, overhead['power_w'], overhead['host_cpu'])
+
+def main(config_path: str, trace: bool = False, overhead: bool = False, offline: bool = False, resume: bool = False) -> None:
     global runner
     logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(message)s')
-    runner = Runner(config_path)
-    runner.run()
+    if trace:
+        tracing.enable('experiment')
+    runner = Runner(config_path, offline, resume)
+    with tracing.span('experiment'):
+        if overhead:
+            run_overhead(runner)
+        else:
+            runner.run()
+    if trace:
+        summary = tracing.write_trace(f"{runner.config['out']}/experiment_trace")
+        logging.info("Experiment stages:\n%s", summary)
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -0,0 +1,94 @@
+import math
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from analysis.statistics import difference_test, mean_difference_interval, mean_interval
+
+class SequentialScheduler:
+    # Schedules the repetitions of every variation in rounds and stops a variation once it differs
+    # significantly from the first one, its difference to it is estimated precisely enough, or its
+    # repetition budget is spent. The first variation runs as long as another one does. Every round is
+    # an interim look at the data, so the significance level is divided over the looks (Bonferroni).
+
+    def __init__(self, budgets: List[int], min_repetitions: int = 5, round_size: int = 1,
+                 alpha: float = 0.05, precision: Optional[float] = None) -> None:
+        self.budgets = budgets
+        self.min_repetitions = min_repetitions
+        self.round_size = round_size
+        self.precision = precision
+        self.scheduled = [0] * len(budgets)
+        self.values: List[List[float]] = [[] for _ in budgets]
+        self.stopped: Dict[int, str] = {}
+        self.tests: Dict[int, Dict[str, Any]] = {}
+
+        looks = math.ceil(max(max(budgets) - min_repetitions, 0) / round_size) + 1
+        self.alpha = alpha / looks
+
+    def active(self) -> List[int]:
+        return [k for k in range(len(self.budgets)) if k not in self.stopped]
+
+    def next_round(self) -> List[Tuple[int, int]]:
+        # (variation, repetition) pairs of the round, the first round brings every variation to the minimum
+        entries = []
+        for k in self.active():
+            count = max(self.round_size, self.min_repetitions - self.scheduled[k])
+            count = min(count, self.budgets[k] - self.scheduled[k])
+            entries.extend((k, self.scheduled[k] + i) for i in range(count))
+            self.scheduled[k] += count
+        return entries
+
+    def record(self, k: int, value: float) -> None:
+        self.values[k].append(value)
+
+    def update(self) -> None:
+        for k in self.active():
+            if k == 0:
+                continue
+            reason = self.stopping_reason(k)
+            if reason:
+                self.stopped[k] = reason
+
+        if 0 not in self.stopped:
+            if self.scheduled[0] >= self.budgets[0]:
+                self.stopped[0] = 'budget'
+            elif len(self.budgets) > 1 and len(self.active()) == 1:
+                self.stopped[0] = 'baseline'
+            elif len(self.budgets) == 1 and self.is_precise(0, None):
+                self.stopped[0] = 'precision'
+
+    def stopping_reason(self, k: int) -> Optional[str]:
+        base, other = np.array(self.values[0]), np.array(self.values[k])
+        if len(base) >= self.min_repetitions and len(other) >= self.min_repetitions:
+            self.tests[k] = difference_test(base, other)
+            if self.tests[k]['p'] < self.alpha:
+                return 'significant'
+            if self.is_precise(k, base):
+                return 'precision'
+        if self.scheduled[k] >= self.budgets[k]:
+            return 'budget'
+        return None
+
+    def is_precise(self, k: int, base: Optional[np.ndarray]) -> bool:
+        # Relative half width of the confidence interval of the difference to the first variation,
+        # or of the mean when there is nothing to compare to
+        if self.precision is None or len(self.values[k]) < self.min_repetitions:
+            return False
+        values = np.array(self.values[k])
+        if base is None:
+            low, high = mean_interval(values)
+            reference = np.mean(values)
+        else:
+            low, high = mean_difference_interval(base, values)
+            reference = np.mean(base)
+        half_width = (high - low) / 2
+        return reference != 0 and half_width / abs(reference) < self.precision
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'alpha_per_look': self.alpha,
+            'variations': [{
+                'repetitions': self.scheduled[k],
+                'analyzed': len(self.values[k]),
+                'stopped': self.stopped.get(k),
+                'test': self.tests.get(k)
+            } for k in range(len(self.budgets))]
+        }
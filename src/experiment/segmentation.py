@@ -0,0 +1,58 @@
+import json
+import logging
+import numpy as np
+from typing import List, Optional, Tuple, TextIO
+from misc.util import iter_json_array
+from misc.records import RAPL_RECORD
+
+# A variation's output file and the time window its samples are cut from
+Segment = Tuple[str, float, float]
+
+def segment_session(session_file: str, segments: List[Segment], padding: float = 0) -> None:
+    segments = sorted(segments, key=lambda segment: segment[1])
+    if session_file.endswith('.bin'):
+        segment_records(session_file, segments, padding)
+    else:
+        segment_json(session_file, segments, padding)
+    logging.info("Cut %d variation(s) from %s", len(segments), session_file)
+
+def segment_records(session_file: str, segments: List[Segment], padding: float) -> None:
+    records = np.fromfile(session_file, dtype=RAPL_RECORD)
+    for output, start, end in segments:
+        first = np.searchsorted(records['timestamp'], start - padding, side='left')
+        last = np.searchsorted(records['timestamp'], end + padding, side='right')
+        records[first:last].tofile(output)
+
+def segment_json(session_file: str, segments: List[Segment], padding: float) -> None:
+    # Streams the session once, segments are sorted by start and may overlap through the padding
+    files: List[Optional[TextIO]] = [None] * len(segments)
+    first_open = 0
+    try:
+        for sample in iter_json_array(session_file):
+            timestamp = sample['host']['timestamp']
+            while first_open < len(segments) and segments[first_open][2] + padding < timestamp:
+                close_segment(files, segments, first_open)
+                first_open += 1
+
+            for i in range(first_open, len(segments)):
+                output, start, end = segments[i]
+                if start - padding > timestamp:
+                    break
+                if timestamp <= end + padding:
+                    if files[i] is None:
+                        files[i] = open(output, 'w')
+                        files[i].write('[')
+                    else:
+                        files[i].write(',')
+                    files[i].write(json.dumps(sample))
+    finally:
+        for i in range(first_open, len(segments)):
+            close_segment(files, segments, i)
+
+def close_segment(files: List[Optional[TextIO]], segments: List[Segment], index: int) -> None:
+    if files[index] is None:
+        logging.warning("No samples for %s in the session", segments[index][0])
+        files[index] = open(segments[index][0], 'w')
+        files[index].write('[')
+    files[index].write(']')
+    files[index].close()
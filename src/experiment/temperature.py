@@ -1,53 +1,169 @@
 import psutil
+import os
+import re
 import time
+import json
 import threading
-import csv
 import logging
+import numpy as np
+from array import array
+from typing import List, Optional, Tuple
+from misc.records import THERMAL_VERSION, thermal_record
+
+CPU_ROOT = '/sys/devices/system/cpu'
+CPU_DIRECTORY = re.compile(r'^cpu\d+$')
+# Chips that only report CPU temperatures, for the others the label has to name the package or a core
+CPU_CHIPS = ['coretemp', 'k10temp', 'zenpower', 'cpu_thermal']
+CPU_LABELS = ['package', 'core', 'cpu', 'tctl', 'tdie', 'tccd']
+
+def find_temperature_sensors() -> List[Tuple[str, int, str]]:
+    # (chip, index within the chip, channel name) of every package and core sensor
+    sensors = []
+    for chip, entries in psutil.sensors_temperatures().items():
+        for index, entry in enumerate(entries):
+            label = entry.label or f"{chip}{index}"
+            if chip in CPU_CHIPS or any(name in label.lower() for name in CPU_LABELS):
+                sensors.append((chip, index, f"{chip}/{label}"))
+    return sensors
+
+def find_frequency_files(cpu_root: str = CPU_ROOT) -> List[Tuple[str, str]]:
+    # (channel name, path) of the current scaling frequency of every core
+    if not os.path.isdir(cpu_root):
+        return []
+    cpus = sorted((name for name in os.listdir(cpu_root) if CPU_DIRECTORY.match(name)), key=lambda name: int(name[3:]))
+    files = [(f"{cpu}/frequency_mhz", f"{cpu_root}/{cpu}/cpufreq/scaling_cur_freq") for cpu in cpus]
+    return [(name, path) for name, path in files if os.path.exists(path)]
+
+class ThermalRecorder:
+    # Samples the temperature sensors and core frequencies into typed buffers that are flushed
+    # to disk as they fill, so that a crash only loses the samples of the last flush interval.
+
+    def __init__(self, interval: float = 0.5, flush_interval: float = 10, cpu_root: str = CPU_ROOT) -> None:
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.cpu_root = cpu_root
+        self.sensors: List[Tuple[str, int, str]] = []
+        self.frequency_fds: List[int] = []
+        self.channels: List[str] = []
+        self.entry = -1
+        self.lock = threading.Lock()
+        self.timestamps = array('d')
+        self.entries = array('i')
+        self.values = array('f')
+        self.file = None
+        self.thread: Optional[threading.Thread] = None
+        self.recording = False
+        self.stopped = threading.Event()
+
+    def start(self, output_file: str, append: bool = False) -> None:
+        if self.recording:
+            logging.warning("Recording is already in progress.")
+            return
+        self.sensors = find_temperature_sensors()
+        frequency_files = find_frequency_files(self.cpu_root)
+        self.frequency_fds = [os.open(path, os.O_RDONLY) for _, path in frequency_files]
+        self.channels = [name for _, _, name in self.sensors] + [name for name, _ in frequency_files]
+        if not self.sensors:
+            logging.warning("No CPU temperature sensors found")
+
+        if append and os.path.exists(output_file):
+            self.file = self.open_append(output_file)
+        else:
+            self.start_time = time.time()
+            self.file = open(output_file, 'wb')
+            header = {
+                'version': THERMAL_VERSION,
+                'start': self.start_time,
+                'channels': self.channels,
+                'temperature_channels': len(self.sensors)
+            }
+            self.file.write((json.dumps(header) + '\n').encode())
+            self.file.flush()
+
+        self.recording = True
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._record, daemon=True)
+        self.thread.start()
+
+    def open_append(self, output_file: str):
+        # Continues a recording of the same channels, with times relative to its start
+        with open(output_file, 'rb') as file:
+            header = json.loads(file.readline())
+            header_size = file.tell()
+        if header['channels'] != self.channels:
+            raise ValueError(f"Cannot append to {output_file}, it records the channels {header['channels']}")
+        self.start_time = header['start']
+
+        file = open(output_file, 'r+b')
+        # Drops a record left incomplete by an interruption
+        record_size = thermal_record(len(self.channels)).itemsize
+        data_size = os.path.getsize(output_file) - header_size
+        file.truncate(header_size + data_size - data_size % record_size)
+        file.seek(0, os.SEEK_END)
+        return file
+
+    def set_entry(self, entry: int) -> None:
+        # Index of the run table entry that is executing, -1 when none is
+        with self.lock:
+            self.entry = entry
+
+    def stop(self) -> None:
+        if not self.recording:
+            logging.warning("Recording is not in progress.")
+            return
+        self.recording = False
+        self.stopped.set()
+        self.thread.join()
+        self.flush()
+        self.file.close()
+        self.file = None
+        for fd in self.frequency_fds:
+            os.close(fd)
+        self.frequency_fds = []
+
+    def flush(self) -> None:
+        with self.lock:
+            count = len(self.timestamps)
+            records = np.zeros(count, dtype=thermal_record(len(self.channels)))
+            records['timestamp'] = np.frombuffer(self.timestamps, dtype=np.float64)
+            records['entry'] = np.frombuffer(self.entries, dtype=np.int32)
+            records['values'] = np.frombuffer(self.values, dtype=np.float32).reshape(count, len(self.channels))
+            del self.timestamps[:], self.entries[:], self.values[:]
+        self.file.write(records.tobytes())
+        self.file.flush()
+
+    def _record(self) -> None:
+        deadline = time.monotonic()
+        last_flush = deadline
+        while not self.stopped.is_set():
+            self._sample()
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
+            deadline += self.interval
+            self.stopped.wait(max(0, deadline - time.monotonic()))
+
+    def _sample(self) -> None:
+        temperatures = psutil.sensors_temperatures() if self.sensors else {}
+        sample = array('f')
+        for chip, index, _ in self.sensors:
+            entries = temperatures.get(chip, [])
+            sample.append(entries[index].current if index < len(entries) else np.nan)
+        for fd in self.frequency_fds:
+            try:
+                sample.append(int(os.pread(fd, 32, 0)) / 1000)
+            except (OSError, ValueError):
+                sample.append(np.nan)
+
+        with self.lock:
+            self.timestamps.append(time.time() - self.start_time)
+            self.entries.append(self.entry)
+            self.values.extend(sample)
+        logging.debug("CPU sample: %s", list(sample))
 
-def get_cpu_temp():
-    sensors = psutil.sensors_temperatures()
-    if not sensors:
-        return None
-    for name, entries in sensors.items():
-        for entry in entries:
-            if 'cpu' in entry.label.lower() or 'core' in entry.label.lower():
-                return entry.current
-    return None
-
-def record_cpu_temp():
-    global recording, cpu_temps
-    start_time = time.time()
-    while recording:
-        temp = get_cpu_temp()
-        if temp is not None:
-            timestamp = time.time() - start_time
-            cpu_temps.append((timestamp, temp))
-            logging.debug("CPU Temperature: %.2f °C", temp)
-        time.sleep(0.5)
-
-def start_temp_recording():
-    global recording, cpu_temps
-    recording = True
-    cpu_temps = []
-    thread = threading.Thread(target=record_cpu_temp)
-    thread.start()
-    return thread
-
-def stop_temp_recording(thread, filename="cpu_temps.csv"):
-    global recording
-    if recording:
-        recording = False
-        thread.join()
-
-        with open(filename, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(["time", "temperature_celcius"])
-            writer.writerows(cpu_temps)
-    else:
-        logging.warning("Recording is not in progress.")
-    
 # Example usage
 if __name__ == "__main__":
-    recording_thread = start_temp_recording()
+    recorder = ThermalRecorder()
+    recorder.start("thermal.bin")
     input("Press Enter to stop recording...\n")
-    stop_temp_recording(recording_thread)
+    recorder.stop()
@@ -1,6 +1,6 @@
 import click
-from analysis import analysis_runner
-from experiment import runner
+
+# The command modules are imported by their commands, the analysis stack alone takes seconds to import
 
 @click.group()
 def cli():
@@ -8,13 +8,61 @@ def cli():
 
 @cli.command()
 @click.argument('config')
-def analyze(config):
-    analysis_runner.run(config)
+@click.option('--jobs', '-j', default=1, type=click.IntRange(min=1), help='Number of repetitions analyzed in parallel.')
+@click.option('--force', is_flag=True, help='Reanalyze all repetitions even if their inputs are unchanged.')
+@click.option('--trace', is_flag=True, help='Record the time spent in each stage to analysis_trace.json.')
+def analyze(config, jobs, force, trace):
+    from analysis import analysis_runner
+    analysis_runner.run(config, jobs, force, trace)
+
+@cli.command()
+@click.argument('config')
+def ingest(config):
+    from analysis import analysis_runner
+    analysis_runner.ingest(config)
+
+@cli.command()
+@click.argument('config')
+@click.option('--trace', is_flag=True, help='Record the time spent in each stage to experiment_trace.json.')
+@click.option('--overhead', is_flag=True, help='Measure the overhead of the observers on an idle container instead.')
+@click.option('--offline', is_flag=True, help='Use the local images without pulling.')
+@click.option('--resume', is_flag=True, help='Continue an interrupted experiment from its checkpoint.')
+def experiment(config, trace, overhead, offline, resume):
+    from experiment import runner
+    runner.main(config, trace, overhead, offline, resume)
+
+@cli.command()
+@click.argument('config')
+@click.option('--bind', default='127.0.0.1', help='Address the coordinator listens on, 0.0.0.0 for workers on other hosts.')
+@click.option('--port', default=8470, type=int, help='Port the coordinator listens on.')
+@click.option('--resume', is_flag=True, help='Continue an interrupted distributed experiment from its checkpoint.')
+@click.option('--lease-timeout', default=3600.0, type=float, help='Seconds after which an unfinished entry is leased to another worker.')
+def coordinate(config, bind, port, resume, lease_timeout):
+    from experiment import distributed
+    distributed.coordinate(config, bind, port, resume, lease_timeout)
+
+@cli.command()
+@click.argument('config')
+@click.option('--coordinator', required=True, help='URL of the coordinator, e.g. http://host:8470.')
+@click.option('--name', default=None, help='Unique name of the worker, defaults to <hostname>-<pid>.')
+@click.option('--staging', default=None, help='Directory the entries run in before they are uploaded.')
+@click.option('--offline', is_flag=True, help='Use the local images without pulling.')
+@click.option('--trace', is_flag=True, help='Record the time spent in each stage, delivered with the worker files.')
+def work(config, coordinator, name, staging, offline, trace):
+    from experiment import distributed
+    distributed.work(config, coordinator, name, staging, offline, trace)
 
 @cli.command()
 @click.argument('config')
-def experiment(config):
-    runner.main(config)
+def validate(config):
+    from yaml import YAMLError
+    from schema import SchemaError
+    from misc.config import load_configuration
+    try:
+        load_configuration(config)
+    except (OSError, YAMLError, SchemaError) as e:
+        raise click.ClickException(f"Invalid configuration {config}: {e}")
+    click.echo(f"{config} is valid")
 
 if __name__ == "__main__":
-    cli()
\ No newline at end of file
+    cli()
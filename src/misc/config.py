@@ -12,6 +12,9 @@ def validation_logic(data):
         if len(external_repetitions) != num_images:
             raise SchemaError(f"When external_repetitions is a list, its length ({len(external_repetitions)}) must match the number of images ({num_images})")
 
+    if 'adaptive' in data['procedure'] and data['procedure'].get('sampler_session', False):
+        raise SchemaError("Adaptive repetitions analyze every round, which requires a sampler per variation instead of sampler_session")
+
     return True
 
 config_schema = Schema(And({
@@ -23,13 +26,53 @@ config_schema = Schema(And({
         "freq": int,
         Optional("cooldown"): int,
         Optional("scaph_warmup"): int,
-        Optional("experiment_warmup"): int
+        Optional("experiment_warmup"): int,
+        Optional("sampler"): And(lambda x: x in ['scaphandre', 'rapl']),
+        Optional("powercap_root"): str,
+        Optional("sampler_session"): bool,
+        Optional("segment_padding"): Or(int, float),
+        Optional("tracer"): And(lambda x: x in ['bpftrace', 'bcc']),
+        Optional("thermal_interval"): Or(int, float),
+        Optional("overhead_duration"): Or(int, float),
+        Optional("overhead_repetitions"): int,
+        Optional("overhead_image"): str,
+        Optional("pull_jobs"): And(int, lambda x: x >= 1),
+        Optional("offline"): bool,
+        Optional("digests"): {str: And(str, lambda x: x.startswith('sha256:'))},
+        Optional("cpu_isolation"): {
+            Optional("workload_cpus"): Or(str, int),
+            Optional("observer_cpus"): Or(str, int),
+            Optional("baseline"): str
+        },
+        Optional("live"): {
+            Optional("interval"): And(Or(int, float), lambda x: x > 0),
+            Optional("min_samples"): int,
+            Optional("min_duration"): Or(int, float),
+            Optional("max_gap"): Or(int, float),
+            Optional("max_jitter"): Or(int, float),
+            Optional("outlier_z"): And(Or(int, float), lambda x: x > 0),
+            Optional("requeue"): bool,
+            Optional("max_requeues"): And(int, lambda x: x >= 1)
+        },
+        Optional("adaptive"): {
+            Optional("min_repetitions"): And(int, lambda x: x >= 3),
+            Optional("round_size"): And(int, lambda x: x >= 1),
+            Optional("alpha"): And(float, lambda x: 0 < x < 1),
+            Optional("precision"): And(Or(int, float), lambda x: x > 0),
+            Optional("metric"): str
+        }
         },
     "analysis": {
         Optional("mode"): And(lambda x: x in ['regex', 'pid']),
         Optional("pattern"): str,
         Optional("prune_mark"): str,
-        Optional("prune_buffer"): str
+        Optional("prune_buffer"): Or(int, float),
+        Optional("subtract_overhead"): bool,
+        Optional("power_plot"): And(str, lambda x: x in ['histogram', 'kde']),
+        Optional("resamples"): And(int, lambda x: x >= 1),
+        Optional("seed"): int,
+        Optional("energy_window"): And(Or(int, float), lambda x: x > 0),
+        Optional("energy_window_processes"): bool
     }},
     validation_logic
     ))
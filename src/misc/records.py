@@ -0,0 +1,18 @@
+import numpy as np
+
+# Binary record layouts shared by the experiment writers and the analysis readers
+
+# Host sample of the native RAPL sampler, consumption is in microwatts as reported by Scaphandre
+RAPL_RECORD = np.dtype([('timestamp', '<f8'), ('energy_uj', '<u8'), ('consumption', '<f8')])
+
+# Process event of the bcc tracer, kind is one of PTRACE_FORK and PTRACE_EXIT and the timestamp is CLOCK_MONOTONIC
+PTRACE_RECORD = np.dtype([('timestamp', '<u8'), ('kind', '<u4'), ('pid', '<u4'), ('parent_pid', '<u4'), ('padding', '<u4')])
+PTRACE_FORK = 0
+PTRACE_EXIT = 1
+
+# Sample of the thermal recorder. The channels are listed in the JSON header line that precedes the records,
+# the timestamp is in seconds since the start of the recording and entry is the run table index or -1 in between.
+THERMAL_VERSION = 1
+
+def thermal_record(channels: int) -> np.dtype:
+    return np.dtype([('timestamp', '<f8'), ('entry', '<i4'), ('values', '<f4', (channels,))])
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import threading
+import contextlib
+from typing import Any, Dict, List
+
+# Stage timing spans, exported as a Chrome trace (chrome://tracing, ui.perfetto.dev) and a summary table.
+# While disabled span() returns a shared no-op context manager, so instrumented code pays one call.
+
+NO_SPAN = contextlib.nullcontext()
+
+enabled = False
+events: List[Dict[str, Any]] = []
+lock = threading.Lock()
+
+class Span:
+
+    def __init__(self, name: str, category: str, args: Dict[str, Any]) -> None:
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self) -> 'Span':
+        self.start_ns = time.time_ns()
+        self.cpu_start_ns = time.thread_time_ns()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        cpu_ns = time.thread_time_ns() - self.cpu_start_ns
+        wall_ns = time.time_ns() - self.start_ns
+        event = {
+            'name': self.name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': self.start_ns / 1000,
+            'dur': wall_ns / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': {**self.args, 'cpu_ms': cpu_ns / 1e6}
+        }
+        with lock:
+            events.append(event)
+
+def enable(process_name: str) -> None:
+    global enabled
+    if enabled:
+        return
+    enabled = True
+    with lock:
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': process_name}})
+
+def reset() -> None:
+    global enabled
+    enabled = False
+    events.clear()
+
+# Forked worker processes start without the events of their parent and enable tracing themselves
+os.register_at_fork(after_in_child=reset)
+
+def span(name: str, category: str = 'calabash', **args: Any):
+    if not enabled:
+        return NO_SPAN
+    return Span(name, category, args)
+
+def collect() -> List[Dict[str, Any]]:
+    # Removes and returns the recorded events, to hand them from a worker process to the parent
+    with lock:
+        collected = events[:]
+        events.clear()
+    return collected
+
+def extend(other: List[Dict[str, Any]]) -> None:
+    with lock:
+        events.extend(other)
+
+def summarize(trace_events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    rows: Dict[str, Dict[str, Any]] = {}
+    for event in trace_events:
+        if event['ph'] != 'X':
+            continue
+        row = rows.setdefault(event['name'], {'name': event['name'], 'count': 0, 'wall_s': 0.0, 'max_s': 0.0, 'cpu_s': 0.0})
+        row['count'] += 1
+        row['wall_s'] += event['dur'] / 1e6
+        row['max_s'] = max(row['max_s'], event['dur'] / 1e6)
+        row['cpu_s'] += event['args']['cpu_ms'] / 1e3
+    for row in rows.values():
+        row['mean_s'] = row['wall_s'] / row['count']
+    return sorted(rows.values(), key=lambda row: row['wall_s'], reverse=True)
+
+def format_summary(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'span':<32} {'count':>6} {'wall (s)':>10} {'mean (s)':>10} {'max (s)':>10} {'cpu (s)':>10}"]
+    for row in rows:
+        lines.append(f"{row['name']:<32} {row['count']:>6} {row['wall_s']:>10.3f} {row['mean_s']:>10.3f} {row['max_s']:>10.3f} {row['cpu_s']:>10.3f}")
+    return '\n'.join(lines)
+
+def write_trace(output_without_ext: str) -> str:
+    # Writes <output>.json and <output>_summary.txt and returns the summary
+    trace_events = collect()
+    with open(f"{output_without_ext}.json", 'w') as file:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, file)
+    summary = format_summary(summarize(trace_events))
+    with open(f"{output_without_ext}_summary.txt", 'w') as file:
+        file.write(summary + '\n')
+    return summary
@@ -1,5 +1,9 @@
+import hashlib
 import json
 import os
+from typing import Any, Dict, Iterator, Optional
+
+JSON_WHITESPACE = ' \t\n\r'
 
 def get_display_name(image_name):
     return image_name[image_name.find('/')+1:]
@@ -7,10 +11,65 @@ def get_display_name(image_name):
 def get_display_name_tagged(image_name):
     return image_name[image_name.find('/')+1:image_name.find(':')]  
 
+def setup_directory(out_path: str, display_name: str, iteration: int) -> str:
+    # The directory of a repetition, as analyze reads it
+    curr_dir_prefix = f"/{iteration}"
+    return f"{out_path}/{display_name}{curr_dir_prefix}"
+
 def read_json(filepath):
     with open(filepath, 'r') as file:
         return json.load(file)
     
+def iter_json_array(filepath: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    # Decodes a top level JSON array one element at a time, so only the element
+    # being decoded and the current read chunk are held in memory.
+    decoder = json.JSONDecoder()
+    with open(filepath, 'r') as file:
+        buffer, index, eof = '', 0, False
+        state = 'open'
+        while True:
+            while index < len(buffer) and buffer[index] in JSON_WHITESPACE:
+                index += 1
+
+            if index == len(buffer) or state == 'incomplete':
+                if eof:
+                    raise ValueError(f"Unexpected end of JSON array in {filepath}")
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer, index = buffer[index:] + chunk, 0
+                state = 'value' if state == 'incomplete' else state
+                continue
+
+            char = buffer[index]
+            if state == 'open':
+                if char != '[':
+                    raise ValueError(f"Expected a JSON array in {filepath}")
+                index += 1
+                state = 'first'
+            elif state in ('first', 'separator') and char == ']':
+                return
+            elif state == 'separator':
+                if char != ',':
+                    raise ValueError(f"Expected ',' at offset {index} of chunk in {filepath}")
+                index += 1
+                state = 'value'
+            else:
+                try:
+                    value, end = decoder.raw_decode(buffer, index)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    state = 'incomplete'
+                    continue
+                if not eof and (end == len(buffer) or buffer[end] not in JSON_WHITESPACE + ',]'):
+                    # A scalar cut by the end of the chunk may continue in the next one, a number cut
+                    # after its '.' or exponent decodes as a shorter number followed by the rest
+                    state = 'incomplete'
+                    continue
+                yield value
+                index = end
+                state = 'separator'
+
 def read_file(file_path):
     with open(file_path, 'r') as file:
         content = file.read().strip()
@@ -20,6 +79,26 @@ def write_json(file_path, content, mode='w'):
     with open(file_path, mode) as file:
         json.dump(content, file, indent=4)
 
+def file_hash(file_path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_signature(file_path: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # The hash of a previous signature is reused when size and mtime are unchanged
+    stat = os.stat(file_path)
+    signature: Dict[str, Any] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if previous and previous.get('size') == signature['size'] and previous.get('mtime_ns') == signature['mtime_ns']:
+        signature['sha256'] = previous['sha256']
+    else:
+        signature['sha256'] = file_hash(file_path)
+    return signature
+
+def same_signature(signature: Dict[str, Any], other: Dict[str, Any]) -> bool:
+    return signature['size'] == other.get('size') and signature['sha256'] == other.get('sha256')
+
 def create_directory(path):
     if not os.path.exists(path):
         os.makedirs(path)
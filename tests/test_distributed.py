@@ -0,0 +1,134 @@
+import io
+import json
+import tarfile
+import urllib.error
+import threading
+import time
+import pytest
+from experiment.distributed import Coordinator, Worker, pack, unpack, RUN_TABLE_FILE
+
+# Long enough for an upload on a slow machine
+LEASE_TIMEOUT = 1.0
+CONFIG = """images:
+  - "u/ce-p5-0"
+  - "u/ce-p5-1"
+out: "{out}"
+procedure:
+  internal_repetitions: 1
+  external_repetitions: 1
+  freq: 100000000
+analysis:
+  mode: pid
+"""
+
+def in_process_worker(url, name, staging):
+    # The HTTP side of a worker, without the runner that needs Docker
+    worker = Worker.__new__(Worker)
+    worker.coordinator = url
+    worker.name = name
+    worker.host = 'localhost'
+    worker.staging = str(staging)
+    return worker
+
+def write_repetition(worker, lease):
+    # What run_entry writes, under the tagged name the runner uses
+    directory = f"{worker.staging}/ce-p5-{lease['image']}/{lease['repetition']}"
+    unpack(pack(str(worker.staging), []), directory)
+    with open(f"{directory}/timesheet.json", 'w') as file:
+        json.dump([{'name': worker.name}], file)
+    return directory
+
+@pytest.fixture
+def coordinator(tmp_path):
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text(CONFIG.format(out=tmp_path / 'out'))
+    coordinator = Coordinator(str(config_path), lease_timeout=LEASE_TIMEOUT)
+    server = coordinator.listen('127.0.0.1', 0)
+    coordinator.url = f"http://127.0.0.1:{server.server_port}"
+    yield coordinator
+    server.shutdown()
+    server.server_close()
+
+def test_lease_expiry_and_complete(coordinator, tmp_path):
+    waiting = threading.Thread(target=coordinator.wait, daemon=True)
+    waiting.start()
+    first = in_process_worker(coordinator.url, 'first', tmp_path / 'first')
+    second = in_process_worker(coordinator.url, 'second', tmp_path / 'second')
+    for worker in (first, second):
+        (tmp_path / worker.name).mkdir()
+        assert len(worker.request('/register', {'host': worker.host})['run_table']) == 2
+
+    held = first.request('/lease')
+    leased = second.request('/lease')
+    assert {held['entry'], leased['entry']} == {0, 1}
+    second.upload(write_repetition(second, leased), leased['entry'])
+    # The other entry is leased to the first worker until its lease expires
+    assert 'wait' in second.request('/lease')
+
+    time.sleep(LEASE_TIMEOUT + 0.2)
+    released = second.request('/lease')
+    assert released['entry'] == held['entry']
+    # The first worker delivers late, its upload is discarded and its staging directory removed
+    late = write_repetition(first, held)
+    first.upload(late, held['entry'])
+    with pytest.raises(FileNotFoundError):
+        open(f"{late}/timesheet.json")
+    second.upload(write_repetition(second, released), released['entry'])
+    assert second.request('/lease') == {'done': True}
+
+    (tmp_path / 'second' / 'metadata.json').write_text(json.dumps({'host': 'localhost'}))
+    second.finish()
+    # The first worker never finishes, the coordinator stops waiting for it once it expires
+    waiting.join(timeout=5 * LEASE_TIMEOUT)
+    assert not waiting.is_alive()
+
+    out = tmp_path / 'out'
+    for image in range(2):
+        # Where analyze reads the repetitions, the untagged display name of the configured image
+        timesheet = json.loads((out / f"ce-p5-{image}" / '0' / 'timesheet.json').read_text())
+        assert timesheet == [{'name': 'second'}]
+    run_table = json.loads((out / RUN_TABLE_FILE).read_text())
+    assert [row['worker'] for row in run_table] == ['second', 'second']
+    metadata = json.loads((out / 'metadata.json').read_text())
+    assert list(metadata['workers']) == ['second']
+    assert not (tmp_path / 'second').exists()
+
+def test_complete_requires_the_lease(coordinator):
+    assert coordinator.register('worker', 'localhost')
+    assert coordinator.register('other', 'localhost')
+    lease = coordinator.lease('worker')
+    assert not coordinator.complete('other', lease['entry'], pack('.', []))
+    assert coordinator.complete('worker', lease['entry'], pack('.', []))
+    # Completed entries are not completed again
+    assert not coordinator.complete('worker', lease['entry'], pack('.', []))
+
+@pytest.mark.parametrize('name', ['../escape', '..', 'a/b', ''])
+def test_rejects_invalid_worker_names(coordinator, tmp_path, name):
+    worker = in_process_worker(coordinator.url, name, tmp_path)
+    with pytest.raises(urllib.error.HTTPError) as error:
+        worker.request('/register')
+    assert error.value.code == 400
+    assert name not in coordinator.workers
+
+def test_rejects_unregistered_workers(coordinator, tmp_path):
+    worker = in_process_worker(coordinator.url, 'stranger', tmp_path)
+    for path in ('/lease', '/complete?entry=0', '/finish'):
+        with pytest.raises(urllib.error.HTTPError) as error:
+            worker.request(path.split('?')[0], dict([path.split('?')[1].split('=')]) if '?' in path else None, pack(str(tmp_path), []))
+        assert error.value.code == 403
+    assert not (tmp_path / 'out' / 'hosts').exists()
+
+@pytest.mark.parametrize('filters', [True, False])
+def test_unpack_rejects_escaping_members(tmp_path, monkeypatch, filters):
+    if not filters:
+        # Interpreters before 3.10.12 and 3.11.4
+        monkeypatch.delattr(tarfile, 'data_filter', raising=False)
+    unpack(pack(str(tmp_path), []), str(tmp_path / 'empty'))
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        member = tarfile.TarInfo('../escaped.txt')
+        member.size = 2
+        archive.addfile(member, io.BytesIO(b'hi'))
+    with pytest.raises(tarfile.TarError):
+        unpack(buffer.getvalue(), str(tmp_path / 'target'))
+    assert not (tmp_path / 'escaped.txt').exists()
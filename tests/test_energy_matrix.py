@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+from analysis.energy_matrix import EnergyMatrix, energy_windows
+
+def series(timestamps, power):
+    return pd.DataFrame({'consumption': np.asarray(power, dtype=np.float64)},
+                        index=pd.Index(np.asarray(timestamps, dtype=np.float64), name='timestamp'))
+
+@pytest.fixture
+def dfs():
+    rng = np.random.default_rng(7)
+    dfs = {'host': series(np.cumsum(rng.uniform(0.05, 0.15, 400)), rng.uniform(5, 15, 400))}
+    # Short-lived processes of different lengths, including one sample and none
+    for pid, (start, length) in enumerate([(3.0, 50), (10.5, 20), (20.0, 2), (25.0, 1), (0.0, 0)], start=100):
+        dfs[pid] = series(start + np.cumsum(rng.uniform(0.05, 0.15, length)), rng.uniform(0, 2, length))
+    return dfs
+
+def test_totals_match_trapezoids(dfs):
+    matrix = EnergyMatrix(dfs)
+    expected = [np.trapz(df['consumption'], x=df.index) if len(df) else 0.0 for df in dfs.values()]
+    assert matrix.totals() == pytest.approx(expected, rel=1e-12)
+
+@pytest.mark.parametrize('window', [0.01, 0.1, 0.37, 5.0, 1000.0])
+def test_windows_sum_to_totals(dfs, window):
+    matrix = EnergyMatrix(dfs)
+    edges, energy = matrix.windows(window)
+    assert edges[0] == matrix.start()
+    assert edges[-1] >= matrix.end()
+    assert np.diff(edges) == pytest.approx(window)
+    assert energy.sum(axis=1) == pytest.approx(matrix.totals(), rel=1e-9, abs=1e-12)
+
+def test_energy_at(dfs):
+    matrix = EnergyMatrix(dfs)
+    host = dfs['host']
+    middle = host.index[200]
+    # Exact at a sample, and the trapezoid of the interpolated power between samples
+    assert matrix.energy_at([middle])[matrix.row('host'), 0] == pytest.approx(np.trapz(host['consumption'].iloc[:201], x=host.index[:201]))
+    t0, t1 = host.index[200], host.index[201]
+    p0, p1 = host['consumption'].iloc[200], host['consumption'].iloc[201]
+    halfway = (t0 + t1) / 2
+    expected = np.trapz(host['consumption'].iloc[:201], x=host.index[:201]) + (halfway - t0) * (p0 + (p0 + p1) / 2) / 2
+    assert matrix.energy_at([halfway])[matrix.row('host'), 0] == pytest.approx(expected)
+    # Nothing before the first sample, the total from the last sample on, every time for rows without a segment
+    energy = matrix.energy_at([-1.0, 1e6])
+    assert energy[:, 0] == pytest.approx(0)
+    assert energy[:, 1] == pytest.approx(matrix.totals())
+
+def test_resample(dfs):
+    matrix = EnergyMatrix(dfs)
+    process = dfs[101]
+    grid = np.array([process.index[0] - 1, process.index[0], (process.index[3] + process.index[4]) / 2, process.index[-1], process.index[-1] + 1])
+    power = matrix.resample(grid)[matrix.row(101)]
+    values = process['consumption'].to_numpy()
+    assert power == pytest.approx([0, values[0], (values[3] + values[4]) / 2, values[-1], 0])
+    single = dfs[103]
+    assert matrix.resample([single.index[0] - 0.5, single.index[0]])[matrix.row(103)] == pytest.approx([0, single['consumption'].iloc[0]])
+    assert not matrix.resample(grid)[matrix.row(104)].any()
+
+def test_energy_windows_frame(dfs):
+    matrix = EnergyMatrix(dfs)
+    frame = energy_windows(matrix, 1.0)
+    assert list(frame.columns) == ['end', 'host', 'processes']
+    per_process = energy_windows(matrix, 1.0, per_process=True)
+    assert list(per_process.columns) == ['end', 'host', 'processes', '100', '101', '102', '103', '104']
+    assert frame['processes'].to_numpy() == pytest.approx(per_process[['100', '101', '102', '103', '104']].sum(axis=1).to_numpy())
+    assert frame['host'].to_numpy() == pytest.approx(per_process['host'].to_numpy())
+    assert frame[['host', 'processes']].sum().to_numpy() == pytest.approx(
+        [matrix.totals()[0], matrix.totals()[1:].sum()])
+
+def test_row_windows_cover_only_the_row(dfs):
+    matrix = EnergyMatrix(dfs)
+    edges = matrix.window_edges(0.1)
+    first, energy = matrix.row_windows(matrix.row(102), edges)
+    # Two samples within about 0.3 s touch at most four windows
+    assert len(energy) <= 4
+    assert edges[first] <= dfs[102].index[0] < edges[first + 1]
+    assert energy.sum() == pytest.approx(matrix.totals()[matrix.row(102)])
+    assert matrix.row_windows(matrix.row(103), edges)[1].size == 0
+
+def test_memory_follows_samples():
+    # Short rows are not padded to the length of the host series
+    dfs = {'host': series(np.arange(50000) * 0.01, np.ones(50000))}
+    for pid in range(500):
+        dfs[pid] = series(pid + np.arange(20) * 0.01, np.ones(20))
+    matrix = EnergyMatrix(dfs)
+    assert matrix.timestamps.size == 50000 + 500 * 20
+    assert matrix.totals()[1:] == pytest.approx(0.19)
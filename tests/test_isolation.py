@@ -0,0 +1,35 @@
+import json
+import pytest
+from experiment.isolation import (CpuLayout, duration_variation, format_cpuset, parse_cpuset, run_durations,
+                                  thread_siblings, variance_reduction)
+
+def test_cpuset_round_trip():
+    assert parse_cpuset('0-3,8, 10-11') == {0, 1, 2, 3, 8, 10, 11}
+    assert format_cpuset({11, 0, 1, 2, 3, 8, 10}) == '0-3,8,10-11'
+    assert parse_cpuset('') == set()
+
+def test_thread_siblings(tmp_path):
+    topology = tmp_path / 'cpu0' / 'topology'
+    topology.mkdir(parents=True)
+    (topology / 'thread_siblings_list').write_text('0,4\n')
+    assert thread_siblings(0, str(tmp_path)) == {0, 4}
+    assert thread_siblings(1, str(tmp_path)) == {1}
+
+def test_layout_must_be_disjoint():
+    with pytest.raises(ValueError):
+        CpuLayout({0, 1}, {1})
+    assert CpuLayout({1, 2, 3}, {0}).summary() == {'workload_cpus': '1-3', 'observer_cpus': '0'}
+
+def test_duration_variation(tmp_path):
+    # The timesheets are in the directories the runner writes, named after the pulled image
+    for repetition, duration in enumerate([10.0, 12.0, 14.0]):
+        directory = tmp_path / 'ce-p5-0' / str(repetition)
+        directory.mkdir(parents=True)
+        (directory / 'timesheet.json').write_text(json.dumps([{'name': 'ce-p5-0', 'duration': duration}]))
+    durations = run_durations(str(tmp_path), 'ce-p5-0', [0, 1, 2, 3])
+    assert durations == [10.0, 12.0, 14.0]
+    variation = duration_variation(durations)
+    assert variation['runs'] == 3
+    assert variation['cv'] == pytest.approx(2 / 12)
+    assert duration_variation([]) == {'runs': 0, 'mean_duration': None, 'cv': None}
+    assert variance_reduction({'a': variation}, {'a': {'cv': 2 * variation['cv']}}) == {'a': pytest.approx(0.5)}
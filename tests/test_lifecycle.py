@@ -0,0 +1,122 @@
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import docker
+import pytest
+from experiment.lifecycle import ContainerLifecycle
+
+CONTAINER_ID = 'c0ffee'
+NAME = 'ce-a'
+PID = 4242
+START = 1700000000
+
+def event(container_id, action, offset, **attributes):
+    return {'id': container_id, 'status': action, 'Action': action, 'Type': 'container',
+            'Actor': {'ID': container_id, 'Attributes': {'name': NAME, **attributes}},
+            'time': START, 'timeNano': int((START + offset) * 1e9)}
+
+EVENTS = [
+    # A previous container with the same name
+    event('deadbeef', 'die', 0.0, exitCode='1'),
+    event(CONTAINER_ID, 'create', 0.1),
+    event(CONTAINER_ID, 'attach', 0.15),
+    event(CONTAINER_ID, 'start', 0.2),
+    event(CONTAINER_ID, 'die', 1.7, exitCode='3'),
+    event(CONTAINER_ID, 'destroy', 1.8),
+]
+
+class FakeDockerHandler(BaseHTTPRequestHandler):
+    # The parts of the Docker Engine API that the lifecycle uses
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path.endswith('/events'):
+            self.server.requests.append(urllib.parse.parse_qs(url.query))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            # Streamed one event per chunk, as the daemon does
+            for item in self.server.events:
+                data = json.dumps(item).encode() + b'\n'
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+        elif url.path.endswith(f'/containers/{CONTAINER_ID}/json') and self.server.removed:
+            self.reply({'message': f'No such container: {CONTAINER_ID}'}, 404)
+        elif url.path.endswith(f'/containers/{CONTAINER_ID}/json'):
+            self.reply({'Id': CONTAINER_ID, 'Name': f'/{NAME}', 'State': {'Status': 'running', 'Pid': PID}})
+        else:
+            self.reply({'message': f'no such path {url.path}'}, 404)
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path.endswith(f'/containers/{CONTAINER_ID}/wait'):
+            self.server.requests.append(urllib.parse.parse_qs(url.query))
+            self.reply({'StatusCode': 3})
+        else:
+            self.reply({'message': f'no such path {url.path}'}, 404)
+
+    def reply(self, content, status=200):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def client():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeDockerHandler)
+    server.requests = []
+    server.events = EVENTS
+    server.removed = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = docker.DockerClient(base_url=f"tcp://127.0.0.1:{server.server_port}", version='1.41')
+    client.server = server
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+def test_follow_records_transitions(client):
+    lifecycle = ContainerLifecycle(client, NAME)
+    lifecycle.subscribe()
+    container = client.containers.prepare_model({'Id': CONTAINER_ID})
+    started = []
+    lifecycle.follow(container, on_start=started.append)
+    lifecycle.wait_removed(container)
+
+    events_query, wait_query = client.server.requests
+    assert json.loads(events_query['filters'][0]) == {'type': ['container'], 'container': [NAME]}
+    assert wait_query['condition'] == ['removed']
+    assert started == [PID]
+    assert lifecycle.stream is None
+
+    summary = lifecycle.summary()
+    assert summary['pid'] == PID
+    assert summary['exit_code'] == 3
+    assert set(summary['transitions']) == {'create', 'start', 'die'}
+    assert summary['running_time'] == pytest.approx(1.5)
+    assert summary['removed'] >= summary['requested']
+    assert summary['stop_latency'] is not None
+
+def test_container_gone_before_inspect(client):
+    # Auto-removed right after starting, and the die event was not delivered
+    client.server.removed = True
+    client.server.events = [item for item in EVENTS if item['Action'] != 'die']
+    lifecycle = ContainerLifecycle(client, NAME)
+    lifecycle.subscribe()
+    started = []
+    lifecycle.follow(client.containers.prepare_model({'Id': CONTAINER_ID}), on_start=started.append)
+
+    assert started == []
+    assert lifecycle.pid is None
+    assert lifecycle.stream is None
+    assert set(lifecycle.summary()['transitions']) == {'create', 'start'}
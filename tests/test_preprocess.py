@@ -0,0 +1,55 @@
+import json
+import numpy as np
+import pytest
+from analysis.preprocess import PRUNE_FILE, prune_offsets, preprocess_scaphandre
+from misc.records import RAPL_RECORD
+
+def linear_offsets(timestamps, start, end):
+    # The scans prune_offsets replaced
+    if timestamps[0] > start:
+        raise ValueError
+    index = 0
+    while timestamps[index] < start:
+        index += 1
+    if timestamps[-1] < end:
+        raise ValueError
+    last = len(timestamps) - 1
+    while timestamps[last] > end:
+        last -= 1
+    return index, last
+
+def test_matches_linear_scans():
+    rng = np.random.default_rng(3)
+    # Repeated timestamps too, as samples at the same clock tick
+    timestamps = np.sort(np.round(rng.uniform(0, 10, 500), 1))
+    for start, end in [(0, 10), (timestamps[0], timestamps[-1]), (2.5, 7.5), (3.0, 3.0), (4.04, 4.06)] + \
+            [tuple(sorted(rng.uniform(timestamps[0], timestamps[-1], 2))) for _ in range(200)]:
+        if timestamps[0] > start or timestamps[-1] < end:
+            continue
+        assert prune_offsets(timestamps, start, end) == linear_offsets(timestamps, start, end)
+
+@pytest.mark.parametrize('start, end', [(-1, 5), (1, 11)])
+def test_window_outside_samples(start, end):
+    with pytest.raises(ValueError):
+        prune_offsets(np.arange(11.0), start, end)
+    with pytest.raises(ValueError):
+        prune_offsets(np.zeros(0), 0, 0)
+
+def test_sidecar(tmp_path):
+    records = np.zeros(100, dtype=RAPL_RECORD)
+    records['timestamp'] = 1000 + np.arange(100) * 0.1
+    records['consumption'] = 5
+    records.tofile(tmp_path / 'power.bin')
+    (tmp_path / 'timesheet.json').write_text(json.dumps([{'name': 'block', 'start': 1002.0, 'end': 1005.0}]))
+
+    samples = preprocess_scaphandre(str(tmp_path / 'power.bin'), str(tmp_path / 'timesheet.json'), prune_buffer=0.5)
+    prune = json.loads((tmp_path / PRUNE_FILE).read_text())
+    assert (prune['start'], prune['end']) == prune_offsets(records['timestamp'], 1001.5, 1005.5)
+    assert samples.host_timestamp[0] == pytest.approx(1001.5)
+    assert len(samples) == prune['end'] - prune['start']
+
+    # Reused while the window and the samples match, recomputed otherwise
+    prune['start'] += 1
+    (tmp_path / PRUNE_FILE).write_text(json.dumps(prune))
+    assert len(preprocess_scaphandre(str(tmp_path / 'power.bin'), str(tmp_path / 'timesheet.json'), prune_buffer=0.5)) == len(samples) - 1
+    assert len(preprocess_scaphandre(str(tmp_path / 'power.bin'), str(tmp_path / 'timesheet.json'), prune_buffer=0.2)) == 34
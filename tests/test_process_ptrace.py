@@ -0,0 +1,66 @@
+import json
+import numpy as np
+from analysis.process_ptrace import resolve_intervals
+from misc.records import PTRACE_RECORD, PTRACE_FORK, PTRACE_EXIT
+
+SECOND = 1_000_000_000
+# Wall clock seconds of monotonic time zero
+REALTIME = 1700000000.0
+
+def fork(seconds, parent, child):
+    return f"C{int(seconds * SECOND)}: sh ({parent}) -> sh ({child})"
+
+def exit(seconds, pid):
+    return f"X{int(seconds * SECOND)}: sh ({pid})"
+
+# 100 is the container root. 200 is its child until it exits, then the PID goes to a child of the unrelated 50.
+# 300 is forked twice by the root without an exit being recorded in between.
+TRACE = [
+    fork(1, 100, 200),
+    fork(1.5, 200, 210),
+    exit(2, 200),
+    fork(3, 50, 200),
+    fork(4, 100, 300),
+    fork(6, 100, 300),
+    exit(7, 300),
+]
+
+def write_trace(directory, lines, clock=True):
+    path = directory / 'ptrace.txt'
+    path.write_text('\n'.join(lines) + '\n')
+    if clock:
+        (directory / 'ptrace_clock.json').write_text(json.dumps({'realtime': REALTIME, 'monotonic_ns': 0}))
+    return str(path)
+
+def attributed(intervals, pid, seconds):
+    timestamps = np.array([REALTIME + second for second in seconds])
+    return intervals.contains(np.full(len(timestamps), pid), timestamps).tolist()
+
+def test_reused_pid_outside_the_tree(tmp_path):
+    intervals = resolve_intervals(write_trace(tmp_path, TRACE), '100')
+    assert intervals.pids() == [100, 200, 210, 300]
+    assert attributed(intervals, 200, [0.5, 1.5, 2.5, 3.5]) == [False, True, False, False]
+    # A grandchild stays attributed after its parent exits
+    assert attributed(intervals, 210, [1.0, 2.5]) == [False, True]
+    assert attributed(intervals, 100, [0.0, 10.0]) == [True, True]
+
+def test_reused_pid_without_exit(tmp_path):
+    intervals = resolve_intervals(write_trace(tmp_path, TRACE), '100')
+    assert attributed(intervals, 300, [3.5, 4.5, 5.5, 6.5, 7.5]) == [False, True, True, True, False]
+    assert sorted(zip(intervals.start[intervals.pid == 300] - REALTIME, intervals.end[intervals.pid == 300] - REALTIME)) \
+        == [(4.0, 6.0), (6.0, 7.0)]
+
+def test_binary_records(tmp_path):
+    records = np.zeros(3, dtype=PTRACE_RECORD)
+    records[0] = (1 * SECOND, PTRACE_FORK, 200, 100, 0)
+    records[1] = (2 * SECOND, PTRACE_EXIT, 200, 0, 0)
+    records[2] = (3 * SECOND, PTRACE_FORK, 200, 50, 0)
+    records.tofile(tmp_path / 'ptrace.bin')
+    (tmp_path / 'ptrace_clock.json').write_text(json.dumps({'realtime': REALTIME, 'monotonic_ns': 0}))
+    intervals = resolve_intervals(str(tmp_path / 'ptrace.bin'), '100')
+    assert attributed(intervals, 200, [1.5, 3.5]) == [True, False]
+
+def test_without_clock_only_pids(tmp_path):
+    intervals = resolve_intervals(write_trace(tmp_path, TRACE, clock=False), '100')
+    # Without a clock reference the reuse cannot be told apart
+    assert attributed(intervals, 200, [1.5, 3.5]) == [True, True]
@@ -0,0 +1,82 @@
+import os
+import time
+import numpy as np
+import pytest
+from experiment.rapl import RaplDomain, RaplSampler, find_package_domains
+from misc.records import RAPL_RECORD
+
+MAX_ENERGY_UJ = 1000
+
+def powercap_tree(root, packages=1, energy_uj=0):
+    for package in range(packages):
+        domain = root / f"intel-rapl:{package}"
+        domain.mkdir(parents=True)
+        (domain / 'max_energy_range_uj').write_text(f"{MAX_ENERGY_UJ}\n")
+        (domain / 'energy_uj').write_text(f"{energy_uj}\n")
+    # Subdomains and other control types are not package domains
+    (root / 'intel-rapl:0:0').mkdir()
+    (root / 'intel-rapl-mmio:0').mkdir()
+    return root
+
+def set_energy(root, energy_uj, package=0):
+    # Replaced atomically, the sampler may read the counter at any time
+    path = root / f"intel-rapl:{package}" / 'energy_uj'
+    path.with_suffix('.tmp').write_text(f"{energy_uj}\n")
+    os.replace(path.with_suffix('.tmp'), path)
+
+def test_package_domains(tmp_path):
+    domains = find_package_domains(str(powercap_tree(tmp_path, packages=2)))
+    assert [domain.path.rsplit('/', 1)[1] for domain in domains] == ['intel-rapl:0', 'intel-rapl:1']
+    with pytest.raises(FileNotFoundError):
+        find_package_domains(str(tmp_path / 'intel-rapl:0:0'))
+
+def test_delta_wraps_around(tmp_path):
+    root = powercap_tree(tmp_path, energy_uj=900)
+    domain = RaplDomain(str(root / 'intel-rapl:0'))
+    assert domain.delta() == 0
+    set_energy(root, 950)
+    assert domain.delta() == 50
+    set_energy(root, 30)
+    assert domain.delta() == MAX_ENERGY_UJ - 950 + 30
+    set_energy(root, 30)
+    assert domain.delta() == 0
+
+def test_sampler_accumulates_across_wraparound(tmp_path):
+    root = powercap_tree(tmp_path, packages=2, energy_uj=990)
+    sampler = RaplSampler(int(5e6), str(root))
+    sampler.start(str(tmp_path / 'power.bin'))
+    for energy_uj in (995, 10, 500):
+        time.sleep(0.05)
+        set_energy(root, energy_uj)
+    time.sleep(0.05)
+    sampler.stop()
+
+    records = np.fromfile(tmp_path / 'power.bin', dtype=RAPL_RECORD)
+    assert sampler.error is None
+    assert len(records) > 0
+    assert np.all(np.diff(records['timestamp']) > 0)
+    assert np.all(np.diff(records['energy_uj']) >= 0)
+    # Only package 0 changed: 990 -> 995 -> 10 (wrapped) -> 500
+    assert records['energy_uj'][-1] == 5 + (MAX_ENERGY_UJ - 995 + 10) + 490
+
+def test_unreadable_counter_fails_start(tmp_path):
+    root = powercap_tree(tmp_path)
+    (root / 'intel-rapl:0' / 'energy_uj').unlink()
+    (root / 'intel-rapl:0' / 'energy_uj').mkdir()
+    sampler = RaplSampler(int(5e6), str(root))
+    with pytest.raises(OSError):
+        sampler.start(str(tmp_path / 'power.bin'))
+    assert not sampler.running
+    assert not (tmp_path / 'power.bin').exists()
+
+def test_failure_while_sampling_is_recorded(tmp_path):
+    root = powercap_tree(tmp_path)
+    sampler = RaplSampler(int(5e6), str(root))
+    sampler.start(str(tmp_path / 'power.bin'))
+    time.sleep(0.05)
+    (root / 'intel-rapl:0' / 'energy_uj').unlink()
+    sampler.thread.join(timeout=5)
+    assert not sampler.thread.is_alive()
+    assert isinstance(sampler.error, FileNotFoundError)
+    sampler.stop()
+    assert len(np.fromfile(tmp_path / 'power.bin', dtype=RAPL_RECORD)) > 0
@@ -0,0 +1,27 @@
+import json
+import pytest
+from misc.util import iter_json_array
+
+DOCUMENTS = [
+    '[]',
+    '[1,23,4.5]',
+    '[ 6e10 , -0.5e-3, 1E+2 ]',
+    '[true, null, false, "x,y]", "\\u00e9"]',
+    '[{"host": {"timestamp": 1.5, "consumption": 2}, "consumers": []}, {"a": [1.25, {"b": "]"}]}]',
+    '[\n  1.0,\n  [2, 3.75],\n  4\n]\n',
+]
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_every_chunk_boundary(tmp_path, document):
+    path = tmp_path / 'array.json'
+    path.write_text(document)
+    for chunk_size in range(1, len(document) + 2):
+        assert list(iter_json_array(str(path), chunk_size)) == json.loads(document), chunk_size
+
+@pytest.mark.parametrize('document', ['{"a": 1}', '[1, 2', '[1 2]', '[1.5x]'])
+def test_invalid(tmp_path, document):
+    path = tmp_path / 'array.json'
+    path.write_text(document)
+    for chunk_size in (1, 2, 1 << 20):
+        with pytest.raises(ValueError):
+            list(iter_json_array(str(path), chunk_size))